@@ -0,0 +1,236 @@
+#  Fork based fault injection campaigns.
+#
+#  The program is simulated once, without faults, until it calls
+#  fi_activate(START). From there the simulator is forked once per fault
+#  map. Each child loads its map into the fault injector and simulates the
+#  rest of the program in its own output directory, so the fault free
+#  prefix (input reading, decoding, setup) is only simulated once.
+#
+#  The program should write its outputs to /proc/self/cwd/<file>. The parent
+#  runs in the directory gem5 was started from and every child runs in its
+#  own output directory, so each child gets its own output files.
+#
+#  The parent appends one JSON line per finished child to PROGRESS_FILE in
+#  its output directory, so a campaign can follow the children while the
+#  batch runs.
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import signal
+import shutil
+import zlib
+import json
+
+import m5
+import m5.objects
+
+START_CAUSE = "fault injection start"
+STATUS_FILE = "fork_status.txt"
+PROGRESS_FILE = "fork_progress.jsonl"
+RANDOM_PREFIX = "random:"
+
+# os.O_ACCMODE is missing from the Python 2.7 that gem5 embeds
+ACCMODE = os.O_RDONLY | os.O_WRONLY | os.O_RDWR
+
+def parse_random_input(input_path):
+    #  random:<number of faults>:<seed> asks the fault injectors to generate
+    #  the faults, returns (number of faults, seed) or None for fault maps
+    if not input_path.startswith(RANDOM_PREFIX):
+        return None
+
+    count, seed = input_path[len(RANDOM_PREFIX):].split(":")
+
+    return int(count), int(seed)
+
+def total_insts():
+    cpus = [obj for obj in m5.objects.Root.getInstance().descendants() if isinstance(obj, m5.objects.BaseCPU)]
+
+    return sum(cpu.totalInsts() for cpu in cpus)
+
+def simulation_point():
+    #  Host time and committed instructions before m5.simulate, see write_summary
+    return time.time(), total_insts()
+
+def write_summary(summary_file, exit_event, fault_injectors, start, simulation_start):
+    #  What a campaign needs to classify a run and account for it, so that
+    #  it reads neither the outputs nor the stats. The exit code is the
+    #  program's exit status when it exited, see exitImpl in syscall_emul.cc.
+    #  host_seconds includes Python startup, configuration and checkpoint
+    #  restore, the instruction rate only counts the time in m5.simulate,
+    #  like host_inst_rate of the gem5 stats.
+    now = time.time()
+    insts = total_insts()
+    simulate_seconds = now - simulation_start[0]
+
+    summary = {
+        "cause": exit_event.getCause(),
+        "exit_code": exit_event.getCode(),
+        "tick": m5.curTick(),
+        "insts": insts,
+        "host_seconds": now - start,
+        "host_inst_rate": (insts - simulation_start[1]) / simulate_seconds if simulate_seconds > 0 else None,
+        "injections": sum(fault_injector.injectedBits() for fault_injector in fault_injectors)
+    }
+
+    with open(os.path.join(m5.options.outdir, summary_file), "w") as summary_output:
+        json.dump(summary, summary_output)
+
+def read_fault_inputs(path):
+    #  One fault map per line: <input path> <name>
+    fault_inputs = []
+
+    with open(path) as inputs_file:
+        for line in inputs_file:
+            fields = line.split()
+            if len(fields) == 2:
+                fault_inputs.append((fields[0], fields[1]))
+
+    return fault_inputs
+
+def redirect_stdout():
+    #  The child inherits the stdout and stderr of the parent, point them to
+    #  the files of its own output directory.
+    options = m5.options
+
+    if options.redirect_stdout:
+        stdout_fd = os.open(os.path.join(options.outdir, options.stdout_file), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(stdout_fd, sys.stdout.fileno())
+        if not options.redirect_stderr:
+            os.dup2(stdout_fd, sys.stderr.fileno())
+        os.close(stdout_fd)
+
+    if options.redirect_stderr:
+        stderr_fd = os.open(os.path.join(options.outdir, options.stderr_file), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(stderr_fd, sys.stderr.fileno())
+        os.close(stderr_fd)
+
+def redirect_outputs(parent_dir, child_dir):
+    #  Output files that the program opened before fi_activate(START) are
+    #  shared with the parent. Give the child its own copy of every file
+    #  that is open for writing in the parent's working directory.
+    for fd_name in os.listdir("/proc/self/fd"):
+        fd = int(fd_name)
+
+        try:
+            target = os.readlink("/proc/self/fd/" + fd_name)
+            with open("/proc/self/fdinfo/" + fd_name) as fdinfo:
+                fields = dict(line.split(":", 1) for line in fdinfo if ":" in line)
+            flags = int(fields["flags"], 8)
+        except (OSError, IOError, KeyError, ValueError):
+            continue
+
+        if os.path.dirname(target) != parent_dir or flags & ACCMODE == os.O_RDONLY:
+            continue
+
+        child_path = os.path.join(child_dir, os.path.basename(target))
+        offset = os.lseek(fd, 0, os.SEEK_CUR)
+        shutil.copyfile(target, child_path)
+
+        child_fd = os.open(child_path, flags & (ACCMODE | os.O_APPEND))
+        os.lseek(child_fd, offset, os.SEEK_SET)
+        os.dup2(child_fd, fd)
+        os.close(child_fd)
+
+def run_child(fault_injectors, input_path, parent_dir, summary_file, max_ticks):
+    start = time.time()
+
+    redirect_stdout()
+    redirect_outputs(parent_dir, m5.options.outdir)
+
+    #  The program writes its outputs to /proc/self/cwd/<file>, which now
+    #  resolves to the child's output directory.
+    os.chdir(m5.options.outdir)
+
+    #  Every child gets its own transient fault arrivals
+    seed = zlib.crc32(input_path.encode("utf-8")) & 0xfffffff
+    random_input = parse_random_input(input_path)
+    for i, fault_injector in enumerate(fault_injectors):
+        if random_input:
+            fault_injector.generateFaults(*random_input)
+        else:
+            fault_injector.loadFaults(input_path)
+        fault_injector.seedTransients(seed * 16 + i)
+
+    simulation_start = simulation_point()
+    exit_event = m5.simulate(max_ticks)
+    print('Exiting @ tick %i because %s' % (m5.curTick(), exit_event.getCause()))
+
+    if summary_file:
+        write_summary(summary_file, exit_event, fault_injectors, start, simulation_start)
+
+    sys.exit(0)
+
+def write_status(outdir, status):
+    with open(os.path.join(outdir, STATUS_FILE), "w") as status_file:
+        status_file.write(status + "\n")
+
+def report_child(outdir, status, start, summary_file):
+    #  One line of PROGRESS_FILE: the status, wall clock seconds and summary
+    #  of a finished child, None for children that wrote no summary
+    write_status(outdir, status)
+
+    summary = None
+    if summary_file:
+        try:
+            with open(os.path.join(outdir, summary_file)) as summary_input:
+                summary = json.load(summary_input)
+        except (IOError, ValueError):
+            pass
+
+    progress = {"input": os.path.basename(outdir), "status": status, "seconds": time.time() - start, "summary": summary}
+
+    with open(os.path.join(m5.options.outdir, PROGRESS_FILE), "a") as progress_file:
+        progress_file.write(json.dumps(progress) + "\n")
+
+def reap(children, timeout, summary_file):
+    #  Records finished children and kills the ones that ran too long.
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            break
+
+        outdir, start = children.pop(pid)
+        if os.WIFSIGNALED(status):
+            report_child(outdir, "signal %d" % os.WTERMSIG(status), start, summary_file)
+        else:
+            report_child(outdir, "exit %d" % os.WEXITSTATUS(status), start, summary_file)
+
+    now = time.time()
+    for pid, (outdir, start) in list(children.items()):
+        if timeout and now - start > timeout:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            del children[pid]
+            report_child(outdir, "timeout", start, summary_file)
+
+def run(fault_injectors, fault_inputs, workers, timeout, summary_file="", max_ticks=m5.MaxTick):
+    #  Run the fault free prefix in the parent
+    exit_event = m5.simulate()
+    if exit_event.getCause() != START_CAUSE:
+        print('Exiting @ tick %i because %s before fault injection started' % (m5.curTick(), exit_event.getCause()))
+        sys.exit(1)
+
+    print('Forking @ tick %i for %d fault maps' % (m5.curTick(), len(fault_inputs)))
+
+    parent_dir = os.getcwd()
+    children = {}
+
+    for input_path, name in fault_inputs:
+        while len(children) >= workers:
+            time.sleep(1)
+            reap(children, timeout, summary_file)
+
+        outdir = os.path.join(os.path.abspath(m5.options.outdir), name)
+
+        pid = m5.fork(simout=outdir)
+        if pid == 0:
+            run_child(fault_injectors, input_path, parent_dir, summary_file, max_ticks)
+
+        children[pid] = (outdir, time.time())
+
+    while children:
+        time.sleep(1)
+        reap(children, timeout, summary_file)
@@ -10,9 +10,40 @@ def get_opts():
     parser = OptionParser()
 
     parser.add_option("-c", "--bench-path", help="Binary of the program to be simulated")
-    parser.add_option("--input-path", help="Fault input file")
+    parser.add_option("--input-path", help="Fault input file, or random:<number of faults>:<seed> to generate "
+                      "random faults in the simulator")
     parser.add_option("--output", help="Output", default="")
     parser.add_option("--cache-level", help="Cache Level", default="1")
+    parser.add_option("--num-cpus", type="int", help="Number of cpus, each with its own L1 caches", default=1)
+    parser.add_option("--exit-on-masked", action="store_true", help="Exit with 'fault masked' after fi_activate(STOP) "
+                      "once no injected fault can reach the program", default=False)
+    parser.add_option("--transient-rate", type="float", help="Mean number of transient faults per simulated second "
+                      "and cache while fault injection is enabled", default=0.0)
+    parser.add_option("--transient-seed", type="int", help="Seed of the transient fault arrivals", default=1)
+    parser.add_option("--random-distribution", help="How random faults are spread: uniform, block or column",
+                      default="uniform")
+    parser.add_option("--random-cache", help="Cache that gets the random faults", default="l1d")
+    parser.add_option("--max-ticks", type="int", help="Exit with 'simulate() limit reached' after simulating this "
+                      "many ticks, counted from the fork in fork campaigns, 0 for no limit", default=0)
+    parser.add_option("--max-insts", type="int", help="Exit with 'a thread reached the max instruction count' once a "
+                      "thread committed this many instructions, 0 for no limit", default=0)
+    parser.add_option("--summary-file", help="Write the exit cause, tick, host seconds and injected bits of the run "
+                      "to this JSON file in the output directory", default="")
+    parser.add_option("--profile-path", help="Store the bytes read after fi_activate(START) in this .npy file",
+                      default="")
+
+    # Fork campaign options
+    parser.add_option("--fork-inputs", help="File with one '<fault input> <name>' per line. Simulates the program "
+                      "until fi_activate(START) once, then forks one child per fault input", default="")
+    parser.add_option("--fork-workers", type="int", help="Maximum number of live children", default=4)
+    parser.add_option("--fork-timeout", type="int", help="Seconds after which a child is killed and recorded as "
+                      "timeout, 0 for no limit", default=0)
+
+    # Checkpoint options
+    parser.add_option("--take-checkpoint", help="Simulate until fi_activate(START), write a checkpoint to this "
+                      "directory and exit", default="")
+    parser.add_option("--restore-checkpoint", help="Start from a checkpoint written by --take-checkpoint. Caches "
+                      "start cold and files the program opened before the checkpoint are not reopened", default="")
 
     # Cache Options
     parser.add_option("--l1d-size", type="string", default="2kB")
@@ -0,0 +1,74 @@
+#  Measures the simulation speed cost of fault injection.
+#
+#  The same benchmark is simulated twice with configs/fi_config/run.py: once
+#  with the empty golden fault map and once with the given fault map. The
+#  simulated instructions per host second of both runs are read from their
+#  stats.txt files and compared.
+#
+#  example run (from the gem5 root, with python3):
+#    python3 configs/fi_config/overhead.py --input-path=inputs/0.54V/BRAM_1000.txt
+#        -- -c tests/test-progs/sobel/sobel --sobel-input=<input.grey>
+
+import os
+import sys
+import argparse
+import subprocess
+
+WHERE_AM_I = os.path.dirname(os.path.realpath(__file__)) #  Absolute Path to *THIS* Script
+GEM5_PATH = os.path.abspath(WHERE_AM_I + '/../..')
+
+GEM5_BINARY = GEM5_PATH + '/build/X86/gem5.opt'
+GEM5_SCRIPT = WHERE_AM_I + '/run.py'
+GOLDEN_INPUT = GEM5_PATH + '/inputs/golden.txt'
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gem5", help="gem5 binary", default=GEM5_BINARY)
+    parser.add_argument("--input-path", help="Fault input file", required=True)
+    parser.add_argument("--outdir", help="Output directory of both runs", default="overhead_results")
+    parser.add_argument("--repeat", type=int, help="Number of runs per configuration", default=1)
+    parser.add_argument("script_options", nargs=argparse.REMAINDER, help="Options passed to run.py, after --")
+
+    return parser.parse_args()
+
+def read_stats(stats_path):
+    stats = {}
+
+    with open(stats_path) as stats_file:
+        for line in stats_file:
+            fields = line.split()
+            if len(fields) >= 2 and fields[0] in ("sim_insts", "host_seconds", "host_inst_rate"):
+                stats[fields[0]] = float(fields[1])
+
+    return stats
+
+def simulate(args, input_path, outdir):
+    script_options = [option for option in args.script_options if option != "--"]
+
+    gem5_command = [args.gem5, "-re", "--outdir=" + outdir, GEM5_SCRIPT, "--input-path=" + input_path] + script_options
+
+    try:
+        subprocess.check_call(gem5_command)
+    except Exception as e:
+        sys.exit(str(e))
+
+    return read_stats(outdir + "/stats.txt")
+
+def measure(args, name, input_path):
+    rates = []
+
+    for run in range(args.repeat):
+        stats = simulate(args, input_path, "%s/%s_%d" % (args.outdir, name, run))
+        rates.append(stats["sim_insts"] / stats["host_seconds"])
+
+    return max(rates)
+
+if __name__ == '__main__':
+    args = get_arguments()
+
+    golden_rate = measure(args, "golden", GOLDEN_INPUT)
+    faulty_rate = measure(args, "faulty", os.path.abspath(args.input_path))
+
+    print("Without injection: %.0f simulated instructions per second" % golden_rate)
+    print("With injection:    %.0f simulated instructions per second" % faulty_rate)
+    print("Slowdown:          %.2fx" % (golden_rate / faulty_rate))
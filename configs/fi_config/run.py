@@ -1,10 +1,15 @@
+import sys
+import time
 import m5
 from m5.objects import *
 from caches import *
 from options import get_opts, get_process_cmd
+import campaign
 
 (opts, args) = get_opts()
 
+start = time.time()
+
 system = System()
 
 system.clk_domain = SrcClockDomain()
@@ -14,43 +19,71 @@ system.clk_domain.voltage_domain = VoltageDomain()
 system.mem_mode = 'atomic'               # Use timing accesses
 system.mem_ranges = [AddrRange('512MB')] # Create an address range
 
-system.cpu = AtomicSimpleCPU()
+system.cpu = [AtomicSimpleCPU(cpu_id=i) for i in range(opts.num_cpus)]
+
+# Faulty runs get a budget relative to the golden run, so a run that hangs stops with a cause of its own
+if opts.max_insts:
+    for cpu in system.cpu:
+        cpu.max_insts_any_thread = opts.max_insts
+
+max_ticks = opts.max_ticks if opts.max_ticks else m5.MaxTick
 
 system.membus = SystemXBar()
 
-system.cpu.dcache = L1DCache(opts)
-system.cpu.icache = L1ICache(opts)
+# Every cache has its own fault injector. fi_activate enables the injectors of
+# the issuing CPU's L1 caches and the ones of the shared caches (cpu_id=-1).
+# A shared cache is disabled once every CPU that called START called STOP.
+fault_injectors = []
 
-fault_injector = FaultInjector(input_path=opts.input_path)
+# random:<number of faults>:<seed> generates the faults in the simulator
+random_input = campaign.parse_random_input(opts.input_path)
+random_faults, random_seed = random_input if random_input else (0, 1)
 
-system.cpu.dcache.fault_injector = fault_injector
-system.cpu.icache.fault_injector = fault_injector
+def make_fault_injector(cpu_id=-1):
+    # Every cache gets its own arrival process
+    transient_seed = opts.transient_seed * 16 + len(fault_injectors)
 
-system.cpu.dcache.connectCPU(system.cpu)
-system.cpu.icache.connectCPU(system.cpu)
+    fault_injector = FaultInjector(input_path=opts.input_path, cpu_id=cpu_id,
+                                   random_faults=random_faults, random_seed=random_seed,
+                                   random_distribution=opts.random_distribution,
+                                   random_cache=opts.random_cache,
+                                   transient_rate=opts.transient_rate, transient_seed=transient_seed,
+                                   exit_on_start=bool(opts.fork_inputs),
+                                   checkpoint_on_start=bool(opts.take_checkpoint),
+                                   exit_on_masked=opts.exit_on_masked, profile_path=opts.profile_path)
+    fault_injectors.append(fault_injector)
 
-if opts.cache_level == "1":
-    system.cpu.dcache.connectBus(system.membus)
-    system.cpu.icache.connectBus(system.membus)
-elif opts.cache_level == "2":
+    return fault_injector
+
+if opts.cache_level != "1":
     system.l2bus = L2XBar()
 
-    system.cpu.dcache.connectBus(system.l2bus)
-    system.cpu.icache.connectBus(system.l2bus)
+for i, cpu in enumerate(system.cpu):
+    cpu.dcache = L1DCache(opts)
+    cpu.icache = L1ICache(opts)
+
+    cpu.dcache.fault_injector = make_fault_injector(i)
+    cpu.icache.fault_injector = make_fault_injector(i)
+
+    cpu.dcache.connectCPU(cpu)
+    cpu.icache.connectCPU(cpu)
 
+    if opts.cache_level == "1":
+        cpu.dcache.connectBus(system.membus)
+        cpu.icache.connectBus(system.membus)
+    else:
+        cpu.dcache.connectBus(system.l2bus)
+        cpu.icache.connectBus(system.l2bus)
+
+if opts.cache_level == "2":
     system.l2cache = L2Cache(opts)
     system.l2cache.connectCPUSideBus(system.l2bus)
-    system.l2cache.fault_injector = fault_injector
+    system.l2cache.fault_injector = make_fault_injector()
     system.l2cache.connectMemSideBus(system.membus)
 elif opts.cache_level == "3":
-    system.l2bus = L2XBar()
-
-    system.cpu.dcache.connectBus(system.l2bus)
-    system.cpu.icache.connectBus(system.l2bus)
-
     system.l2cache = L2Cache(opts)
     system.l2cache.connectCPUSideBus(system.l2bus)
-    system.l2cache.fault_injector = fault_injector
+    system.l2cache.fault_injector = make_fault_injector()
 
     system.l3bus = L3XBar()
 
@@ -59,16 +92,17 @@ elif opts.cache_level == "3":
     system.l3cache = L3Cache(opts)
     system.l3cache.connectCPUSideBus(system.l3bus)
     system.l3cache.connectMemSideBus(system.membus)
-    system.l3cache.fault_injector = faultInjector
+    system.l3cache.fault_injector = make_fault_injector()
 
-system.cpu.createInterruptController()
+for cpu in system.cpu:
+    cpu.createInterruptController()
 
-# For x86 only, make sure the interrupts are connected to the memory
-# Note: these are directly connected to the memory bus and are not cached
-if m5.defines.buildEnv['TARGET_ISA'] == "x86":
-    system.cpu.interrupts[0].pio = system.membus.master
-    system.cpu.interrupts[0].int_master = system.membus.slave
-    system.cpu.interrupts[0].int_slave = system.membus.master
+    # For x86 only, make sure the interrupts are connected to the memory
+    # Note: these are directly connected to the memory bus and are not cached
+    if m5.defines.buildEnv['TARGET_ISA'] == "x86":
+        cpu.interrupts[0].pio = system.membus.master
+        cpu.interrupts[0].int_master = system.membus.slave
+        cpu.interrupts[0].int_slave = system.membus.master
 
 # Connect the system up to the membus
 system.system_port = system.membus.slave
@@ -82,13 +116,43 @@ process = Process()
 
 process.cmd = get_process_cmd(opts)
 
-# Set the cpu to use the process as its workload and create thread contexts
-system.cpu.workload = process
-system.cpu.createThreads()
+# Set the cpus to use the process as their workload and create thread contexts.
+# Threads that the program creates run on the idle cpus.
+for cpu in system.cpu:
+    cpu.workload = process
+    cpu.createThreads()
 
 root = Root(full_system = False, system = system)
-m5.instantiate()
+
+if opts.fork_inputs:
+    # Forking needs the listeners off
+    m5.disableAllListeners()
+    fault_inputs = campaign.read_fault_inputs(opts.fork_inputs)
+
+if opts.restore_checkpoint:
+    m5.instantiate(opts.restore_checkpoint)
+else:
+    m5.instantiate()
 
 print("Beginning simulation!")
-exit_event = m5.simulate()
-print('Exiting @ tick %i because %s' % (m5.curTick(), exit_event.getCause()))
+if opts.fork_inputs:
+    campaign.run(fault_injectors, fault_inputs, opts.fork_workers, opts.fork_timeout, opts.summary_file, max_ticks)
+elif opts.take_checkpoint:
+    exit_event = m5.simulate()
+    if exit_event.getCause() != "checkpoint":
+        print('Exiting @ tick %i because %s before fault injection started' % (m5.curTick(), exit_event.getCause()))
+        sys.exit(1)
+
+    m5.checkpoint(opts.take_checkpoint)
+    print('Checkpoint written @ tick %i to %s' % (m5.curTick(), opts.take_checkpoint))
+else:
+    simulation_start = campaign.simulation_point()
+    exit_event = m5.simulate(max_ticks)
+    print('Exiting @ tick %i because %s' % (m5.curTick(), exit_event.getCause()))
+
+    if opts.summary_file:
+        campaign.write_summary(opts.summary_file, exit_event, fault_injectors, start, simulation_start)
+
+    if opts.profile_path:
+        # Writes the profile of every fault injector
+        fault_injectors[0].writeProfile()
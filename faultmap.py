@@ -0,0 +1,225 @@
+#  Binary fault map packs.
+#
+#  A pack holds every fault map of one inputs/<voltage>/ directory. gem5 maps
+#  the file into memory and only reads the records of the selected map, so
+#  no text parsing is needed at simulation time. A map is selected with
+#  --input-path=<pack>@<index>.
+#
+#  Layout (little endian):
+#    header  : magic[8] version number_of_maps 4 x (assoc block_size)
+#    entries : number_of_maps x (name[24] first_record number_of_records)
+#    records : (set way byte_offset bit_offset type polarity cache)
+#
+#  The header holds the geometry of every cache, in the order of CACHE_IDS.
+#  The index of a fault is split into set and way with the associativity of
+#  the cache it targets, and the fault injector of a cache only checks the
+#  geometry of its own cache.
+#
+#  The layout must match FaultPackHeader, FaultPackGeometry, FaultPackEntry
+#  and FaultPackRecord in src/mem/cache/fault_injector/fault_injector.hh.
+#
+#  example run: python3 faultmap.py inputs/0.54V --l2-assoc 8
+
+import os
+import sys
+import glob
+import mmap
+import struct
+import argparse
+
+PACK_MAGIC = b"FIMAPPK\0"
+PACK_VERSION = 2
+PACK_EXTENSION = ".fmp"
+
+HEADER_FORMAT = struct.Struct("<8sII")
+GEOMETRY_FORMAT = struct.Struct("<II")
+ENTRY_FORMAT = struct.Struct("<24sII")
+RECORD_FORMAT = struct.Struct("<IHHBBBB")
+
+CACHE_IDS = {
+    'l1i' : 0,
+    'l1d' : 1,
+    'l2' : 2,
+    'l3' : 3
+}
+
+CACHE_NAMES = sorted(CACHE_IDS, key=CACHE_IDS.get)
+
+# Associativities of configs/fi_config/options.py
+DEFAULT_ASSOCS = {
+    'l1i' : 2,
+    'l1d' : 2,
+    'l2' : 8,
+    'l3' : 16
+}
+
+def map_index(input_path):
+    #  BRAM_1000.txt is sorted by its number, other names alphabetically
+    name = os.path.basename(input_path)[:-4]
+    number = name.split("_")[-1]
+
+    return (0, int(number), name) if number.isdigit() else (1, 0, name)
+
+def parse_text_map(input_path, assocs):
+    #  Faults as (set, way, byte_offset, bit_offset, type, polarity, cache), the fields of a record.
+    #  assocs holds the associativity of every cache by name
+    faults = []
+
+    with open(input_path) as input_file:
+        for line in input_file:
+            fields = line.split()
+            if len(fields) < 5:
+                continue
+
+            fault_type, index, byte_offset, bit_offset = [int(field) for field in fields[:4]]
+            cache = CACHE_IDS[fields[4]]
+            polarity = int(fields[5]) if len(fields) > 5 else 0
+            fault_set, fault_way = divmod(index, assocs[fields[4]])
+
+            faults.append((fault_set, fault_way, byte_offset, bit_offset, fault_type, polarity, cache))
+
+    return faults
+
+def read_text_map(input_path, assocs):
+    return [RECORD_FORMAT.pack(*fault) for fault in parse_text_map(input_path, assocs)]
+
+def get_entries_offset():
+    return HEADER_FORMAT.size + len(CACHE_IDS) * GEOMETRY_FORMAT.size
+
+def parse_pack_map(pack_path, index):
+    _, number_of_maps = read_header(pack_path)
+
+    with open(pack_path, "rb") as pack_file:
+        pack = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, first_record, number_of_records = ENTRY_FORMAT.unpack_from(pack, get_entries_offset() + index * ENTRY_FORMAT.size)
+        records_offset = get_entries_offset() + number_of_maps * ENTRY_FORMAT.size + first_record * RECORD_FORMAT.size
+
+        faults = [RECORD_FORMAT.unpack_from(pack, records_offset + i * RECORD_FORMAT.size) for i in range(number_of_records)]
+        pack.close()
+
+    return faults
+
+def parse_fault_input(input_path, assocs):
+    #  Faults of a text fault map or of <pack>@<index>, in the format of parse_text_map
+    pack_path, _, index = input_path.rpartition("@")
+
+    if pack_path and index.isdigit():
+        return parse_pack_map(pack_path, int(index))
+
+    return parse_text_map(input_path, assocs)
+
+def write_pack(pack_path, input_paths, assocs, block_size):
+    entries = []
+    records = []
+
+    for input_path in input_paths:
+        name = os.path.basename(input_path)[:-4].encode("utf-8")
+        map_records = read_text_map(input_path, assocs)
+
+        entries.append(ENTRY_FORMAT.pack(name, len(records), len(map_records)))
+        records.extend(map_records)
+
+    temporary_path = pack_path + ".tmp"
+
+    with open(temporary_path, "wb") as pack_file:
+        pack_file.write(HEADER_FORMAT.pack(PACK_MAGIC, PACK_VERSION, len(entries)))
+        pack_file.write(b"".join(GEOMETRY_FORMAT.pack(assocs[cache], block_size) for cache in CACHE_NAMES))
+        pack_file.write(b"".join(entries))
+        pack_file.write(b"".join(records))
+
+    os.rename(temporary_path, pack_path)
+
+def get_pack_path(input_dir, assocs):
+    #  Campaigns with other associativities get packs of their own, e.g. inputs/0.54V_assoc2-2-8-16.fmp
+    return input_dir.rstrip("/") + "_assoc" + "-".join(str(assocs[cache]) for cache in CACHE_NAMES) + PACK_EXTENSION
+
+def convert_directory(input_dir, pack_path="", assocs=DEFAULT_ASSOCS, block_size=64):
+    input_dir = input_dir.rstrip("/")
+    pack_path = pack_path if pack_path else get_pack_path(input_dir, assocs)
+
+    input_paths = sorted(glob.glob(input_dir + "/BRAM_*.txt"), key=map_index)
+
+    write_pack(pack_path, input_paths, assocs, block_size)
+
+    return pack_path
+
+def is_up_to_date(pack_path, input_dir, assocs=DEFAULT_ASSOCS, block_size=64):
+    if not os.path.exists(pack_path):
+        return False
+
+    # A pack of an older layout or of another geometry is made again
+    with open(pack_path, "rb") as pack_file:
+        magic, version, _ = HEADER_FORMAT.unpack(pack_file.read(HEADER_FORMAT.size))
+
+    if magic != PACK_MAGIC or version != PACK_VERSION:
+        return False
+
+    if read_geometry(pack_path) != dict((cache, (assocs[cache], block_size)) for cache in CACHE_NAMES):
+        return False
+
+    pack_time = os.path.getmtime(pack_path)
+
+    for input_path in glob.glob(input_dir.rstrip("/") + "/BRAM_*.txt"):
+        if os.path.getmtime(input_path) > pack_time:
+            return False
+
+    return os.path.getmtime(input_dir) <= pack_time
+
+def read_header(pack_path):
+    #  Version and number of maps of a pack
+    with open(pack_path, "rb") as pack_file:
+        magic, version, number_of_maps = HEADER_FORMAT.unpack(pack_file.read(HEADER_FORMAT.size))
+
+    if magic != PACK_MAGIC:
+        sys.exit(pack_path + " is not a fault map pack")
+
+    if version != PACK_VERSION:
+        sys.exit(pack_path + " has version " + str(version) + ", expected " + str(PACK_VERSION) + ", convert its directory again")
+
+    return version, number_of_maps
+
+def read_geometry(pack_path):
+    #  (assoc, block size) of every cache by name
+    read_header(pack_path)
+
+    with open(pack_path, "rb") as pack_file:
+        pack_file.seek(HEADER_FORMAT.size)
+        geometry = pack_file.read(len(CACHE_NAMES) * GEOMETRY_FORMAT.size)
+
+    return dict((cache, GEOMETRY_FORMAT.unpack_from(geometry, i * GEOMETRY_FORMAT.size)) for i, cache in enumerate(CACHE_NAMES))
+
+def read_names(pack_path):
+    _, number_of_maps = read_header(pack_path)
+
+    with open(pack_path, "rb") as pack_file:
+        pack_file.seek(get_entries_offset())
+        entries = pack_file.read(ENTRY_FORMAT.size * number_of_maps)
+
+    names = []
+    for i in range(number_of_maps):
+        name, _, _ = ENTRY_FORMAT.unpack_from(entries, i * ENTRY_FORMAT.size)
+        names.append(name.rstrip(b"\0").decode("utf-8"))
+
+    return names
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_dirs", nargs="+", help="Directories that contain BRAM_*.txt fault maps")
+    parser.add_argument("-o", "--output", help="Pack file, only with a single input directory", default="")
+    for cache in CACHE_NAMES:
+        parser.add_argument("--" + cache + "-assoc", type=int, help="Associativity the " + cache + " fault indices refer to", default=DEFAULT_ASSOCS[cache])
+    parser.add_argument("--block-size", type=int, help="Cache block size in bytes", default=64)
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = get_arguments()
+
+    if args.output and len(args.input_dirs) > 1:
+        sys.exit("--output can only be used with a single input directory")
+
+    for input_dir in args.input_dirs:
+        assocs = dict((cache, getattr(args, cache + "_assoc")) for cache in CACHE_NAMES)
+        pack_path = convert_directory(input_dir, args.output, assocs, args.block_size)
+        print(input_dir + " -> " + pack_path + " (" + str(len(read_names(pack_path))) + " maps)")
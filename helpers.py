@@ -4,8 +4,14 @@ import glob
 from shutil import rmtree
 import sys
 import subprocess
-import random
+import hashlib
+import tempfile
+import shutil
+import zlib
+import json
 import concurrent.futures
+import faultmap
+import quality
 
 #voltages = ["0.54V", "0.55V", "0.56V", "0.57V", "0.58V", "0.59V", "0.60V"]
 voltages = ["0.54V"]
@@ -13,10 +19,19 @@ voltages = ["0.54V"]
 WHERE_AM_I = os.path.dirname(os.path.realpath(__file__)) #  Absolute Path to *THIS* Script
 
 BENCH_INPUT_HOME = WHERE_AM_I + '/inputs/'
-RANDOM_PATH = BENCH_INPUT_HOME + "random"
+RANDOM_PREFIX = "random:" # random:<number of faults>:<seed>, see configs/fi_config/campaign.py
+
+# gem5 options of lean runs: no config dumps and no stats, configs/fi_config/run.py writes SUMMARY_FILE instead
+LEAN_OPTIONS = "--dump-config= --json-config= --dot-config= --stats-file="
+SUMMARY_FILE = "summary.json"
+
+WALL_CLOCK_SLACK = 300 # Seconds that a faulty run may take beyond hang_factor times its golden run, see getWallClockLimit
 
 BENCH_BIN_HOME = WHERE_AM_I + '/tests/test-progs'
 
+GEM5_BINARY = os.path.abspath(WHERE_AM_I + '/build/X86/gem5.opt')
+GEM5_SCRIPT = os.path.abspath(WHERE_AM_I + '/configs/fi_config/run.py')
+
 BENCH_BIN_DIR = {
     'matrix_mul' : os.path.abspath(BENCH_BIN_HOME + '/matrix_multiplication'),
     'blackscholes': os.path.abspath(BENCH_BIN_HOME + '/blackscholes'),
@@ -37,51 +52,89 @@ BENCH_BINARY = {
     'dct' : os.path.abspath(BENCH_BIN_DIR["dct"] + '/dct')
 }
 
-BENCH_QUALITY = {
-    'blackscholes': os.path.abspath(BENCH_BIN_DIR["blackscholes"] + '/error '),
-    'jacobi': os.path.abspath(BENCH_BIN_DIR["jacobi"] + '/error '),
-    'Kmeans' : os.path.abspath(BENCH_BIN_DIR["Kmeans"] + '/compare '),
-    'monteCarlo' : os.path.abspath(BENCH_BIN_DIR["monteCarlo"] + '/calc_errors '),
-    'sobel' : os.path.abspath(BENCH_BIN_DIR["sobel"] + '/psnr '),
-    'dct' : os.path.abspath(BENCH_BIN_DIR["dct"] + '/quality ')
+BENCH_CFLAGS = "-DFI"
+
+# m5 ops that the benchmark makefiles link, relative to BENCH_BIN_DIR
+M5OP_FILES = ['../../../../src/lib/m5op_x86.o', '../../../../src/lib/m5_mmap.o', '../../../../src/include/gem5/m5ops.h']
+SOURCE_EXTENSIONS = ('.c', '.h', '.cc', '.cpp', '.hpp', '.S')
+
+# Binaries and golden runs by the hash of what they are made of, shared by every campaign of this tree
+CACHE_HOME = WHERE_AM_I + '/fi_cache'
+GOLDEN_OUTPUT = 'golden.bin' # Name of the golden output in CACHE_HOME
+
+# Benchmarks that keep files open across fi_activate(START). This gem5 does not checkpoint file descriptors, see
+# Process::serialize, so a run restored from a checkpoint at START would have no host file behind them
+FILES_OPEN_AT_START = ['sobel', 'monteCarlo']
+
+# Quality metrics of an output that is identical to the golden output
+MASKED_METRICS = {
+    'blackscholes': ["0", "0"],
+    'jacobi': ["0", "0"],
+    'Kmeans' : ["0", "0", "1"],
+    'monteCarlo' : ["0", "0"],
+    'sobel' : ["inf"],
+    'dct' : ["inf"],
+    'matrix_mul' : []
 }
 
-def makeDirectories(bench_name, is_deterministic):
+def makeDirectories(bench_name, bench_voltages=voltages, variant=""):
 
-    bench_out_dir = getBenchOutDir(bench_name)
+    bench_out_dir = getBenchOutDir(bench_name, variant)
 
     if (os.path.exists(bench_out_dir) == False):
         os.mkdir(bench_out_dir)
 
-    for v in voltages:
+    for v in bench_voltages:
         if (os.path.exists(bench_out_dir + "/" + v ) == False):
             os.mkdir(bench_out_dir + "/" + v)
-    
-    if(not is_deterministic):
-        if(os.path.exists(RANDOM_PATH) == False):
-            os.mkdir(RANDOM_PATH)
 
-        if (os.path.exists(RANDOM_PATH + "/" + bench_name) == False):
-            os.mkdir(RANDOM_PATH + "/" + bench_name)
+def removeDirectories(bench_name):
+    # Builds, golden runs and checkpoints live in CACHE_HOME, so they survive between campaigns.
+    # The results of every variant of the benchmark are removed, see planner.py
+    for results_dir in glob.glob(getResultsDir(bench_name)) + glob.glob(getResultsDir(bench_name, "*")):
+        for path in glob.glob(results_dir + '/*') + glob.glob(results_dir + '/golden/*'):
+            if(path != results_dir + '/golden'):
+                if(os.path.isdir(path)):
+                    rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
 
-        for v in voltages:
-            if (os.path.exists(RANDOM_PATH + "/" + bench_name + "/" + v) == False):
-                os.mkdir(RANDOM_PATH + "/" + bench_name + "/" + v)
+    for bench_out_dir in glob.glob(getBenchOutDir(bench_name)) + glob.glob(getBenchOutDir(bench_name, "*")):
+        rmtree(bench_out_dir, ignore_errors=True)
 
-def removeDirectories(bench_name):
-    if (os.path.exists(WHERE_AM_I + '/' + bench_name + '_results')):
-        rmtree(WHERE_AM_I + '/' + bench_name + '_results', ignore_errors=True)
+def getSourceHash(bench_name):
+    # Sources and makefile of the benchmark and the m5 ops it links
+    source_hash = hashlib.sha1()
+    bench_dir = BENCH_BIN_DIR[bench_name]
+
+    paths = [name for name in os.listdir(bench_dir) if name.endswith(SOURCE_EXTENSIONS) or name.lower() == "makefile"]
+
+    for path in sorted(paths) + M5OP_FILES:
+        if(os.path.isfile(bench_dir + "/" + path)):
+            source_hash.update(path.encode("utf-8"))
+            with open(bench_dir + "/" + path, "rb") as source_file:
+                source_hash.update(source_file.read())
 
-    if(os.path.exists(getBenchOutDir(bench_name))):
-        rmtree(getBenchOutDir(bench_name), ignore_errors=True)
+    return source_hash.hexdigest()
 
-    if(os.path.exists(RANDOM_PATH + "/" + bench_name)):
-        rmtree(RANDOM_PATH + "/" + bench_name , ignore_errors=True)
+def getBuildDir(bench_name):
+    build_key = hashlib.sha1((getSourceHash(bench_name) + " " + BENCH_CFLAGS).encode("utf-8")).hexdigest()
+
+    return CACHE_HOME + "/builds/" + bench_name + "/" + build_key
 
 def compileBench(bench_name):
     if bench_name not in BENCH_BIN_DIR:
         print ( "Directory is not indexed" )
         sys.exit(-1)
+
+    build_dir = getBuildDir(bench_name)
+    cached_binary = build_dir + "/" + os.path.basename(BENCH_BINARY[bench_name])
+
+    if(os.path.exists(cached_binary)):
+        print("Reusing build of " + bench_name)
+        shutil.copy2(cached_binary, BENCH_BINARY[bench_name])
+        return
+
     os.chdir(BENCH_BIN_DIR[bench_name])        
 
     try:    
@@ -90,62 +143,406 @@ def compileBench(bench_name):
         sys.exit(str(e))
 
     try:    
-        subprocess.check_call(["make CFLAGS=-DFI"], shell=True)
+        subprocess.check_call(["make CFLAGS=" + BENCH_CFLAGS], shell=True)
     except Exception as e:
         sys.exit(str(e))
     os.chdir(WHERE_AM_I)
 
-def getBenchGoldenOut(bench_name):
-    return BENCH_BIN_DIR[bench_name] + "/golden.bin"
+    # Renamed into place, so an interrupted copy is never reused
+    if (os.path.exists(build_dir) == False):
+        os.makedirs(build_dir)
+    shutil.copy2(BENCH_BINARY[bench_name], cached_binary + ".tmp")
+    os.replace(cached_binary + ".tmp", cached_binary)
+
+# A benchmark that a campaign runs in several configurations keeps the outputs of each in its own variant, see planner.py
+def getVariantSuffix(variant):
+    return "_" + variant if variant else ""
+
+def moveOutputs(output_path, destination):
+    # The output of Kmeans is a prefix of several files, every file that starts with output_path is moved
+    if(output_path == destination):
+        return
+
+    for path in glob.glob(glob.escape(output_path) + "*"):
+        shutil.move(path, destination + path[len(output_path):])
+
+def getBenchGoldenOut(bench_name, variant=""):
+    return BENCH_BIN_DIR[bench_name] + "/golden" + getVariantSuffix(variant) + ".bin"
+
+def getBenchFaultyOut(bench_name, voltage, input_name, variant=""):
+    return getBenchOutDir(bench_name, variant) + "/" + voltage + "/" + input_name
+
+def getBenchOutDir(bench_name, variant=""):
+    return BENCH_BIN_DIR[bench_name] + "/outputs" + getVariantSuffix(variant)
+
+def getResultsDir(bench_name, variant=""):
+    return WHERE_AM_I + "/" + bench_name + getVariantSuffix(variant) + "_results"
+
+def getGoldenDir(bench_name, variant=""):
+    return getResultsDir(bench_name, variant) + "/golden"
+
+def getSimOutDir(bench_name, voltage, input_name, variant=""):
+    return getResultsDir(bench_name, variant) + "/faulty/" + voltage + "/" + input_name
+
+def getScratchDir(args, voltage, input_name):
+    # Node local output directory of a lean run, the config hash keeps campaigns that share a node apart
+    return args.scratch_dir + "/" + args.bench_name + "_" + args.config_hash + "/" + voltage + "/" + input_name
+
+def getCheckpointHome(bench_name):
+    return CACHE_HOME + "/checkpoints/" + bench_name
+
+def getRunKey(bench_name, script_options):
+    key = hashlib.sha1()
+
+    with open(BENCH_BINARY[bench_name], "rb") as binary_file:
+        key.update(binary_file.read())
+
+    key.update(script_options.encode("utf-8"))
+
+    return key.hexdigest()
+
+_simulator_hashes = {}
+
+def getSimulatorHash():
+    # The gem5 binary and the scripts of configs/fi_config, which write the golden outputs, profiles, summaries and checkpoints
+    paths = [GEM5_BINARY] + sorted(glob.glob(os.path.dirname(GEM5_SCRIPT) + "/*.py"))
+    stamp = tuple((path, os.path.getmtime(path), os.path.getsize(path)) for path in paths if os.path.isfile(path))
 
-def getBenchFaultyOut(bench_name, voltage, input_name):
-    return getBenchOutDir(bench_name) + "/" + voltage + "/" + input_name
+    # gem5.opt is large, it is only read again when it changes
+    if(stamp not in _simulator_hashes):
+        simulator_hash = hashlib.sha1()
+        for path, _, _ in stamp:
+            simulator_hash.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as simulator_file:
+                for chunk in iter(lambda: simulator_file.read(1 << 20), b""):
+                    simulator_hash.update(chunk)
 
-def getBenchOutDir(bench_name):
-    return BENCH_BIN_DIR[bench_name] + "/outputs"
+        _simulator_hashes[stamp] = simulator_hash.hexdigest()
 
-def getSimOutDir(bench_name, voltage, input_name):
-    return WHERE_AM_I + "/" + bench_name + "_results/faulty/" + voltage + "/" + input_name
+    return _simulator_hashes[stamp]
+
+def getCacheKey(bench_name, script_options):
+    # Key of a golden run or checkpoint in CACHE_HOME, which a rebuilt simulator or changed config scripts invalidate
+    return getRunKey(bench_name, getSimulatorHash() + " " + script_options)
+
+def getCheckpointDir(bench_name, script_options):
+    # The checkpoint is only valid for the same simulator, binary, options and cache hierarchy
+    return getCheckpointHome(bench_name) + "/" + getCacheKey(bench_name, script_options)
+
+def getGoldenCacheDir(bench_name, golden_key):
+    # Output, stats, access profile and runtime of a golden run
+    return CACHE_HOME + "/golden/" + bench_name + "/" + golden_key
+
+def getGoldenFiles(args):
+    # (path in the results tree, name in the golden cache) of every artefact of a golden run
+    golden_dir = getGoldenDir(args.bench_name, args.variant)
+    golden_out = getBenchGoldenOut(args.bench_name, args.variant)
+
+    # The output of Kmeans is a prefix of several files. The cache names them like the output of no variant, so that variants share it
+    files = [(path, GOLDEN_OUTPUT + path[len(golden_out):]) for path in glob.glob(glob.escape(golden_out) + "*")]
+    files += [(golden_dir + "/stats.txt", "stats.txt"), (golden_dir + "/output.txt", "output.txt")]
+
+    if(canPrune(args)):
+        files.append((getProfilePath(args.bench_name, args.variant), "golden_profile.npy"))
+
+    return files
+
+def restoreGoldenRun(args, golden_key):
+    # Copies a cached golden run into the results tree and returns its record, None when it is not cached
+    golden_cache_dir = getGoldenCacheDir(args.bench_name, golden_key)
 
-def getNumberOfErrors(input_path, voltage):
-    grep_number_of_lines = 'grep ' + '"[0-9]" -c ' + input_path
-    
     try:
-        result = subprocess.Popen(grep_number_of_lines, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode('utf-8')
-    except Exception as e:
-        sys.exit(str(e))
+        with open(golden_cache_dir + "/golden_run.json") as golden_record_file:
+            golden_record = json.load(golden_record_file)
+    except (IOError, ValueError):
+        return None
+
+    golden_dir = getGoldenDir(args.bench_name, args.variant)
+    if (os.path.exists(golden_dir) == False):
+        os.makedirs(golden_dir)
+
+    for name in golden_record["files"]:
+        if(name.startswith(GOLDEN_OUTPUT)):
+            path = getBenchGoldenOut(args.bench_name, args.variant) + name[len(GOLDEN_OUTPUT):]
+        elif(name == "golden_profile.npy"):
+            path = getProfilePath(args.bench_name, args.variant)
+        else:
+            path = golden_dir + "/" + name
+
+        shutil.copy2(golden_cache_dir + "/" + name, path)
+
+    return golden_record
+
+def storeGoldenRun(args, golden_key, seconds):
+    # Returns the record of the golden run
+    golden_cache_dir = getGoldenCacheDir(args.bench_name, golden_key)
+    if (os.path.exists(golden_cache_dir) == False):
+        os.makedirs(golden_cache_dir)
+
+    names = []
+    for path, name in getGoldenFiles(args):
+        if(os.path.exists(path)):
+            shutil.copy2(path, golden_cache_dir + "/" + name)
+            names.append(name)
+
+    ticks, insts = readGoldenCounts(getGoldenDir(args.bench_name, args.variant))
+    golden_record = {"key": golden_key, "seconds": seconds, "ticks": ticks, "insts": insts, "files": names}
+
+    # Written last, a golden run without its record is not reused
+    with open(golden_cache_dir + "/golden_run.json", "w") as golden_record_file:
+        json.dump(golden_record, golden_record_file)
+
+    return golden_record
+
+def getExecutionMode(args):
+    # Restored runs start with cold caches and fork children draw other transient arrivals than plain runs,
+    # so their outcomes are kept apart. Plain runs add nothing, which keeps the hashes of earlier campaigns
+    if(args.checkpoint):
+        return "checkpoint"
+    elif(args.fork):
+        return "fork"
+
+    return ""
+
+def getConfigHash(args):
+    # Everything but the fault map that changes the outcome of a faulty run
+    config = ' '.join([get_binary_options(args, "", False, "", "output"), args.cache_level, args.l1d_size, args.l1i_size, args.l2_size, args.l3_size,
+                       str(args.l1d_assoc), str(args.l1i_assoc), str(args.l2_assoc), str(args.l3_assoc), ' '.join(args.transient_rates),
+                       getRandomOptions(args), str(args.hang_factor)])
+
+    # The cache geometry that is passed to gem5, the defaults of the gem5 script differ from the ones above
+    if(args.cache_options):
+        config += ' ' + getCacheOptions(args)
+
+    if(getExecutionMode(args)):
+        config += ' ' + getExecutionMode(args)
+
+    return getRunKey(args.bench_name, config)
+
+def getShardPath(path, shard):
+    # Every shard of a campaign writes its own files, merged at the end
+    return path if shard < 0 else path + ".shard" + str(shard)
+
+def getManifestPath(bench_name, shard=-1):
+    # Shared by the variants of the benchmark, their records differ in the config hash
+    return getShardPath(getResultsDir(bench_name) + "/manifest.jsonl", shard)
+
+def readManifest(bench_name, config_hash):
+    # Finished runs of this configuration as {(voltage, input name): record}
+    records = {}
+
+    # The manifests of every shard
+    for manifest_path in sorted(glob.glob(getManifestPath(bench_name) + "*")):
+        with open(manifest_path) as manifest_file:
+            for line in manifest_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # Cut short by a killed job
+
+                if(record["config"] == config_hash):
+                    records[(record["voltage"], record["input"])] = record
+
+    return records
+
+def appendManifest(bench_name, record, shard=-1):
+    # A single write to a file opened with O_APPEND, so that parallel runs do not interleave their records
+    line = json.dumps(record, sort_keys=True) + "\n"
+
+    manifest_fd = os.open(getManifestPath(bench_name, shard), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(manifest_fd, line.encode("utf-8"))
+    finally:
+        os.close(manifest_fd)
+
+def getProfilePath(bench_name, variant=""):
+    return getResultsDir(bench_name, variant) + "/golden_profile.npy"
+
+def loadUsedCells(bench_name, variant=""):
+    import numpy # Only needed to prune fault maps
+
+    profile = numpy.load(getProfilePath(bench_name, variant))
+
+    return set(zip(profile["cache"].tolist(), profile["set"].tolist(), profile["way"].tolist(), profile["byte"].tolist()))
+
+def getCacheAssocs(args):
+    # Associativity of every cache by name, the indices of the fault maps are split into set and way with the one of their cache
+    return {'l1i': args.l1i_assoc, 'l1d': args.l1d_assoc, 'l2': args.l2_assoc, 'l3': args.l3_assoc}
+
+def isTriviallyMasked(input_path, assocs, used_cells):
+    # A fault in a byte that the golden run never reads or writes back after fi_activate(START) cannot reach the program
+    for fault_set, fault_way, byte_offset, _, _, _, cache in faultmap.parse_fault_input(input_path, assocs):
+        if((cache, fault_set, fault_way, byte_offset) in used_cells):
+            return False
+
+    return True
+
+def pruneFaultInputs(args, fault_inputs):
+    used_cells = loadUsedCells(args.bench_name, args.variant)
+
+    remaining_inputs = []
+    masked_inputs = []
+
+    for fault_input in fault_inputs:
+        # The faults of random inputs are only known inside the simulator
+        if(fault_input[0].startswith(RANDOM_PREFIX)):
+            remaining_inputs.append(fault_input)
+        elif(isTriviallyMasked(fault_input[0], getCacheAssocs(args), used_cells)):
+            masked_inputs.append(fault_input)
+        else:
+            remaining_inputs.append(fault_input)
+
+    return remaining_inputs, masked_inputs
 
-    return int(result)
+def canPrune(args):
+    # Runs restored from a checkpoint start with cold caches, so their blocks are not placed in the ways that the golden run profiled
+    return args.prune and not args.checkpoint
 
-def createRandomInput(input_path, voltage, number_of_errors, bench_name):
-    input_name = input_path.split("/")[-1]
+def getTransientRate(args, voltage):
+    # Transient faults per simulated second and cache at a voltage, empty without an arrival process
+    for voltage_rate in args.transient_rates:
+        rate_voltage, rate = voltage_rate.split("=")
+        if(rate_voltage == voltage):
+            return rate
 
-    with open(RANDOM_PATH + "/" + bench_name + "/" + voltage + "/" + input_name, "w") as input_file:
-        for _ in range(number_of_errors):
-            fault_type = 0
-            fault_set = random.randint(0,31)
-            fault_byte_offset = random.randint(0,63)
-            fault_bit_offset = random.randint(0,7)
-            fault_cache_type = "l1d"
+    return ""
 
-            line = ' '.join([str(fault_type), str(fault_set), str(fault_byte_offset), str(fault_bit_offset), fault_cache_type + "\n"])
+def getTransientOptions(args, voltage, input_name):
+    # Arrival process of transient faults, seeded per fault input so that every run sees another realisation
+    rate = getTransientRate(args, voltage)
+    if(not rate):
+        return ""
 
-            input_file.write(line)
+    return "--transient-rate=" + rate + " --transient-seed=" + str(zlib.crc32(input_name.encode("utf-8")) & 0xfffffff)
 
-def createRandomInputs(bench_name):
-    for voltage in voltages:
-        input_paths = glob.glob(BENCH_INPUT_HOME + voltage + "/BRAM_*.txt")
+def getNumberOfFaults(input_path, assocs):
+    if(input_path.startswith(RANDOM_PREFIX)):
+        return int(input_path[len(RANDOM_PREFIX):].split(":")[0])
 
-        for input_path in input_paths:
-            number_of_errors = getNumberOfErrors(input_path, voltage)
-            createRandomInput(input_path, voltage, number_of_errors, bench_name)
+    return len(faultmap.parse_fault_input(input_path, assocs))
+
+def shardJobs(jobs, number_of_shards):
+    # Longest expected job first to the shard with the least expected work, the same partition for every shard
+    shards = [[] for _ in range(number_of_shards)]
+    loads = [0.0] * number_of_shards
+
+    for job in sorted(jobs, key=lambda job: job[0], reverse=True):
+        shard = loads.index(min(loads))
+        shards[shard].append(job)
+        loads[shard] += job[0][0]
+
+    return shards
+
+def getPassThroughArguments(argv):
+    # The arguments of run.py without the ones that select the stage, the shard or the Slurm script
+    stage_options = ("--stage", "--shard", "--shards", "--emit-slurm")
+    arguments = []
+    skip_value = False
+
+    for argument in argv:
+        if(skip_value):
+            skip_value = False
+        elif(argument in stage_options):
+            skip_value = True
+        elif(argument.split("=")[0] not in stage_options):
+            arguments.append(argument)
+
+    return arguments
+
+def getCacheOptions(args):
+    # Cache geometry that a campaign file sets, the gem5 script keeps its defaults for the rest
+    return ' '.join('--' + name.replace('_', '-') + '=' + str(getattr(args, name)) for name in args.cache_options)
+
+def getBudgetOptions(args):
+    # Faulty runs that simulate hang_factor times longer than the golden run stop with a hang cause
+    if(args.hang_factor <= 0 or not args.golden_ticks or not args.golden_insts):
+        return ''
+
+    return '--max-ticks=%d --max-insts=%d' % (args.hang_factor * args.golden_ticks, args.hang_factor * args.golden_insts)
+
+def getWallClockLimit(args):
+    # Host seconds after which a faulty run is killed as Hang, None for no limit. A run that still simulates after hang_factor times
+    # the host seconds of the golden run, plus the startup and restore time of gem5, is far past its tick and instruction budget
+    if(args.hang_factor <= 0 or not args.golden_seconds):
+        return None
+
+    return int(args.hang_factor * args.golden_seconds) + WALL_CLOCK_SLACK
+
+def getRandomOptions(args):
+    return ("--random-distribution=" + args.random_distribution) if args.random else ""
+
+def getRandomInputs(args, voltage):
+    # One random input per fault map, with as many faults as the map. The simulator draws them from the cache geometry.
+    fault_inputs = []
+
+    for input_path in glob.glob(BENCH_INPUT_HOME + voltage + "/BRAM_*.txt"):
+        input_name = input_path.split("/")[-1]
+        number_of_errors = getNumberOfFaults(input_path, getCacheAssocs(args))
+        seed = zlib.crc32((voltage + "/" + input_name).encode("utf-8")) & 0xfffffff
+
+        fault_inputs.append((RANDOM_PREFIX + str(number_of_errors) + ":" + str(seed), input_name))
+
+    return fault_inputs
+
+def getFaultInputs(args, voltage):
+    if(args.random):
+        return getRandomInputs(args, voltage)
+
+    input_dir = BENCH_INPUT_HOME + voltage
+
+    if(not args.pack):
+        input_paths = glob.glob(input_dir + "/BRAM_*.txt")
+        return [(input_path, input_path.split("/")[-1]) for input_path in input_paths]
+
+    # Every cache's indices are split with its own associativity, so campaigns with other geometries use other packs
+    assocs = getCacheAssocs(args)
+    pack_path = faultmap.get_pack_path(input_dir, assocs)
+    if(not faultmap.is_up_to_date(pack_path, input_dir, assocs)):
+        faultmap.convert_directory(input_dir, pack_path, assocs)
+
+    names = faultmap.read_names(pack_path)
+    return [(pack_path + "@" + str(i), name + ".txt") for i, name in enumerate(names)]
 
 def get_arguments():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-c','--bench-name', help='Benchmark\'s name', default='matrix_mul')
+    parser.add_argument('-c','--bench-name', dest='bench_names', nargs='+', help='Names of the benchmarks, their fault maps share one work queue', default=['matrix_mul'])
+    parser.add_argument('--voltages', nargs='+', default=voltages, help='Voltages whose fault maps are simulated')
+    parser.add_argument('--campaign', default='', help='JSON or TOML file that declares the benchmarks, argument sets, voltages, cache geometries and levels of a campaign, '
+                        'it replaces --bench-name and --voltages, see planner.py')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Number of faulty runs simulated at the same time')
     parser.add_argument('-f', '--flags', action='store', nargs='*', help='All gem5 debug flags')
-    parser.add_argument('-r', '--random', action='store_true')
+    parser.add_argument('-r', '--random', action='store_true', help='Replace every fault map by as many random faults, generated in the simulator')
+    parser.add_argument('--random-distribution', default='uniform', choices=['uniform', 'block', 'column'], help='How random faults are spread over the L1D cache')
     parser.add_argument('-l', '--cache-level', action='store', default="1")
+    parser.add_argument('-p', '--pack', action='store_true', help='Read fault maps from binary packs made by faultmap.py')
+    parser.add_argument('--fork', action='store_true', help='Simulate up to fi_activate(START) once per voltage and fork one child per fault map')
+    parser.add_argument('--checkpoint', action='store_true', help='Checkpoint at fi_activate(START) once and restore every faulty run from it. '
+                        'Classic caches do not checkpoint their blocks, so restored runs start with cold caches and their results are kept apart from plain runs. '
+                        'Not for benchmarks that keep files open across START, see FILES_OPEN_AT_START')
+    parser.add_argument('--transient-rates', nargs='*', default=[], help='Transient faults per simulated second and cache as <voltage>=<rate>, e.g. 0.54V=2000')
+    parser.add_argument('--prune', action='store_true', help='Profile the golden run and do not simulate fault maps whose cells it never reads. '
+                        'Maps at voltages with --transient-rates and maps of --checkpoint runs are always simulated')
+    parser.add_argument('--results-db', default=WHERE_AM_I + '/results.db', help='SQLite database that stores the runs of every benchmark, see resultstore.py')
+    parser.add_argument('--sample-margin', type=float, default=0.0, help='Simulate the maps of every benchmark and voltage in a random order and stop once every outcome rate is known to +- this margin, 0 simulates every map. With shards, every shard samples its own maps')
+    parser.add_argument('--sample-interval', default='wilson', choices=['wilson', 'clopper-pearson'], help='Confidence interval of the outcome rates')
+    parser.add_argument('--sample-confidence', type=float, default=0.95)
+    parser.add_argument('--sample-seed', type=int, default=1, help='Seed of the order in which maps are sampled')
+    parser.add_argument('--stage', default='all', choices=['all', 'prepare', 'shard', 'merge'], help='Run one stage of a sharded campaign: prepare compiles and runs the golden runs, shard runs one shard, merge collects the shards')
+    parser.add_argument('--shards', type=int, default=1, help='Number of shards, balanced by expected runtime. Without --stage, the shards run as local processes')
+    parser.add_argument('--shard', type=int, default=int(os.environ.get('SLURM_ARRAY_TASK_ID', -1)), help='Shard to run, the Slurm array task id by default')
+    parser.add_argument('--emit-slurm', default='', help='Write a script that submits prepare, an array job of --shards tasks and merge, then exit')
+    parser.add_argument('--slurm-account', default='users')
+    parser.add_argument('--slurm-partition', default='short')
+    parser.add_argument('--slurm-time', type=int, default=1440, help='Time limit of every job in minutes')
+    parser.add_argument('--slurm-ntasks', type=int, default=18, help='Cores of every shard')
+    parser.add_argument('--hang-factor', type=float, default=10.0, help='Stop faulty runs as Hang once they simulate this many times the ticks or instructions of the golden run, '
+                        'or run this many times its host seconds, 0 for no limit')
+    parser.add_argument('--lean', action='store_true', help='Simulate faulty runs without config dumps, stats or debug file in --scratch-dir and keep their outputs only if they are Incorrect, Crash or Hang')
+    parser.add_argument('--scratch-dir', default='/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), help='Node local directory of lean runs')
+    parser.add_argument('--status-file', default=WHERE_AM_I + '/campaign_status.json', help='JSON status of the running campaign, rewritten every --status-interval seconds, see telemetry.py')
+    parser.add_argument('--status-interval', type=int, default=30)
+    parser.add_argument('--slow-factor', type=float, default=100.0, help='Report runs that take this many times longer than the golden run')
+    parser.add_argument('--fresh', action='store_true', help='Remove the results of previous runs instead of resuming from the manifest')
 
     # Cache Options
     parser.add_argument("--l1d-size", default="64kB")
@@ -193,15 +590,23 @@ def get_arguments():
     # Options for matrix multiplication application : example run: ./matrix_mul 'output file'
     parser.add_argument("--matrix-output", help="Output file", default="output.txt")
 
-    return parser.parse_args()
+    args = parser.parse_args()
 
-def get_binary_options(args, voltage="", is_golden = False, input_name=""):
+    if(args.fork and args.sample_margin > 0):
+        parser.error("--fork simulates every map, it cannot be used with --sample-margin")
+
+    return args
+
+def get_binary_options(args, voltage="", is_golden = False, input_name="", output_path=""):
         bench_binary_options = ''
-        golden_option = "--output=" + getBenchGoldenOut(args.bench_name)
-        faulty_option = "--output=" + getBenchFaultyOut(args.bench_name,voltage,input_name)
+        golden_option = "--output=" + getBenchGoldenOut(args.bench_name, args.variant)
+        faulty_option = "--output=" + getBenchFaultyOut(args.bench_name,voltage,input_name, args.variant)
 
         output = golden_option if is_golden else faulty_option
 
+        if(output_path):
+            output = "--output=" + output_path
+
         if(args.bench_name == "blackscholes"):
             blackscholes_input = "--blackscholes-input=" + args.blackscholes_input
             
@@ -247,112 +652,85 @@ def get_binary_options(args, voltage="", is_golden = False, input_name=""):
 
         return bench_binary_options
 
-def write_results(input_name, args, voltage, result):
-
-    with open(getSimOutDir(args.bench_name, voltage, input_name) + "/result.txt", "w") as result_file:
-        if(args.bench_name == "blackscholes" or args.bench_name == "jacobi"):
-            RE = "1.0"
-            ABSE = "1.0"
-
-            if(result != "Crash"):
-                output_path = args.blackscholes_output if args.bench_name == "blackscholes" else args.jacobi_output
-                error_command = BENCH_QUALITY[args.bench_name] + output_path + " " + getBenchFaultyOut(args.bench_name,voltage,input_name) 
-                
-                try:
-                    error_string = subprocess.Popen(error_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-                except Exception as e:
-                    sys.exit(str(e))
-
-                output = error_string.split(",")
-                RE = output[0].strip()
-                ABSE = output[1].strip()
-
-            line = ",".join([input_name[:-4], result, RE, ABSE + "\n"])
-        elif(args.bench_name == "dct"):
-            quality = "0.0"
-            
-            if(result != "Crash"):
-                quality_command = BENCH_QUALITY[args.bench_name] + args.dct_input + " " + getBenchGoldenOut(args.bench_name) + " " + getBenchFaultyOut(args.bench_name,voltage,input_name) 
-
-                try:
-                    quality_string = subprocess.Popen(quality_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-                except Exception as e:
-                    sys.exit(e)
-
-                output = quality_string.split(",")
-                quality = output[1].strip()
-
-            line = ",".join([input_name[:-4], result, quality + "\n"])
-
-        elif(args.bench_name == "Kmeans"):
-            cluster_relative_error = "inf"
-            cluster_absolute_error = "inf"
-            correct_membership_percentage = "inf"
-
-            if(result != "Crash"):
-                grep_number_of_lines = 'grep "[0-9]" ' + args.kmeans_i + " -c"
-
-                try:
-                    number_of_lines = subprocess.Popen(grep_number_of_lines, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-                except Exception as e:
-                    sys.exit(str(e))
-                
-                compare_command = BENCH_QUALITY[args.bench_name] + getBenchGoldenOut(args.bench_name) + " " + getBenchFaultyOut(args.bench_name,voltage,input_name)  + " " + number_of_lines
-                
-                try:
-                    compare_string = subprocess.Popen(compare_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-                except Exception as e:
-                    sys.exit(str(e))
-
-                output = compare_string.rstrip().split("\n")
-                res = output[-1].split(",")
-                cluster_relative_error = res[0]
-                cluster_absolute_error = res[1]
-                correct_membership_percentage = res[2]
-
-            line = ",".join([input_name[:-4], result, cluster_relative_error, cluster_absolute_error, correct_membership_percentage + "\n"])
-
-        elif(args.bench_name == "monteCarlo"):
-            MSE = "1.0"
-            RE = "1.0"
-
-            if(result != "Crash"):
-                calc_errors_command = BENCH_QUALITY[args.bench_name] + args.monte_output + " " + getBenchFaultyOut(args.bench_name,voltage,input_name) 
-                
-                try:
-                    calc_errors_string = subprocess.Popen(calc_errors_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-                except Exception as e:
-                    sys.exit(str(e))
-
-                output = calc_errors_string.split(",")
-                MSE = output[0].strip()
-                RE = output[1].strip()
+def readSummary(sim_out_dir):
+    # Summary record that configs/fi_config/run.py writes at the end of a run, None when the run ended before
+    try:
+        with open(sim_out_dir + "/" + SUMMARY_FILE) as summary_file:
+            return json.load(summary_file)
+    except (IOError, ValueError):
+        return None
 
-            line = ",".join([input_name[:-4], result, MSE, RE + "\n"])
-        elif(args.bench_name == "sobel"):
-            psnr = "0.0"
+def readRunSummary(sim_out_dir):
+    # Simulated ticks, committed instructions, host seconds, instruction rate and injected bits of the summary of a run, None when it wrote none
+    summary = readSummary(sim_out_dir)
+    if(summary is None):
+        return None
 
-            if(result != "Crash"):
-                psnr_command = BENCH_QUALITY[args.bench_name] + getBenchFaultyOut(args.bench_name,voltage,input_name)  + " " + getBenchGoldenOut(args.bench_name)
+    return summary["tick"], summary.get("insts"), summary["host_seconds"], summary.get("host_inst_rate"), summary["injections"]
 
-                try:
-                    psnr_string = subprocess.Popen(psnr_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-                except Exception as e:
-                    sys.exit(str(e))
+def readGoldenCounts(golden_dir):
+    # Simulated ticks and committed instructions of the last statistics dump of the golden run, None when it wrote none
+    counts = {}
 
-                psnr = psnr_string.split(":")[1].strip()
+    try:
+        with open(golden_dir + "/stats.txt") as stats_file:
+            for line in stats_file:
+                fields = line.split()
+                if(len(fields) >= 2 and fields[0] in ("sim_ticks", "sim_insts")):
+                    counts[fields[0]] = int(fields[1])
+    except (IOError, ValueError):
+        pass
 
-            line = ",".join([input_name[:-4], result, psnr + "\n"])
-        elif(args.bench_name == "matrix_mul"):
-            line = ",".join([input_name[:-4], result + "\n"])
+    return counts.get("sim_ticks"), counts.get("sim_insts")
 
-        result_file.write(line)
+def readRunStats(sim_out_dir):
+    # Simulated ticks, committed instructions, host seconds, instruction rate and injected bits of the last statistics dump of a run, None when it wrote none
+    summary = readRunSummary(sim_out_dir)
+    if(summary):
+        return summary
 
-def mergeResults(bench_name, voltage):
-    output_paths = glob.glob(WHERE_AM_I + "/" + bench_name + "_results/faulty/" + voltage + "/BRAM_*.txt")
+    stats = {}
 
-    with open(WHERE_AM_I + "/" + bench_name + "_results/" + voltage + "_results.txt","a") as results_file:
-        for out_path in output_paths:
-            with open(out_path + "/result.txt") as result_file:
-                result = result_file.read()
-                results_file.write(result)
+    try:
+        with open(sim_out_dir + "/stats.txt") as stats_file:
+            for line in stats_file:
+                fields = line.split()
+                if(line.startswith("---------- Begin")):
+                    stats = {"injections": 0}
+                elif(len(fields) < 2):
+                    continue
+                elif(fields[0] in ("sim_ticks", "sim_insts", "host_seconds", "host_inst_rate")):
+                    stats[fields[0]] = float(fields[1])
+                elif(".bitsCorrupted::" in fields[0] and not fields[0].endswith("::total")):
+                    stats["injections"] += int(fields[1])
+    except IOError:
+        pass
+
+    sim_ticks = int(stats["sim_ticks"]) if "sim_ticks" in stats else None
+    sim_insts = int(stats["sim_insts"]) if "sim_insts" in stats else None
+
+    return sim_ticks, sim_insts, stats.get("host_seconds"), stats.get("host_inst_rate"), stats.get("injections")
+
+def write_results(input_name, args, voltage, result, masked=False, simulated=True, sim_out_dir="", output_path="", crash=None):
+    # Journals the run and returns its record for the results store. Lean runs pass their scratch directory and output,
+    # Crash runs the kind of crash
+    sim_out_dir = sim_out_dir or getSimOutDir(args.bench_name, voltage, input_name, args.variant)
+    output_path = output_path or getBenchFaultyOut(args.bench_name, voltage, input_name, args.variant)
+
+    if(masked):
+        # No fault reached the program, there is nothing for the quality metrics to measure
+        metrics = MASKED_METRICS[args.bench_name]
+    elif(result in ("Crash", "Hang")):
+        metrics = quality.CRASH_METRICS[args.bench_name]
+    else:
+        metrics = quality.metrics(args, getBenchGoldenOut(args.bench_name, args.variant), output_path)
+
+    sim_ticks, sim_insts, host_seconds, host_inst_rate, injections = readRunStats(sim_out_dir) if simulated else (None, None, None, None, None)
+
+    record = {"bench": args.bench_name, "voltage": voltage, "input": input_name, "config": args.config_hash, "result": result, "crash": crash, "masked": masked,
+              "metrics": metrics, "sim_ticks": sim_ticks, "sim_insts": sim_insts, "host_seconds": host_seconds, "host_inst_rate": host_inst_rate,
+              "injections": injections}
+
+    appendManifest(args.bench_name, record, args.shard)
+
+    return record
@@ -0,0 +1,142 @@
+#  Campaign files.
+#
+#  A campaign file declares the cross product that run.py simulates:
+#
+#    {
+#        "benchmarks": {
+#            "sobel": [{"sobel_input": "inputs/sobel/lena.bin"}],
+#            "matrix_mul": {}
+#        },
+#        "voltages": ["0.54V", "0.55V"],
+#        "caches": [{"l1d_size": "2kB", "l1d_assoc": 2}, {"l1d_size": "4kB", "l1d_assoc": 4}],
+#        "cache_levels": ["1", "2"],
+#        "options": {"transient_rates": ["0.54V=2000"]}
+#    }
+#
+#  or the same in TOML. Every benchmark has one or more argument sets, the
+#  arguments of run.py for that benchmark. Every cache geometry sets
+#  l1d/l1i/l2/l3 sizes and associativities that are passed to gem5. options
+#  sets any other argument of run.py for the whole campaign. Voltages,
+#  caches and levels that are left out are the ones of the command line.
+#
+#  The planner expands the file into one configuration per benchmark,
+#  argument set, cache geometry and level. Configurations with the same
+#  config hash are simulated once, for the union of their voltages. A
+#  benchmark with several configurations keeps the outputs of each in its
+#  own variant, named after its config hash. Golden runs are cached by what
+#  they depend on, so configurations that only differ in e.g. transient
+#  rates share theirs.
+#
+#  example run: python3 planner.py --campaign sweep.json
+
+import sys
+import argparse
+import itertools
+import json
+
+import helpers
+
+CACHE_ARGUMENTS = ["l1d_size", "l1i_size", "l2_size", "l3_size", "l1d_assoc", "l1i_assoc", "l2_assoc", "l3_assoc"]
+
+def read_campaign(path):
+    if path.endswith(".toml"):
+        import tomllib # Python 3.11, only needed for TOML campaign files
+
+        with open(path, "rb") as campaign_file:
+            return tomllib.load(campaign_file)
+
+    with open(path) as campaign_file:
+        return json.load(campaign_file)
+
+def set_arguments(args, values, where):
+    #  Arguments of run.py by their name, with - or _, in the type of their default
+    for name, value in values.items():
+        name = name.replace("-", "_")
+
+        if not hasattr(args, name):
+            sys.exit("Unknown argument " + name + " in " + where)
+
+        default = getattr(args, name)
+        if isinstance(default, str) and not isinstance(value, str):
+            value = str(value)
+
+        setattr(args, name, value)
+
+def load_campaign(args):
+    #  The campaign file of args, None without one. Its options are set in args
+    if not args.campaign:
+        return None
+
+    spec = read_campaign(args.campaign)
+
+    unknown = set(spec) - set(["benchmarks", "voltages", "caches", "cache_levels", "options"])
+    if unknown:
+        sys.exit("Unknown keys " + ", ".join(sorted(unknown)) + " in " + args.campaign)
+
+    set_arguments(args, spec.get("options", {}), args.campaign + " options")
+
+    return spec
+
+def expand(args, spec):
+    #  One copy of args per configuration, the benchmarks of the command line without a campaign file
+    if spec is None:
+        spec = {"benchmarks": dict((bench_name, {}) for bench_name in args.bench_names)}
+
+    voltages = spec.get("voltages", args.voltages)
+    caches = spec.get("caches", [{}])
+    cache_levels = spec.get("cache_levels", [args.cache_level])
+
+    configs = {}
+    order = []
+
+    for bench_name, argument_sets in spec["benchmarks"].items():
+        if bench_name not in helpers.BENCH_BIN_DIR:
+            sys.exit("Unknown benchmark " + bench_name + " in " + (args.campaign or "--bench-name"))
+
+        if isinstance(argument_sets, dict):
+            argument_sets = [argument_sets]
+
+        for argument_set, cache, cache_level in itertools.product(argument_sets, caches, cache_levels):
+            config = argparse.Namespace(**vars(args))
+            config.bench_name = bench_name
+            set_arguments(config, argument_set, bench_name + " arguments")
+
+            if config.checkpoint and bench_name in helpers.FILES_OPEN_AT_START:
+                sys.exit(bench_name + " keeps files open across fi_activate(START), which checkpoints do not restore, use --fork instead of --checkpoint")
+
+            unknown = set(name.replace("-", "_") for name in cache) - set(CACHE_ARGUMENTS)
+            if unknown:
+                sys.exit("Unknown cache arguments " + ", ".join(sorted(unknown)) + " in " + args.campaign)
+
+            set_arguments(config, cache, "caches")
+            config.cache_options = sorted(name.replace("-", "_") for name in cache)
+            config.cache_level = str(cache_level)
+
+            config.variant = ""
+            config.config_hash = helpers.getConfigHash(config) # Runs journaled with this configuration are not simulated again
+            config.golden_ticks = config.golden_insts = config.golden_seconds = None  # Set by ExperimentManager.run_golden
+
+            if config.config_hash in configs:
+                configs[config.config_hash].voltages.extend(voltage for voltage in voltages if voltage not in configs[config.config_hash].voltages)
+            else:
+                config.voltages = list(voltages)
+                configs[config.config_hash] = config
+                order.append(config)
+
+    # Benchmarks with several configurations keep each in its own variant
+    for bench_name in set(config.bench_name for config in order):
+        variants = [config for config in order if config.bench_name == bench_name]
+        if len(variants) > 1:
+            for config in variants:
+                config.variant = config.config_hash[:8]
+
+    return order
+
+if __name__ == '__main__':
+    # The configurations that run.py would simulate with the same arguments
+    args = helpers.get_arguments()
+    args.campaign_spec = load_campaign(args)
+
+    for config in expand(args, args.campaign_spec):
+        print(" ".join([config.bench_name, config.variant or "-", config.config_hash, "level=" + config.cache_level, helpers.getCacheOptions(config) or "default caches",
+                        "voltages=" + ",".join(config.voltages)]))
@@ -0,0 +1,299 @@
+#  Output quality metrics of the benchmarks.
+#
+#  Computes the same metrics as the quality tools of the benchmarks
+#  (tests/test-progs/*/error.c, calc_errors.c, psnr.c, quality.c and
+#  compare.c) without starting a process per run. Binary outputs are mapped
+#  with numpy.memmap and compared as whole arrays. Golden outputs are read
+#  once per process and kept until their file changes, so a worker that
+#  scores many runs of a benchmark reads its golden output once.
+#
+#  Every metric is returned as the string the quality tool prints. Outputs
+#  the tool cannot read get the metrics of a crashed run.
+#
+#  example run: python3 quality.py sobel <golden output> <faulty output>...
+
+import os
+import sys
+import math
+import filecmp
+
+import numpy
+
+IMAGE_SIZE = 512 # Width and height of the sobel and dct images
+
+#  Names of the metrics of each benchmark, in the order they are returned
+METRIC_NAMES = {
+    'blackscholes': ["relative_error", "absolute_error"],
+    'jacobi': ["relative_error", "absolute_error"],
+    'Kmeans' : ["relative_error", "absolute_error", "membership"],
+    'monteCarlo' : ["mse", "relative_error"],
+    'sobel' : ["psnr"],
+    'dct' : ["psnr"],
+    'matrix_mul' : []
+}
+
+#  Metrics of runs without a readable output, as written for crashed runs
+CRASH_METRICS = {
+    'blackscholes': ["1.0", "1.0"],
+    'jacobi': ["1.0", "1.0"],
+    'Kmeans' : ["inf", "inf", "inf"],
+    'monteCarlo' : ["1.0", "1.0"],
+    'sobel' : ["0.0"],
+    'dct' : ["0.0"],
+    'matrix_mul' : []
+}
+
+_golden_cache = {}
+
+def cached(path, load):
+    #  Golden outputs and inputs are shared by every run of a campaign
+    key = (path, load.__name__)
+    mtime = os.path.getmtime(path)
+
+    if key not in _golden_cache or _golden_cache[key][0] != mtime:
+        _golden_cache[key] = (mtime, load(path))
+
+    return _golden_cache[key][1]
+
+def map_file(path, dtype, offset=0):
+    #  An empty array for files that are missing or too short
+    try:
+        if os.path.getsize(path) - offset < numpy.dtype(dtype).itemsize:
+            return numpy.zeros(0, dtype)
+
+        return numpy.memmap(path, dtype, mode="r", offset=offset)
+    except OSError:
+        return numpy.zeros(0, dtype)
+
+def read_sized_doubles(path, size_type, values_per_element):
+    #  <number of elements> followed by number_of_elements x values_per_element doubles, None if truncated
+    size = map_file(path, size_type)[:1]
+    if len(size) != 1:
+        return None
+
+    values = map_file(path, numpy.float64, numpy.dtype(size_type).itemsize)
+    number_of_values = int(size[0]) * values_per_element
+    if number_of_values < 0 or len(values) < number_of_values:
+        return None
+
+    return values[:number_of_values]
+
+def load_blackscholes(path):
+    return read_sized_doubles(path, numpy.int32, 1)
+
+def load_jacobi(path):
+    return read_sized_doubles(path, numpy.int64, 2)
+
+def relative_errors(golden, output, zero_relative_error):
+    #  error.c of blackscholes and jacobi: mean relative and absolute error of the magnitudes
+    if golden is None or output is None or len(golden) != len(output) or len(golden) == 0:
+        return ["1.0", "1.0"]
+
+    absolute_errors = numpy.abs(numpy.abs(golden) - numpy.abs(output))
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        relative = numpy.where(golden != 0.0, numpy.abs(absolute_errors / golden), zero_relative_error(absolute_errors))
+
+    return ["%g" % relative.mean(), "%g" % absolute_errors.mean()]
+
+def blackscholes_metrics(golden_path, output_path):
+    # Relative error of a zero golden value is the absolute error
+    return relative_errors(cached(golden_path, load_blackscholes), load_blackscholes(output_path), lambda absolute_errors: absolute_errors)
+
+def jacobi_metrics(golden_path, output_path):
+    # Relative error of a zero golden value is 0
+    return relative_errors(cached(golden_path, load_jacobi), load_jacobi(output_path), numpy.zeros_like)
+
+def load_monte_carlo(path):
+    #  <number of values> <duration> followed by the values
+    size = map_file(path, numpy.int64)[:2]
+    if len(size) != 2:
+        return None
+
+    values = map_file(path, numpy.float64, 2 * numpy.dtype(numpy.int64).itemsize)
+    if size[0] < 0 or len(values) < size[0]:
+        return None
+
+    return values[:size[0]]
+
+def monte_carlo_metrics(golden_path, output_path):
+    #  calc_errors.c: mean squared error and relative error of the magnitudes
+    golden = cached(golden_path, load_monte_carlo)
+    output = load_monte_carlo(output_path)
+
+    if golden is None or output is None or len(golden) != len(output):
+        return CRASH_METRICS["monteCarlo"]
+
+    errors = numpy.abs(golden) - numpy.abs(output)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        mse = numpy.float64((errors * errors).sum()) / len(golden)
+        relative_error = numpy.float64(numpy.abs(errors).sum()) / numpy.abs(golden).sum()
+
+    return ["%G" % mse, "%G" % relative_error]
+
+def load_image(path):
+    image = map_file(path, numpy.uint8)
+    if len(image) < IMAGE_SIZE * IMAGE_SIZE:
+        return None
+
+    return image[:IMAGE_SIZE * IMAGE_SIZE].reshape(IMAGE_SIZE, IMAGE_SIZE)
+
+def sobel_metrics(golden_path, output_path):
+    #  psnr.c: PSNR of the image without its border
+    golden = cached(golden_path, load_image)
+    output = load_image(output_path)
+
+    if golden is None or output is None:
+        return CRASH_METRICS["sobel"]
+
+    errors = output[1:-1, 1:-1].astype(numpy.float64) - golden[1:-1, 1:-1]
+    mse = (errors * errors).sum() / (IMAGE_SIZE * IMAGE_SIZE)
+
+    with numpy.errstate(divide="ignore"):
+        psnr = 10 * numpy.log10(65536 / mse)
+
+    return ["%g" % psnr]
+
+def load_dct(path):
+    dct = map_file(path, numpy.float64)
+    if len(dct) < IMAGE_SIZE * IMAGE_SIZE:
+        return None
+
+    return dct[:IMAGE_SIZE * IMAGE_SIZE].reshape(IMAGE_SIZE, IMAGE_SIZE)
+
+def idct_matrix():
+    #  COS[i][x] * C[x] of quality.c
+    i, x = numpy.meshgrid(numpy.arange(8), numpy.arange(8), indexing="ij")
+    scale = numpy.where(numpy.arange(8) == 0, 1 / math.sqrt(2), 1.0)
+
+    return numpy.cos((2 * i + 1) * x * math.acos(-1) / 16.0) * scale
+
+def dct_metrics(input_path, golden_path, output_path):
+    #  quality.c: ["Correct", "inf"] for a bitwise identical output, else ["SDC", PSNR of its inverse DCT to the input picture]
+    picture = cached(input_path, load_image)
+    golden = cached(golden_path, load_dct)
+    output = load_dct(output_path)
+
+    if picture is None or golden is None or output is None:
+        return ["SDC"] + CRASH_METRICS["dct"]
+
+    if numpy.array_equal(golden.view(numpy.int64), output.view(numpy.int64)):
+        return ["Correct", "%f" % float("inf")]
+
+    matrix = idct_matrix()
+    blocks = output.reshape(IMAGE_SIZE // 8, 8, IMAGE_SIZE // 8, 8)
+    idct = 0.25 * numpy.einsum("ix,rxcy,jy->ricj", matrix, blocks, matrix).reshape(IMAGE_SIZE, IMAGE_SIZE) + 128
+
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        mse = ((picture - idct) ** 2).sum() / (IMAGE_SIZE * IMAGE_SIZE)
+        psnr = 10 * numpy.log10(255 * 255 / mse)
+
+    return ["SDC", "%f" % psnr]
+
+def load_cluster_centres(path):
+    #  Read like file_read() of Kmeans: the first line is an object too and sets the number of coordinates
+    objects = []
+    number_of_coordinates = None
+
+    with open(path) as centres_file:
+        for line in centres_file:
+            fields = line.replace(",", " ").split()
+            if not fields:
+                continue
+
+            if number_of_coordinates is None:
+                number_of_coordinates = len(fields) - 1
+
+            objects.append([float(field) for field in fields[1:number_of_coordinates + 1]])
+
+    centres = numpy.array(objects, dtype=numpy.float32).reshape(len(objects), number_of_coordinates or 0)
+
+    # check_repeated_clusters() sorts the centres by their coordinates, most significant first
+    return centres[numpy.lexsort(centres.T[::-1])] if len(centres) else centres
+
+def load_memberships(path, limit=None):
+    #  Cluster of every data point, up to the first line that is not '<point> <cluster>'
+    memberships = []
+
+    with open(path) as membership_file:
+        for line in membership_file:
+            if limit is not None and len(memberships) == limit:
+                break
+
+            fields = line.split()
+            try:
+                memberships.append(int(fields[1]))
+            except (IndexError, ValueError):
+                break
+
+    return numpy.array(memberships, dtype=numpy.int64)
+
+def count_data_points(path):
+    #  Lines with a digit, like grep -c "[0-9]"
+    with open(path) as input_file:
+        return sum(1 for line in input_file if any(character.isdigit() for character in line))
+
+def kmeans_metrics(input_path, golden_prefix, output_prefix):
+    #  compare.c: relative and absolute error of the cluster centres and the share of correct memberships
+    number_of_points = cached(input_path, count_data_points)
+
+    try:
+        golden_centres = cached(golden_prefix + ".cluster_centres", load_cluster_centres)
+        golden_memberships = cached(golden_prefix + ".membership", load_memberships)[:number_of_points]
+        output_centres = load_cluster_centres(output_prefix + ".cluster_centres")
+        output_memberships = load_memberships(output_prefix + ".membership", number_of_points)
+    except (IOError, ValueError):
+        return CRASH_METRICS["Kmeans"]
+
+    if golden_centres.shape != output_centres.shape or golden_centres.size == 0 or number_of_points == 0:
+        return CRASH_METRICS["Kmeans"]
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        absolute_errors = numpy.abs(numpy.abs(golden_centres) - numpy.abs(output_centres))
+        relative = numpy.abs(absolute_errors / golden_centres)
+
+    compared = min(len(golden_memberships), len(output_memberships))
+    correct = numpy.count_nonzero(golden_memberships[:compared] == output_memberships[:compared])
+
+    return ["%g" % relative.astype(numpy.float64).mean(), "%g" % absolute_errors.astype(numpy.float64).mean(),
+            "%g" % (float(correct) / number_of_points)]
+
+def metrics(args, golden_path, output_path):
+    #  Quality metrics of output_path, as printed by the quality tool of args.bench_name
+    if args.bench_name == "blackscholes":
+        return blackscholes_metrics(args.blackscholes_output, output_path)
+    elif args.bench_name == "jacobi":
+        return jacobi_metrics(args.jacobi_output, output_path)
+    elif args.bench_name == "Kmeans":
+        return kmeans_metrics(args.kmeans_i, golden_path, output_path)
+    elif args.bench_name == "monteCarlo":
+        return monte_carlo_metrics(args.monte_output, output_path)
+    elif args.bench_name == "sobel":
+        return sobel_metrics(golden_path, output_path)
+    elif args.bench_name == "dct":
+        return dct_metrics(args.dct_input, golden_path, output_path)[1:]
+
+    return []
+
+def is_correct(args, golden_path, output_path):
+    if args.bench_name == "Kmeans":
+        return kmeans_metrics(args.kmeans_i, golden_path, output_path) == ["0", "0", "1"]
+    elif args.bench_name == "dct":
+        return dct_metrics(args.dct_input, golden_path, output_path)[0] == "Correct"
+
+    return os.path.exists(output_path) and filecmp.cmp(output_path, golden_path, shallow=False)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] not in ("blackscholes", "jacobi", "monteCarlo", "sobel"):
+        sys.exit("usage: " + sys.argv[0] + " blackscholes|jacobi|monteCarlo|sobel <golden output> <faulty output>...")
+
+    bench_metrics = {
+        'blackscholes': blackscholes_metrics,
+        'jacobi': jacobi_metrics,
+        'monteCarlo': monte_carlo_metrics,
+        'sobel': sobel_metrics
+    }[sys.argv[1]]
+
+    for output_path in sys.argv[3:]:
+        print(output_path + "," + ",".join(bench_metrics(sys.argv[2], output_path)))
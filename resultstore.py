@@ -0,0 +1,108 @@
+#  Campaign results store.
+#
+#  One SQLite database holds the runs of every benchmark and voltage in
+#  typed columns, so analysis can query it directly instead of parsing the
+#  per-benchmark result files. Only the scheduler in run.py writes to it,
+#  in bulk, from the records that its workers return. A run that is stored
+#  again, e.g. after a restart, replaces its previous row.
+#
+#  Metrics that a benchmark does not have are NULL.
+#
+#  example run: python3 resultstore.py results.db --bench sobel
+
+import os
+import sys
+import sqlite3
+import argparse
+
+import quality
+
+COLUMNS = [
+    ("bench", "TEXT"),
+    ("voltage", "TEXT"),
+    ("map", "TEXT"),
+    ("config", "TEXT"),
+    ("outcome", "TEXT"),
+    ("masked", "INTEGER"),
+    ("relative_error", "REAL"),
+    ("absolute_error", "REAL"),
+    ("mse", "REAL"),
+    ("psnr", "REAL"),
+    ("membership", "REAL"),
+    ("sim_ticks", "INTEGER"),
+    ("host_seconds", "REAL"),
+    ("injections", "INTEGER"),
+    ("crash", "TEXT")
+]
+
+KEY = ["bench", "voltage", "map", "config"]
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS runs (" + ", ".join(name + " " + column_type for name, column_type in COLUMNS) +
+                       ", PRIMARY KEY (" + ", ".join(KEY) + "))")
+
+    # Stores of older campaigns lack the columns added since, which go last
+    existing = set(row[1] for row in connection.execute("PRAGMA table_info(runs)"))
+    for name, column_type in COLUMNS:
+        if name not in existing:
+            connection.execute("ALTER TABLE runs ADD COLUMN " + name + " " + column_type)
+
+    return connection
+
+def to_row(record):
+    #  A record of helpers.write_results as a row of the runs table
+    metrics = dict(zip(quality.METRIC_NAMES[record["bench"]], [float(metric) for metric in record["metrics"]]))
+
+    values = dict(record, map=record["input"][:-4], outcome=record["result"], masked=int(record["masked"]), **metrics)
+
+    return tuple(values.get(name) for name, _ in COLUMNS)
+
+def insert(connection, records):
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO runs VALUES (" + ", ".join("?" * len(COLUMNS)) + ")",
+                               [to_row(record) for record in records])
+
+def merge(connection, db_paths):
+    #  Copies the runs of other stores, e.g. the ones of the shards of a campaign
+    for db_path in db_paths:
+        if not os.path.exists(db_path):
+            continue
+
+        connection.execute("ATTACH DATABASE ? AS shard", (db_path,))
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO runs SELECT * FROM shard.runs")
+        connection.execute("DETACH DATABASE shard")
+
+def remove_bench(connection, bench_name):
+    with connection:
+        connection.execute("DELETE FROM runs WHERE bench = ?", (bench_name,))
+
+def count_outcomes(connection, bench_name=None):
+    #  (bench, voltage, outcome, number of runs) rows, crashes are counted by kind as Crash(<kind>)
+    query = "SELECT bench, voltage, outcome || IFNULL('(' || crash || ')', ''), COUNT(*) FROM runs"
+    parameters = ()
+
+    if bench_name:
+        query += " WHERE bench = ?"
+        parameters = (bench_name,)
+
+    return connection.execute(query + " GROUP BY 1, 2, 3 ORDER BY 1, 2, 3", parameters).fetchall()
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("db_path", help="Results database written by run.py")
+    parser.add_argument("--bench", help="Only count the runs of this benchmark", default="")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = get_arguments()
+
+    connection = connect(args.db_path)
+
+    for bench_name, voltage, outcome, number_of_runs in count_outcomes(connection, args.bench):
+        print(",".join([bench_name, voltage, outcome, str(number_of_runs)]))
+
+    connection.close()
@@ -1,20 +1,37 @@
 import os
 import sys
 import glob
+import time
+import shlex
+import collections
+import json
+import argparse
 import subprocess
-from functools import partial
 import concurrent.futures 
-import filecmp
+import shutil
 import helpers
+import quality
+import resultstore
+import sampling
+import telemetry
+import planner
 
 WHERE_AM_I = os.path.dirname(os.path.realpath(__file__)) #  Absolute Path to *THIS* Script
 
 BENCH_INPUT_HOME = WHERE_AM_I + '/inputs/'
 BENCH_BIN_HOME = WHERE_AM_I + '/tests/test-progs'
-BENCH_QUALITY = helpers.BENCH_QUALITY
 
-GEM5_BINARY = os.path.abspath(WHERE_AM_I + '/build/X86/gem5.opt')
-GEM5_SCRIPT = os.path.abspath(WHERE_AM_I + '/configs/fi_config/run.py')
+GEM5_BINARY = helpers.GEM5_BINARY
+GEM5_SCRIPT = helpers.GEM5_SCRIPT
+
+FORK_OUTPUT = 'output.bin'      # Output file of the benchmark in each forked child or restored run
+FORK_STATUS = 'fork_status.txt' # Written by configs/fi_config/campaign.py for each child
+FORK_PROGRESS = 'fork_progress.jsonl' # One line per reaped child, appended by configs/fi_config/campaign.py
+MASKED_CAUSE = 'fault masked'   # Exit cause of runs whose faults never reached the program
+EXIT_CAUSE = 'exiting with last active thread context' # Exit cause of runs whose program exited
+HANG_CAUSES = ('simulate() limit reached', 'a thread reached the max instruction count') # Exit causes of runs over their budget
+GEM5_FAILURES = [('unmapped address', 'page fault'), ('invalid instruction', 'illegal instruction')] # Crash kinds of gem5 panics
+STORE_BATCH = 64                # Runs per insert into the results store
 
 
 class ExperimentManager:
@@ -22,15 +39,28 @@ class ExperimentManager:
     #  example gem5 run:
     #    <gem5 bin> <gem5 options> <gem5 script> <gem5 script options>
     ##
-    def __init__(self, args, input_name, voltage):
+    def __init__(self, args, input_path, input_name, voltage, checkpoint_dir=""):
         self.args = args
+        self.input_path = input_path
         self.input_name = input_name
         self.voltage = voltage
+        self.checkpoint_dir = checkpoint_dir
+        self.masked = False
+        self.crash = None # Kind of crash of Crash runs
+
+        # Lean runs simulate in node local scratch, finish() moves the outputs of Incorrect, Crash and Hang runs to the shared directories
+        self.lean = args.lean and not args.fork
+        if(self.lean):
+            self.sim_out_dir = helpers.getScratchDir(args, voltage, input_name)
+            self.faulty_out = self.sim_out_dir + "/" + FORK_OUTPUT
+        else:
+            self.sim_out_dir = helpers.getSimOutDir(args.bench_name, voltage, input_name, args.variant)
+            self.faulty_out = helpers.getBenchFaultyOut(args.bench_name, voltage, input_name, args.variant)
 
     @staticmethod
     def run_golden(args):
         redirection = '-re'
-        outdir = '--outdir=' + args.bench_name + '_results/golden'
+        outdir = '--outdir=' + helpers.getGoldenDir(args.bench_name, args.variant)
         stdout_file = '--stdout-file=output.txt'
         stderr_file = '--stderr-file=error.txt'
         debug_file = '--debug-file=log.txt'
@@ -48,77 +78,187 @@ class ExperimentManager:
 
         input_path = '--input-path=' + BENCH_INPUT_HOME + "golden.txt"
 
-        cache_level = args.cache_level
+        cache_level = '--cache-level=' + args.cache_level
+
+        cache_options = helpers.getCacheOptions(args)
 
-        gem5_script_option = ' '.join([bench_binary_path, bench_binary_options, input_path, cache_level])
+        profile_path = ('--profile-path=' + helpers.getProfilePath(args.bench_name, args.variant)) if helpers.canPrune(args) else ''
+
+        gem5_script_option = ' '.join([bench_binary_path, bench_binary_options, input_path, cache_level, cache_options, profile_path])
 
         gem5_command = ' '.join([GEM5_BINARY, gem5_option, GEM5_SCRIPT, gem5_script_option])
 
-        try:    
-            subprocess.check_call(gem5_command, shell=True)
-        except Exception as e:
-            sys.exit(str(e))
+        # The golden run only depends on the simulator, the binary, the benchmark arguments and the cache hierarchy. The output paths of the
+        # variant are left out, so that configurations that only differ in their faulty runs share the golden run
+        golden_options = ' '.join([helpers.get_binary_options(args, "", False, "", "output"), cache_level, cache_options, str(helpers.canPrune(args))])
+        golden_key = helpers.getCacheKey(args.bench_name, ' '.join([golden_options, args.l1d_size, str(args.l1d_assoc)]))
 
-    def is_crash(self):
-        with open(helpers.getSimOutDir(self.args.bench_name,self.voltage,self.input_name) + "/output.txt") as output:
-            if "Error" in output.read():
-                return True
-            else:
-                return False
+        golden_record = helpers.restoreGoldenRun(args, golden_key)
 
-    def is_correct(self):
-        if(self.args.bench_name == "Kmeans"):
-            grep_number_of_lines = 'grep "[0-9]" ' + self.args.kmeans_i + " -c"
-            
-            try:
-                number_of_lines = subprocess.Popen(grep_number_of_lines, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
+        if(golden_record is not None):
+            print("Reusing golden run of " + args.bench_name)
+        else:
+            start = time.time()
+
+            try:    
+                subprocess.check_call(gem5_command, shell=True)
             except Exception as e:
                 sys.exit(str(e))
 
-            compare_command = BENCH_QUALITY["Kmeans"] + helpers.getBenchGoldenOut(self.args.bench_name) + " " + helpers.getBenchFaultyOut(self.args.bench_name,self.voltage,self.input_name) + " " + number_of_lines
+            # Faulty runs of the benchmark are expected to take about as long
+            golden_record = helpers.storeGoldenRun(args, golden_key, time.time() - start)
 
-            try:
-                compare_string = subprocess.Popen(compare_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-            except Exception as e:
-                sys.exit(str(e))
+        # The budget of the faulty runs, see helpers.getBudgetOptions
+        args.golden_ticks = golden_record.get("ticks")
+        args.golden_insts = golden_record.get("insts")
+        args.golden_seconds = golden_record["seconds"]
 
-            output = compare_string.rstrip().split("\n")
-            res = output[-1].split(",")
+        return golden_record["seconds"]
 
-            if(res == ["0","0","1"]):
-                return True
-            else:
-                return False
-        elif(self.args.bench_name == "dct"):
-            quality_command = BENCH_QUALITY["dct"] + helpers.getBenchGoldenOut(self.args.bench_name) + " " + helpers.getBenchFaultyOut(self.args.bench_name,self.voltage,self.input_name)
-            
-            try:
-                quality_string = subprocess.Popen(quality_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].decode("utf-8")
-            except Exception as e:
-                sys.exit(str(e))
+    @staticmethod
+    def run_fork_campaign(args, voltage, fault_inputs, workers=4):
+        outdir = helpers.getResultsDir(args.bench_name, args.variant) + "/faulty/" + voltage
 
-            output = quality_string.split(",")
-            is_correct = output[0].strip()
-            
-            if(is_correct == "Correct"):
-                return True
-            else:
-                return False
+        if (os.path.exists(outdir) == False):
+            os.makedirs(outdir)
+
+        fork_inputs = helpers.getShardPath(outdir + "/fork_inputs.txt", args.shard)
+        with open(fork_inputs, "w") as fork_inputs_file:
+            for input_path, input_name in fault_inputs:
+                fork_inputs_file.write(input_path + " " + input_name + "\n")
+
+        redirection = '-re'
+        outdir_option = '--outdir=' + outdir
+        stdout_file = '--stdout-file=output.txt'
+        stderr_file = '--stderr-file=error.txt'
+        debug_file = '--debug-file=log.txt'
+        debug_flags = ''
+
+        if args.flags and len(args.flags) > 0:
+            all_flags = ','.join(args.flags)
+            debug_flags = '--debug-flags=' + all_flags
+
+        if args.lean:
+            # The children share the parent's config, and the summary replaces their stats
+            debug_file = debug_file if debug_flags else ''
+            gem5_option = ' '.join([redirection, outdir_option, stdout_file, stderr_file, debug_file, debug_flags, helpers.LEAN_OPTIONS])
         else:
-            golden_path = helpers.getBenchGoldenOut(self.args.bench_name)
-            output_path = helpers.getBenchFaultyOut(self.args.bench_name,self.voltage,self.input_name)
+            gem5_option = ' '.join([redirection, outdir_option, stdout_file, stderr_file, debug_file, debug_flags])
 
-            try:
-                if(filecmp.cmp(output_path, golden_path, shallow=False)):
-                    return True
-                else:
-                    return False
-            except Exception as e:
-                sys.exit(str(e))
+        bench_binary_path = '-c ' + helpers.BENCH_BINARY[args.bench_name]
+
+        # Each child runs in its own output directory, so /proc/self/cwd gives every child its own output file
+        bench_binary_options = helpers.get_binary_options(args, voltage, False, "", "/proc/self/cwd/" + FORK_OUTPUT)
+
+        input_path = '--input-path=' + BENCH_INPUT_HOME + "golden.txt"
+
+        cache_level = '--cache-level=' + args.cache_level
+        if(args.cache_options):
+            cache_level += ' ' + helpers.getCacheOptions(args)
+
+        # Children that are still running after the wall clock limit are killed and recorded as Hang
+        fork_options = ' '.join(['--fork-inputs=' + fork_inputs, '--fork-workers=' + str(workers), '--fork-timeout=%d' % (helpers.getWallClockLimit(args) or 0)])
+
+        # Every child reseeds the arrival process, see configs/fi_config/campaign.py
+        transient_options = helpers.getTransientOptions(args, voltage, voltage)
+
+        random_options = helpers.getRandomOptions(args)
+
+        summary_file = '--summary-file=' + helpers.SUMMARY_FILE
+
+        # Nor must the progress of an earlier campaign be reported
+        if(os.path.exists(outdir + "/" + FORK_PROGRESS)):
+            os.remove(outdir + "/" + FORK_PROGRESS)
+
+        # Children that crash write no summary, none of an earlier campaign must be read instead
+        for _, input_name in fault_inputs:
+            if(os.path.exists(outdir + "/" + input_name + "/" + helpers.SUMMARY_FILE)):
+                os.remove(outdir + "/" + input_name + "/" + helpers.SUMMARY_FILE)
+
+        gem5_script_option = ' '.join([bench_binary_path, bench_binary_options, input_path, cache_level, '--exit-on-masked', transient_options, random_options,
+                                       helpers.getBudgetOptions(args), summary_file, fork_options])
+
+        gem5_command = ' '.join([GEM5_BINARY, gem5_option, GEM5_SCRIPT, gem5_script_option])
+
+        try:
+            subprocess.check_call(gem5_command, shell=True, cwd=outdir)
+        except Exception as e:
+            sys.exit(str(e))
+
+    @staticmethod
+    def get_checkpoint_options(args):
+        # Restored runs write to their working directory, the checkpoint must be taken with the same options
+        bench_binary_path = '-c ' + helpers.BENCH_BINARY[args.bench_name]
+
+        bench_binary_options = helpers.get_binary_options(args, "", False, "", "/proc/self/cwd/" + FORK_OUTPUT)
+
+        cache_level = '--cache-level=' + args.cache_level
+        if(args.cache_options):
+            cache_level += ' ' + helpers.getCacheOptions(args)
+
+        return ' '.join([bench_binary_path, bench_binary_options, cache_level])
+
+    @staticmethod
+    def take_checkpoint(args):
+        # m5.checkpoint writes the dirty blocks back, but classic caches do not store their blocks in the checkpoint.
+        # Restored runs start with cold caches, so their outcomes differ from plain and fork runs, see helpers.getExecutionMode
+        script_options = ExperimentManager.get_checkpoint_options(args)
+        checkpoint_dir = helpers.getCheckpointDir(args.bench_name, script_options)
+
+        if(os.path.exists(checkpoint_dir + "/m5.cpt")):
+            print("Reusing checkpoint " + checkpoint_dir)
+            return checkpoint_dir
+
+        outdir = helpers.getGoldenDir(args.bench_name, args.variant) + "/checkpoint_run"
+
+        if (os.path.exists(outdir) == False):
+            os.makedirs(outdir)
+
+        redirection = '-re'
+        outdir_option = '--outdir=' + outdir
+        stdout_file = '--stdout-file=output.txt'
+        stderr_file = '--stderr-file=error.txt'
+
+        gem5_option = ' '.join([redirection, outdir_option, stdout_file, stderr_file])
+
+        input_path = '--input-path=' + BENCH_INPUT_HOME + "golden.txt"
+
+        gem5_script_option = ' '.join([script_options, input_path, '--take-checkpoint=' + checkpoint_dir])
+
+        gem5_command = ' '.join([GEM5_BINARY, gem5_option, GEM5_SCRIPT, gem5_script_option])
+
+        try:
+            subprocess.check_call(gem5_command, shell=True, cwd=outdir)
+        except Exception as e:
+            sys.exit(str(e))
+
+        return checkpoint_dir
+
+    def get_failure(self, status):
+        # Kind of crash of a gem5 process that ended before it wrote its summary, from its last message or exit status
+        try:
+            with open(self.sim_out_dir + "/error.txt") as error_file:
+                messages = [line for line in error_file if line.startswith(("panic:", "fatal:"))]
+        except IOError:
+            messages = []
+
+        if(not messages):
+            return ("signal %d" % -status) if status < 0 else ("gem5 exit %d" % status)
+
+        for text, kind in GEM5_FAILURES:
+            if(text in messages[-1]):
+                return kind
+
+        return messages[-1].split(":")[0]
+
+    def is_correct(self):
+        return quality.is_correct(self.args, helpers.getBenchGoldenOut(self.args.bench_name, self.args.variant), self.faulty_out)
 
     def inject(self):
+        sim_out_dir = self.sim_out_dir
+
         redirection = '-re'
-        outdir = '--outdir=' + helpers.getSimOutDir(self.args.bench_name,self.voltage,self.input_name)
+        outdir = '--outdir=' + sim_out_dir
         stdout_file = '--stdout-file=output.txt'
         stderr_file = '--stderr-file=error.txt'
         debug_file = '--debug-file=log.txt'
@@ -128,27 +268,116 @@ class ExperimentManager:
             all_flags = ','.join(self.args.flags)
             debug_flags = '--debug-flags=' + all_flags
 
-        gem5_option = ' '.join([redirection, outdir, stdout_file, stderr_file, debug_file, debug_flags])
+        if self.lean:
+            debug_file = debug_file if debug_flags else ''
+            gem5_option = ' '.join([redirection, outdir, stdout_file, stderr_file, debug_file, debug_flags, helpers.LEAN_OPTIONS])
+        else:
+            gem5_option = ' '.join([redirection, outdir, stdout_file, stderr_file, debug_file, debug_flags])
 
-        bench_binary_path = '-c ' + helpers.BENCH_BINARY[self.args.bench_name]
+        input_path = '--input-path=' + self.input_path
 
-        bench_binary_options = helpers.get_binary_options(self.args, self.voltage, False, self.input_name)
+        if(self.checkpoint_dir):
+            script_options = ExperimentManager.get_checkpoint_options(self.args)
+            gem5_script_option = ' '.join([script_options, input_path, '--exit-on-masked', '--restore-checkpoint=' + self.checkpoint_dir])
+        else:
+            bench_binary_path = '-c ' + helpers.BENCH_BINARY[self.args.bench_name]
+
+            bench_binary_options = helpers.get_binary_options(self.args, self.voltage, False, self.input_name, self.faulty_out if self.lean else "")
+
+            cache_level = '--cache-level=' + self.args.cache_level
+            if(self.args.cache_options):
+                cache_level += ' ' + helpers.getCacheOptions(self.args)
 
-        input_path = '--input-path=' + BENCH_INPUT_HOME + (("random/" + self.args.bench_name + "/") if args.random else "") + self.voltage + "/" + self.input_name
+            gem5_script_option = ' '.join([bench_binary_path, bench_binary_options, input_path, cache_level, '--exit-on-masked'])
 
-        cache_level = '--cache-level=' + self.args.cache_level
+        gem5_script_option = ' '.join([gem5_script_option, helpers.getTransientOptions(self.args, self.voltage, self.input_name), helpers.getRandomOptions(self.args),
+                                       helpers.getBudgetOptions(self.args)])
 
-        gem5_script_option = ' '.join([bench_binary_path, bench_binary_options, input_path, cache_level])
+        gem5_script_option = ' '.join([gem5_script_option, '--summary-file=' + helpers.SUMMARY_FILE])
 
         gem5_command = ' '.join([GEM5_BINARY, gem5_option, GEM5_SCRIPT, gem5_script_option])
-        
+
+        # The scratch directory of a killed lean run must not be read as this run's summary
+        if (self.lean and os.path.exists(sim_out_dir)):
+            shutil.rmtree(sim_out_dir)
+
+        if (os.path.exists(sim_out_dir) == False):
+            os.makedirs(sim_out_dir)
+
+        # Nor the summary of an earlier run in the shared directory
+        if (os.path.exists(sim_out_dir + "/" + helpers.SUMMARY_FILE)):
+            os.remove(sim_out_dir + "/" + helpers.SUMMARY_FILE)
+
         try:
-            subprocess.check_call(gem5_command, shell=True, timeout=1800)
-        except subprocess.SubprocessError as e:
+            # A restored run writes its output to its working directory
+            subprocess.check_call(gem5_command, shell=True, timeout=helpers.getWallClockLimit(self.args), cwd=sim_out_dir)
+        except subprocess.TimeoutExpired as e:
+            # Slow hosts get the golden run's host seconds times hang_factor, a run past that is stuck rather than crashed
+            print("Hang because " + str(e))
+            return "Hang"
+        except subprocess.CalledProcessError as e:
             print("Crashed because " + str(e))
+            self.crash = self.get_failure(e.returncode)
+            return "Crash"
+
+        helpers.moveOutputs(sim_out_dir + "/" + FORK_OUTPUT, self.faulty_out)
+
+        return self.classify()
+
+    def collect_fork(self):
+        sim_out_dir = helpers.getSimOutDir(self.args.bench_name, self.voltage, self.input_name, self.args.variant)
+
+        try:
+            with open(sim_out_dir + "/" + FORK_STATUS) as status_file:
+                status = status_file.read().strip()
+        except IOError:
+            status = "missing"
+
+        if(status == "timeout"):
+            print("Hang because the child ran past the wall clock limit")
+            return "Hang"
+
+        if(status != "exit 0"):
+            print("Crashed because the child finished with " + status)
+            if(status.startswith("signal")):
+                self.crash = self.get_failure(-int(status.split()[1]))
+            elif(status.startswith("exit")):
+                self.crash = self.get_failure(int(status.split()[1]))
+            else:
+                self.crash = status
+            return "Crash"
+
+        helpers.moveOutputs(sim_out_dir + "/" + FORK_OUTPUT, self.faulty_out)
+
+        return self.classify()
+
+    def classify(self):
+        # From the summary of configs/fi_config/run.py, only Correct and Incorrect runs need their outputs
+        summary = helpers.readSummary(self.sim_out_dir)
+        if(summary is None):
+            self.crash = "no summary"
             return "Crash"
 
-        if(self.is_crash()):
+        cause = summary["cause"]
+
+        # The run went on far longer than the golden run and was stopped
+        if(cause in HANG_CAUSES):
+            return "Hang"
+
+        # The run stopped early, but none of its faults reached the program, so its output is the golden output
+        if(cause == MASKED_CAUSE):
+            self.masked = True
+            if(not self.lean):
+                shutil.copyfile(helpers.getBenchGoldenOut(self.args.bench_name, self.args.variant), self.faulty_out)
+            return "Correct"
+
+        if(cause != EXIT_CAUSE):
+            self.crash = cause
+            return "Crash"
+
+        # The program reported an error itself
+        if(summary["exit_code"] != 0):
+            self.crash = "exit %d" % summary["exit_code"]
             return "Crash"
 
         if(self.is_correct()):
@@ -156,34 +385,341 @@ class ExperimentManager:
         else:
             return "Incorrect"
 
-def run_experiment(input_path, args, voltage):
-    input_name = input_path.split("/")[-1]
-    experiment_manager = ExperimentManager(args, input_name, voltage)
+    def finish(self, result):
+        # Lean runs keep the outputs of Incorrect, Crash and Hang runs only
+        if(not self.lean):
+            return
 
-    result = experiment_manager.inject()
-    print("Voltage: " + voltage + ", Fault input: " + input_name + ", Result: " + result)
+        if(result in ("Incorrect", "Crash", "Hang")):
+            helpers.moveOutputs(self.faulty_out, helpers.getBenchFaultyOut(self.args.bench_name, self.voltage, self.input_name, self.args.variant))
 
-    helpers.write_results(input_name, args, voltage, result)
+            shared_dir = helpers.getSimOutDir(self.args.bench_name, self.voltage, self.input_name, self.args.variant)
+            if(os.path.exists(shared_dir)):
+                shutil.rmtree(shared_dir)
+            os.makedirs(os.path.dirname(shared_dir), exist_ok=True)
+            shutil.move(self.sim_out_dir, shared_dir)
+        else:
+            shutil.rmtree(self.sim_out_dir, ignore_errors=True)
 
-if __name__ == '__main__':
-    args = helpers.get_arguments()
+def run_experiment(fault_input, args, voltage, checkpoint_dir=""):
+    input_path, input_name = fault_input
+    experiment_manager = ExperimentManager(args, input_path, input_name, voltage, checkpoint_dir)
+
+    result = experiment_manager.collect_fork() if args.fork else experiment_manager.inject()
+    print("Voltage: " + voltage + ", Fault input: " + input_name + ", Result: " + result + (" (" + experiment_manager.crash + ")" if experiment_manager.crash else ""))
+
+    record = helpers.write_results(input_name, args, voltage, result, experiment_manager.masked, True,
+                                   experiment_manager.sim_out_dir, experiment_manager.faulty_out, experiment_manager.crash)
+    experiment_manager.finish(result)
+
+    return record
+
+def record_masked(fault_input, args, voltage):
+    # Fault maps that the golden run's access profile shows to be masked are not simulated
+    _, input_name = fault_input
+
+    # Lean campaigns keep no outputs of Correct runs
+    if(not args.lean):
+        sim_out_dir = helpers.getSimOutDir(args.bench_name, voltage, input_name, args.variant)
+        if (os.path.exists(sim_out_dir) == False):
+            os.makedirs(sim_out_dir)
+
+        shutil.copyfile(helpers.getBenchGoldenOut(args.bench_name, args.variant), helpers.getBenchFaultyOut(args.bench_name, voltage, input_name, args.variant))
+    print("Voltage: " + voltage + ", Fault input: " + input_name + ", Result: Correct (never read)")
+
+    return helpers.write_results(input_name, args, voltage, "Correct", True, False)
+
+def get_jobs(args, voltage, golden_seconds):
+    # One job per fault map to simulate, with its expected runtime, and the pruned maps
+    fault_inputs = sorted(helpers.getFaultInputs(args, voltage), key=lambda fault_input: fault_input[1])
+    masked_inputs = []
+
+    # The transient arrivals of a map are not in its fault map, so maps are only pruned at voltages without them
+    if(helpers.canPrune(args) and not helpers.getTransientRate(args, voltage)):
+        fault_inputs, masked_inputs = helpers.pruneFaultInputs(args, fault_inputs)
 
-    helpers.compileBench(args.bench_name)      # Compile benchmarks
-    helpers.removeDirectories(args.bench_name) # Remove the results of previous experiments
-    helpers.makeDirectories(args.bench_name, False)   # Make new directories for these experiments
+    # Maps with more faults cost more injection work, the golden runtime dominates across benchmarks
+    return masked_inputs, [((golden_seconds, helpers.getNumberOfFaults(fault_input[0], helpers.getCacheAssocs(args))), fault_input, args, voltage, False) for fault_input in fault_inputs]
 
-    ExperimentManager.run_golden(args)
+def get_sample(args, jobs, finished):
+    # The jobs of every (benchmark variant, voltage) cell in a random order, and the cells with the runs journaled before a restart
+    cells = {}
+    cell_jobs = {}
 
-    if(args.random):
-        helpers.createRandomInputs(args.bench_name)
+    for job in jobs:
+        cell = (get_label(job[2]), job[3])
+        if(cell not in cells):
+            cells[cell] = sampling.Cell(args.sample_margin, args.sample_interval, args.sample_confidence)
+            cell_jobs[cell] = []
 
-    for voltage in helpers.voltages:
-        with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor: 
-            inputs = BENCH_INPUT_HOME + (("random/" + args.bench_name + "/") if args.random else "") + voltage + "/BRAM_*.txt"
+        cell_jobs[cell].append(job)
 
-            input_paths = glob.glob(inputs)
+        record = finished[job[2].config_hash].get((job[3], job[1][1]))
+        if(record):
+            cells[cell].add(record["result"])
 
-            method_with_params = partial(run_experiment, args=args, voltage=voltage)
+    sample = []
+    for cell in sorted(cell_jobs, key=lambda cell: cell_jobs[cell][0][0], reverse=True):
+        sample.extend(sampling.shuffle(sorted(cell_jobs[cell], key=lambda job: job[1][1]), args.sample_seed, "/".join(cell)))
 
-            executor.map(method_with_params, input_paths)
-        helpers.mergeResults(args.bench_name, voltage)
\ No newline at end of file
+    return sample, cells
+
+def report_sample(args, cells):
+    # Achieved margin of every sampled cell, printed and in <bench>[_<variant>]_results/sampling.json
+    reports = {}
+
+    for (label, voltage), cell in sorted(cells.items()):
+        print("Sampled " + label + " " + voltage + ": " + cell.summary())
+
+        reports.setdefault(label, {})[voltage] = {"maps": cell.trials, "margin": cell.achieved_margin(), "counts": cell.counts,
+                                                       "intervals": cell.intervals(), "done": cell.done}
+
+    for label, report in reports.items():
+        with open(helpers.getShardPath(WHERE_AM_I + "/" + label + "_results/sampling.json", args.shard), "w") as report_file:
+            json.dump(report, report_file, indent=4, sort_keys=True)
+
+def get_label(args):
+    # Name of a benchmark variant in reports, the name of its results directory without _results
+    return args.bench_name + helpers.getVariantSuffix(args.variant)
+
+def get_bench_args(args):
+    # One copy of the arguments per benchmark configuration of the campaign, the rest of the scripts work on one configuration
+    return planner.expand(args, args.campaign_spec)
+
+def prepare(args):
+    # Everything the faulty runs of all shards share
+    store = resultstore.connect(args.results_db)
+
+    # Shard stores of an earlier campaign that was not merged
+    shard_paths = [path for path in glob.glob(helpers.getShardPath(args.results_db, 0)[:-1] + "*") if not path.endswith(("-wal", "-shm"))]
+    resultstore.merge(store, shard_paths)
+    for shard_path in shard_paths:
+        for path in (shard_path, shard_path + "-wal", shard_path + "-shm"):
+            if(os.path.exists(path)):
+                os.remove(path)
+
+    bench_args = get_bench_args(args)
+    bench_names = sorted(set(bench.bench_name for bench in bench_args))
+
+    for bench_name in bench_names:
+        helpers.compileBench(bench_name)      # Compile benchmarks
+
+        if(args.fresh):
+            helpers.removeDirectories(bench_name) # Remove the results of previous experiments
+            resultstore.remove_bench(store, bench_name)
+
+    for bench in bench_args:
+        helpers.makeDirectories(bench.bench_name, bench.voltages, bench.variant) # Make new directories for these experiments
+
+    for bench in bench_args:
+        # Runs journaled before a restart that did not reach the store
+        resultstore.insert(store, helpers.readManifest(bench.bench_name, bench.config_hash).values())
+
+        ExperimentManager.run_golden(bench)
+
+        if(bench.checkpoint):
+            ExperimentManager.take_checkpoint(bench)
+
+    store.close()
+
+def report_fork_progress(monitor, bench_args, offsets):
+    # Reports the children that the fork parents reaped since the last call, offsets are the bytes of every progress file read so far
+    for bench in bench_args:
+        for voltage in bench.voltages:
+            progress_path = helpers.getResultsDir(bench.bench_name, bench.variant) + "/faulty/" + voltage + "/" + FORK_PROGRESS
+            offset = offsets.get(progress_path, 0)
+
+            try:
+                with open(progress_path, "rb") as progress_file:
+                    progress_file.seek(offset)
+                    lines = progress_file.read()
+            except IOError:
+                continue
+
+            # A line that the parent is still writing is read on the next call
+            lines = lines[:lines.rfind(b"\n") + 1]
+            offsets[progress_path] = offset + len(lines)
+
+            for line in lines.decode("utf-8").splitlines():
+                monitor.forked(get_label(bench), voltage, json.loads(line))
+
+def run_shard(args):
+    # Runs the jobs of shard args.shard out of args.shards, or all jobs without shards
+    bench_args = get_bench_args(args)
+
+    golden_seconds = {}
+    checkpoint_dirs = {}
+
+    # Both reuse the runs of prepare()
+    for bench in bench_args:
+        golden_seconds[get_label(bench)] = ExperimentManager.run_golden(bench)
+        checkpoint_dirs[get_label(bench)] = ExperimentManager.take_checkpoint(bench) if bench.checkpoint else ""
+
+    store = resultstore.connect(helpers.getShardPath(args.results_db, args.shard))
+
+    finished = dict((bench.config_hash, helpers.readManifest(bench.bench_name, bench.config_hash)) for bench in bench_args)
+
+    jobs = []
+    masked_records = []
+    for bench in bench_args:
+        for voltage in bench.voltages:
+            masked_inputs, voltage_jobs = get_jobs(bench, voltage, golden_seconds[get_label(bench)])
+            jobs.extend(voltage_jobs)
+
+            if(args.sample_margin > 0):
+                # A sample draws from every map, the pruned ones are recorded when they are drawn
+                jobs.extend(((golden_seconds[get_label(bench)], 0), fault_input, bench, voltage, True) for fault_input in masked_inputs)
+            elif(args.shard <= 0):
+                # The pruned maps are recorded once, by the first shard
+                masked_records.extend(record_masked(fault_input, bench, voltage) for fault_input in masked_inputs if (voltage, fault_input[1]) not in finished[bench.config_hash])
+
+    resultstore.insert(store, masked_records)
+
+    # Every shard computes the same partition, before journaled runs are left out
+    if(args.shards > 1):
+        jobs = helpers.shardJobs(jobs, args.shards)[args.shard]
+
+    cells = {}
+    if(args.sample_margin > 0):
+        jobs, cells = get_sample(args, jobs, finished)
+
+    jobs = [job for job in jobs if (job[3], job[1][1]) not in finished[job[2].config_hash]]
+
+    if(args.sample_margin <= 0):
+        # Longest expected jobs first, so that no long job starts when the queue is about to drain
+        jobs.sort(key=lambda job: job[0], reverse=True)
+
+    monitor = telemetry.Monitor(helpers.getShardPath(args.status_file, args.shard), len(jobs), golden_seconds, args.status_interval, args.slow_factor)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if(args.fork):
+            # Each campaign forks its own children, the faulty runs are collected once all of them finished.
+            # Until then the children are reported as their parents reap them
+            campaigns = []
+            fork_workers = max(1, args.workers // sum(len(bench.voltages) for bench in bench_args))
+            for bench in bench_args:
+                for voltage in bench.voltages:
+                    fault_inputs = [fault_input for _, fault_input, job_args, job_voltage, _ in jobs if job_args is bench and job_voltage == voltage]
+                    campaigns.append(executor.submit(ExperimentManager.run_fork_campaign, bench, voltage, fault_inputs, fork_workers))
+
+            offsets = {}
+            while campaigns:
+                _, campaigns = concurrent.futures.wait(campaigns, timeout=args.status_interval)
+                report_fork_progress(monitor, bench_args, offsets)
+                monitor.update(len(jobs) - len(monitor.forked_runs))
+
+        # The workers only journal their runs, the store is written here in batches
+        pending = collections.deque(jobs)
+        runs = {}
+        records = []
+
+        while pending or runs:
+            # Keep every worker busy, without starting the maps of sampled cells that are done
+            while pending and len(runs) < args.workers:
+                _, fault_input, job_args, voltage, masked = pending.popleft()
+                cell = cells.get((get_label(job_args), voltage))
+
+                if(cell and cell.done):
+                    continue
+
+                if(masked):
+                    records.append(record_masked(fault_input, job_args, voltage))
+                    monitor.finished(records[-1], None, get_label(job_args))
+                    if(cell):
+                        cell.add(records[-1]["result"])
+                else:
+                    run = executor.submit(run_experiment, fault_input, job_args, voltage, checkpoint_dirs[get_label(job_args)])
+                    runs[run] = cell
+                    monitor.started(run, get_label(job_args), voltage, fault_input[1])
+
+            if(runs):
+                # Returns at least once per status interval, so that the status stays current while long runs go on
+                finished_runs, _ = concurrent.futures.wait(runs, timeout=args.status_interval, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for run in finished_runs:
+                    cell = runs.pop(run)
+
+                    if(run.exception() is None):
+                        records.append(run.result())
+                        monitor.finished(records[-1], run)
+                        if(cell):
+                            cell.add(records[-1]["result"])
+                    else:
+                        monitor.failed(run)
+
+            monitor.update(len(pending))
+
+            if(len(records) >= STORE_BATCH):
+                resultstore.insert(store, records)
+                records = []
+
+        resultstore.insert(store, records)
+        monitor.update(0, True)
+
+    store.close()
+
+    report_sample(args, cells)
+
+def merge(args):
+    # Collects the results of every shard into the results store
+    store = resultstore.connect(args.results_db)
+
+    resultstore.merge(store, [helpers.getShardPath(args.results_db, shard) for shard in range(args.shards)])
+
+    for bench in get_bench_args(args):
+        resultstore.insert(store, helpers.readManifest(bench.bench_name, bench.config_hash).values())
+
+    store.close()
+
+def launch_local(args):
+    # The shards of a Slurm array job as local processes, to run a sharded campaign without a cluster
+    shard_command = [sys.executable, os.path.abspath(__file__)] + helpers.getPassThroughArguments(sys.argv[1:])
+    shard_workers = str(max(1, args.workers // args.shards))
+
+    shards = [subprocess.Popen(shard_command + ['--stage=shard', '--shards=' + str(args.shards), '--shard=' + str(shard), '--workers=' + shard_workers])
+              for shard in range(args.shards)]
+
+    for shard in shards:
+        shard.wait()
+
+def emit_slurm(args):
+    # prepare, then an array job with one task per shard, then merge, each waiting for the previous one
+    arguments = ' '.join(shlex.quote(argument) for argument in helpers.getPassThroughArguments(sys.argv[1:]))
+    run_command = 'python3 ' + os.path.abspath(__file__) + ' ' + arguments + ' --shards=' + str(args.shards)
+    sbatch = 'sbatch --parsable --account=' + args.slurm_account + ' --partition=' + args.slurm_partition + ' --time=' + str(args.slurm_time) + ' --nodes=1 --output=%j-slurm.out'
+    job_name = os.path.splitext(os.path.basename(args.campaign))[0] if args.campaign else '_'.join(args.bench_names)
+
+    with open(args.emit_slurm, "w") as script_file:
+        script_file.write('#!/bin/bash\n')
+        script_file.write('#\n')
+        script_file.write('# Generated by run.py --emit-slurm. Submit the campaign with: bash ' + os.path.basename(args.emit_slurm) + '\n')
+        script_file.write('#\n\n')
+        script_file.write('cd ' + WHERE_AM_I + '\n\n')
+        script_file.write('PREPARE=$(' + sbatch + ' --job-name=' + job_name + '_prepare --ntasks=1 --wrap="' + run_command + ' --stage=prepare")\n')
+        script_file.write('SHARDS=$(' + sbatch + ' --job-name=' + job_name + ' --ntasks=' + str(args.slurm_ntasks) + ' --array=0-' + str(args.shards - 1) + ' --output=%A_%a-slurm.out' +
+                          ' --dependency=afterok:$PREPARE --wrap="ulimit -s unlimited; ' + run_command + ' --stage=shard --workers=' + str(args.slurm_ntasks) + '")\n')
+        script_file.write(sbatch + ' --job-name=' + job_name + '_merge --ntasks=1 --dependency=afterany:$SHARDS --wrap="' + run_command + ' --stage=merge"\n')
+
+    os.chmod(args.emit_slurm, 0o755)
+    print("Wrote " + args.emit_slurm)
+
+if __name__ == '__main__':
+    args = helpers.get_arguments()
+    args.campaign_spec = planner.load_campaign(args)
+
+    if(args.emit_slurm):
+        emit_slurm(args)
+    elif(args.stage == "prepare"):
+        prepare(args)
+    elif(args.stage == "shard"):
+        run_shard(args)
+    elif(args.stage == "merge"):
+        merge(args)
+    else:
+        prepare(args)
+
+        if(args.shards > 1):
+            launch_local(args)
+            merge(args)
+        else:
+            run_shard(args)
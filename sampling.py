@@ -0,0 +1,114 @@
+#  Adaptive sampling of fault maps.
+#
+#  Instead of simulating every fault map of a (benchmark, voltage) cell,
+#  run.py --sample-margin simulates the maps in a random order and keeps a
+#  confidence interval of the share of every outcome. The cell stops once
+#  the widest interval is narrower than twice the margin, i.e. once every
+#  outcome rate is known to +-margin at the chosen confidence.
+#
+#  Both intervals treat the maps as draws with replacement, so they are
+#  conservative for the finite set of maps of a voltage.
+
+import math
+import random
+import zlib
+from statistics import NormalDist
+
+OUTCOMES = ["Correct", "Incorrect", "Crash", "Hang"]
+
+def z_score(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+def wilson_interval(successes, trials, confidence):
+    if trials == 0:
+        return 0.0, 1.0
+
+    z = z_score(confidence)
+    rate = float(successes) / trials
+    scale = 1 + z * z / trials
+
+    center = (rate + z * z / (2 * trials)) / scale
+    half_width = z / scale * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def binomial_cdf(successes, trials, rate):
+    #  P(X <= successes) of Binomial(trials, rate)
+    if rate <= 0.0:
+        return 1.0
+    if rate >= 1.0:
+        return 1.0 if successes >= trials else 0.0
+
+    log_rate = math.log(rate)
+    log_complement = math.log1p(-rate)
+
+    return sum(math.exp(math.lgamma(trials + 1) - math.lgamma(k + 1) - math.lgamma(trials - k + 1) + k * log_rate + (trials - k) * log_complement)
+               for k in range(successes + 1))
+
+def solve_rate(function, target):
+    #  Rate in [0, 1] where the increasing function reaches target, by bisection
+    low, high = 0.0, 1.0
+
+    for _ in range(50):
+        middle = (low + high) / 2
+        if function(middle) < target:
+            low = middle
+        else:
+            high = middle
+
+    return (low + high) / 2
+
+def clopper_pearson_interval(successes, trials, confidence):
+    if trials == 0:
+        return 0.0, 1.0
+
+    alpha = 1 - confidence
+
+    # P(X >= successes) = alpha / 2 at the lower bound, P(X <= successes) = alpha / 2 at the upper bound
+    lower = 0.0 if successes == 0 else solve_rate(lambda rate: 1 - binomial_cdf(successes - 1, trials, rate), alpha / 2)
+    upper = 1.0 if successes == trials else solve_rate(lambda rate: 1 - binomial_cdf(successes, trials, rate), 1 - alpha / 2)
+
+    return lower, upper
+
+INTERVALS = {
+    'wilson': wilson_interval,
+    'clopper-pearson': clopper_pearson_interval
+}
+
+def shuffle(fault_inputs, seed, cell):
+    #  The same order on every restart and shard, another one per cell
+    order = list(fault_inputs)
+    random.Random(seed * 0x10000 + (zlib.crc32(cell.encode("utf-8")) & 0xffff)).shuffle(order)
+
+    return order
+
+class Cell:
+    #  Outcome counts and intervals of the sampled maps of one (benchmark, voltage)
+    def __init__(self, margin, interval, confidence):
+        self.margin = margin
+        self.interval = INTERVALS[interval]
+        self.confidence = confidence
+        self.counts = dict((outcome, 0) for outcome in OUTCOMES)
+        self.trials = 0
+        self.done = False
+
+    def add(self, outcome):
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        self.trials += 1
+        self.done = self.is_done()
+
+    def intervals(self):
+        return dict((outcome, self.interval(count, self.trials, self.confidence)) for outcome, count in self.counts.items())
+
+    def achieved_margin(self):
+        #  Half width of the widest interval
+        return max((upper - lower) / 2 for lower, upper in self.intervals().values())
+
+    def is_done(self):
+        return self.margin > 0 and self.achieved_margin() <= self.margin
+
+    def summary(self):
+        rates = ", ".join("%s %.3f [%.3f, %.3f]" % (outcome, float(self.counts[outcome]) / max(1, self.trials), lower, upper)
+                          for outcome, (lower, upper) in sorted(self.intervals().items()))
+
+        return "%d maps, margin %.4f: %s" % (self.trials, self.achieved_margin(), rates)
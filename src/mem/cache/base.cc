@@ -82,7 +82,7 @@ BaseCache::BaseCache(const BaseCacheParams *p, unsigned blk_size)
     if (prefetcher)
         prefetcher->setCache(this);
 
-    faultInjector->init(cacheType);
+    faultInjector->init(cacheType, tags, blkSize);
 }
 
 BaseCache::~BaseCache()
@@ -624,6 +624,10 @@ BaseCache::functionalAccess(PacketPtr pkt, bool from_cpu_side)
             (blk && blk->isValid()) ? "valid " : "",
             have_data ? "data " : "", done ? "done " : "");
 
+    if (have_data && pkt->isRead() && blk != tempBlock) {
+        faultInjector->recordRead(blk, 0, blkSize);
+    }
+
     if(have_data) {
         for(int i = 0; i < blkSize; i++) {
             DPRINTF(CacheVerbose, "Data %d : %d\n", i, blk->data[i]);
@@ -885,6 +889,10 @@ BaseCache::satisfyRequest(PacketPtr pkt, CacheBlk *blk, bool, bool)
     // Check RMW operations first since both isRead() and
     // isWrite() will be true for them
     if (pkt->cmd == MemCmd::SwapReq) {
+        if (blk != tempBlock) {
+            faultInjector->recordRead(blk, pkt->getOffset(blkSize),
+                                      pkt->getSize());
+        }
         if (pkt->isAtomicOp()) {
             // extract data from cache and save it into the data field in
             // the packet as a return value from this atomic op
@@ -900,6 +908,11 @@ BaseCache::satisfyRequest(PacketPtr pkt, CacheBlk *blk, bool, bool)
         } else {
             cmpAndSwap(blk, pkt);
         }
+        if (blk != tempBlock) {
+            faultInjector->applyStuckAt(blk,
+                                        pkt->getOffset(blkSize),
+                                        pkt->getSize());
+        }
     } else if (pkt->isWrite()) {
         // we have the block in a writable state and can go ahead,
         // note that the line may be also be considered writable in
@@ -909,7 +922,11 @@ BaseCache::satisfyRequest(PacketPtr pkt, CacheBlk *blk, bool, bool)
         // Write or WriteLine at the first cache with block in writable state
         if (blk->checkWrite(pkt)) {
             pkt->writeDataToBlock(blk->data, blkSize);
-            faultInjector->injectFaults(tags, blkSize, false, cacheType);
+            if (blk != tempBlock) {
+                faultInjector->applyStuckAt(blk,
+                                            pkt->getOffset(blkSize),
+                                            pkt->getSize());
+            }
 
             DPRINTF(FlowTrace, "satisfyRequest isWrite worked for %#x\n", pkt->getAddr());
         }
@@ -927,7 +944,11 @@ BaseCache::satisfyRequest(PacketPtr pkt, CacheBlk *blk, bool, bool)
         // all read responses have a data payload
         assert(pkt->hasRespData());
 
-        faultInjector->injectFaults(tags, blkSize, true, cacheType);
+        if (blk != tempBlock) {
+            faultInjector->injectTransients(blk);
+            faultInjector->recordRead(blk, pkt->getOffset(blkSize),
+                                      pkt->getSize());
+        }
 
         pkt->setDataFromBlock(blk->data, blkSize);
 
@@ -1160,6 +1181,7 @@ BaseCache::access(PacketPtr pkt, CacheBlk *&blk, Cycles &lat,
 
         pkt->writeDataToBlock(blk->data, blkSize);
         pkt->setData(originalData);
+        faultInjector->applyStuckAt(blk);
 
         DPRINTF(Cache, "%s new state is %s\n", __func__, blk->print());
         incHitCount(pkt);
@@ -1263,6 +1285,7 @@ BaseCache::access(PacketPtr pkt, CacheBlk *&blk, Cycles &lat,
 
         pkt->writeDataToBlock(blk->data, blkSize);
         pkt->setData(originalData);
+        faultInjector->applyStuckAt(blk);
         DPRINTF(Cache, "%s new state is %s\n", __func__, blk->print());
 
         incHitCount(pkt);
@@ -1450,6 +1473,9 @@ BaseCache::handleFill(PacketPtr pkt, CacheBlk *blk, PacketList &writebacks, bool
         DPRINTF(FlowTrace, "handlefill isRead worked for %#x\n", pkt->getAddr());
 
         pkt->writeDataToBlock(blk->data, blkSize);
+        if (blk != tempBlock) {
+            faultInjector->applyStuckAt(blk);
+        }
     }
     DPRINTF(FlowTrace, "handlefill isRead did not work for %#x\n", pkt->getAddr());
     // The block will be ready when the payload arrives and the fill is done
@@ -1558,6 +1584,7 @@ void BaseCache::invalidateBlock(CacheBlk *blk)
     // If handling a block present in the Tags, let it do its invalidation
     // process, which will update stats and invalidate the block itself
     if (blk != tempBlock) {
+        faultInjector->recordInvalidate(blk);
         tags->invalidate(blk);
     } else {
         tempBlock->invalidate();
@@ -1605,6 +1632,10 @@ BaseCache::writebackBlk(CacheBlk *blk)
         pkt->setHasSharers();
     }
 
+    if (blk != tempBlock) {
+        faultInjector->recordWriteback(blk);
+    }
+
     // make sure the block is not marked dirty
     blk->status &= ~BlkDirty;
 
@@ -1650,6 +1681,10 @@ BaseCache::writecleanBlk(CacheBlk *blk, Request::Flags dest, PacketId id)
         pkt->setHasSharers();
     }
 
+    if (blk != tempBlock) {
+        faultInjector->recordWriteback(blk);
+    }
+
     // make sure the block is not marked dirty
     blk->status &= ~BlkDirty;
 
@@ -1051,6 +1051,10 @@ Cache::handleSnoop(PacketPtr pkt, CacheBlk *blk, bool is_timing,
                  "%s is passing a Modified line through %s, "
                  "but keeping the block", name(), pkt->print());
 
+        if (pkt->isRead()) {
+            faultInjector->recordRead(blk, 0, blkSize);
+        }
+
         if (is_timing) {
             doTimingSupplyResponse(pkt, blk->data, is_deferred, pending_inval);
         } else {
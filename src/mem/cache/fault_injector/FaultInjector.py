@@ -1,6 +1,6 @@
 from m5.params import *
 from m5.proxy import *
-from m5.SimObject import SimObject
+from m5.SimObject import SimObject, cxxMethod
 from m5.objects.IndexingPolicies import *
 
 class FaultInjector(SimObject):
@@ -9,4 +9,81 @@ class FaultInjector(SimObject):
 
     input_path = Param.String("/home/muhammet/Downloads/gem5/inputs/input.txt", "Path of input file")
 
-    assoc = Param.Int(Parent.assoc, "associativity")
\ No newline at end of file
+    assoc = Param.Int(Parent.assoc, "associativity")
+
+    size = Param.MemorySize(Parent.size, "Size of the cache")
+
+    cpu_id = Param.Int(-1, "CPU whose fi_activate calls control this fault "
+                       "injector, -1 for a cache shared by every CPU")
+
+    exit_on_start = Param.Bool(False, "Exit the simulation loop when the "
+                               "program calls fi_activate(START)")
+
+    checkpoint_on_start = Param.Bool(False, "Ask for a checkpoint when the "
+                                     "program calls fi_activate(START)")
+
+    exit_on_masked = Param.Bool(False, "Exit with 'fault masked' after "
+                                "fi_activate(STOP) once every corrupted bit "
+                                "was overwritten or dropped unread")
+
+    random_faults = Param.Unsigned(0, "Number of random stuck at 0 faults "
+                                   "to generate instead of reading "
+                                   "input_path, 0 to read input_path")
+
+    random_seed = Param.UInt32(1, "Seed of the random faults")
+
+    random_distribution = Param.String("uniform", "How the random faults "
+                                       "are spread: uniform, block or column")
+
+    random_cache = Param.String("l1d", "Cache that gets the random faults")
+
+    transient_rate = Param.Float(0.0, "Mean number of transient faults per "
+                                 "simulated second while injection is "
+                                 "enabled, 0 to disable the arrival process")
+
+    transient_seed = Param.UInt32(1, "Seed of the transient fault arrival "
+                                  "process")
+
+    profile_path = Param.String("", "Where writeProfile() stores the bytes "
+                                "read after fi_activate(START), empty to "
+                                "disable profiling")
+
+    @cxxMethod
+    def loadFaults(self, path):
+        """Replace the faults with the faults of another fault map"""
+        pass
+
+    @cxxMethod
+    def loadFaultsFromBuffer(self, data, mapIndex=0):
+        """Replace the faults with the faults of a fault map in memory"""
+        pass
+
+    @cxxMethod
+    def generateFaults(self, count, seed):
+        """Replace the faults with random faults"""
+        pass
+
+    @cxxMethod
+    def clearFaults(self):
+        """Remove all faults"""
+        pass
+
+    @cxxMethod
+    def rearmTransients(self):
+        """Let every transient fault fire again"""
+        pass
+
+    @cxxMethod
+    def seedTransients(self, seed):
+        """Restart the transient fault arrivals with another seed"""
+        pass
+
+    @cxxMethod
+    def writeProfile(self):
+        """Store the access profile in profile_path"""
+        pass
+
+    @cxxMethod
+    def injectedBits(self):
+        """Number of bits corrupted so far"""
+        pass
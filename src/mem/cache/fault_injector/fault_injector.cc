@@ -3,33 +3,347 @@
  */
 
 #include "mem/cache/fault_injector/fault_injector.hh"
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cstring>
+#include <map>
+#include <tuple>
+
+#include "base/bitfield.hh"
+#include "base/cprintf.hh"
 #include "debug/Cache.hh"
 #include "debug/FaultTrace.hh"
+#include "sim/sim_exit.hh"
 
-FaultInjector *gFIptr;
+std::vector<FaultInjector *> FaultInjector::injectors;
+
+static const char FAULT_PACK_MAGIC[] = "FIMAPPK";
+static const uint32_t FAULT_PACK_VERSION = 2;
 
 FaultInjector::FaultInjector(FaultInjectorParams *params) :
-    SimObject(params),inputPath(params->input_path),enabled(false), assoc(params->assoc)
-{}
+    SimObject(params),inputPath(params->input_path), tags(nullptr),
+    blkSize(0), pendingTransients(0), numFaults(0), corruptedBlocks(0),
+    enabled(false), assoc(params->assoc), cpuId(params->cpu_id),
+    exitOnStart(params->exit_on_start),
+    checkpointOnStart(params->checkpoint_on_start),
+    exitOnMasked(params->exit_on_masked), started(false), escaped(false),
+    profilePath(params->profile_path), cacheSize(params->size),
+    randomFaults(params->random_faults), randomSeed(params->random_seed),
+    randomDistribution(params->random_distribution),
+    randomCache(params->random_cache),
+    transientRate(params->transient_rate),
+    transientSeed(params->transient_seed),
+    transientRng(params->transient_seed),
+    transientEvent([this]{ transientArrival(); }, name())
+{
+    fatal_if(transientRate < 0, "Transient fault rate of %s is negative\n",
+             name());
+    fatal_if(randomDistribution != "uniform" &&
+             randomDistribution != "block" &&
+             randomDistribution != "column",
+             "Unknown random fault distribution %s of %s\n",
+             randomDistribution, name());
 
-void 
-FaultInjector::init(std::string owner) 
+    injectors.push_back(this);
+}
+
+void
+FaultInjector::init(std::string owner, BaseTags* tags, unsigned blkSize)
 {
-    if(owner == "l1d"){
-        gFIptr = this;
+    fatal_if(!cacheType.empty(), "Fault injector %s is used by both the %s "
+             "and the %s cache, every cache needs its own\n", name(),
+             cacheType, owner);
+
+    cacheType = owner;
+    this->tags = tags;
+    this->blkSize = blkSize;
+
+    if (randomFaults > 0) {
+        generateFaults(randomFaults, randomSeed);
+    } else {
+        loadFaultMap();
     }
+}
 
-    std::ifstream ifs(inputPath);
-    
-    int type,index,byteOffset,bitOffset;
-    std::string cacheToBeInserted;
-    int numberOfFaults = 0;
+std::vector<FaultInjector *>
+FaultInjector::injectorsOf(int cpuId)
+{
+    std::vector<FaultInjector *> cpuInjectors;
+    for (FaultInjector *injector : injectors) {
+        if (injector->cpuId == -1 || injector->cpuId == cpuId) {
+            cpuInjectors.push_back(injector);
+        }
+    }
+
+    return cpuInjectors;
+}
+
+void
+FaultInjector::loadFaultMap()
+{
+    DPRINTF(FaultTrace, "\t%s faults:\n\n", cacheType);
+
+    // <pack>@<n> selects one map of a fault map pack
+    std::string path = inputPath;
+    unsigned mapIndex = 0;
+    const size_t separator = inputPath.rfind('@');
+    if (separator != std::string::npos &&
+        inputPath.find_first_not_of("0123456789", separator + 1) ==
+        std::string::npos && separator + 1 < inputPath.size()) {
+        path = inputPath.substr(0, separator);
+        mapIndex = std::stoul(inputPath.substr(separator + 1));
+    }
 
-    DPRINTF(FaultTrace, "\t%s faults:\n\n", owner);
+    char magic[sizeof(FaultPackHeader::magic)] = {};
+    std::ifstream ifs(path, std::ios::binary);
+    ifs.read(magic, sizeof(magic));
+
+    if (std::memcmp(magic, FAULT_PACK_MAGIC, sizeof(magic)) == 0) {
+        ifs.close();
+
+        int fd = open(path.c_str(), O_RDONLY);
+        fatal_if(fd < 0, "Could not open fault map pack %s\n", path);
+
+        struct stat st;
+        fatal_if(fstat(fd, &st) < 0, "Could not stat fault map pack %s\n", path);
+
+        void *pack = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        close(fd);
+        fatal_if(pack == MAP_FAILED, "Could not map fault map pack %s\n", path);
+
+        loadFaultPack((const char *)pack, st.st_size, mapIndex, path);
+
+        munmap(pack, st.st_size);
+    } else {
+        ifs.clear();
+        ifs.seekg(0);
+        loadTextMap(ifs, path);
+        ifs.close();
+    }
+
+    DPRINTF(FaultTrace, "Number of faults in total: %d\n", numFaults);
+}
+
+void
+FaultInjector::clearTable()
+{
+    table.clear();
+    pendingTransients = 0;
+    numFaults = 0;
+    corruptedBlocks = 0;
+}
+
+void
+FaultInjector::clearFaults()
+{
+    DPRINTF(FaultTrace, "Faults are cleared\n");
+
+    clearTable();
+    started = enabled;
+    escaped = false;
+}
+
+void
+FaultInjector::loadFaults(const std::string &path)
+{
+    inputPath = path;
 
-    if(ifs.is_open()) {
-        while(ifs >> type >> index >> byteOffset >> bitOffset >> cacheToBeInserted){
-            if((cacheToBeInserted.compare(owner)) == 0) {
+    clearTable();
+    loadFaultMap();
+
+    started = enabled;
+    escaped = false;
+
+    if (enabled) {
+        applyToResidentBlocks();
+    }
+}
+
+void
+FaultInjector::loadFaultsFromBuffer(const std::string &data, unsigned mapIndex)
+{
+    const bool isPack = data.size() >= sizeof(FaultPackHeader::magic) &&
+        std::memcmp(data.data(), FAULT_PACK_MAGIC,
+                    sizeof(FaultPackHeader::magic)) == 0;
+
+    clearTable();
+
+    DPRINTF(FaultTrace, "\t%s faults:\n\n", cacheType);
+
+    if (isPack) {
+        loadFaultPack(data.data(), data.size(), mapIndex, "<buffer>");
+    } else {
+        std::istringstream is(data);
+        loadTextMap(is, "<buffer>");
+    }
+
+    DPRINTF(FaultTrace, "Number of faults in total: %d\n", numFaults);
+
+    started = enabled;
+    escaped = false;
+
+    if (enabled) {
+        applyToResidentBlocks();
+    }
+}
+
+void
+FaultInjector::generateFaults(unsigned count, unsigned seed)
+{
+    clearTable();
+
+    if (cacheType == randomCache) {
+        DPRINTF(FaultTrace, "\t%s faults, %d %s random faults with seed %d:\n\n", cacheType, count, randomDistribution, seed);
+
+        const uint64_t numBlocks = cacheSize / blkSize;
+        const uint64_t blkBits = blkSize * 8;
+
+        // Faulty bits, numbered block * blkBits + bit of the block
+        std::set<uint64_t> bits;
+        std::mt19937_64 rng(seed);
+
+        if (randomDistribution == "uniform") {
+            fatal_if(count > numBlocks * blkBits,
+                     "%s has less than %d bits\n", name(), count);
+
+            std::uniform_int_distribution<uint64_t> bit(0,
+                numBlocks * blkBits - 1);
+            while (bits.size() < count) {
+                bits.insert(bit(rng));
+            }
+        } else if (randomDistribution == "block") {
+            fatal_if(count > blkBits, "The blocks of %s have less than %d "
+                     "bits\n", name(), count);
+
+            const uint64_t block =
+                std::uniform_int_distribution<uint64_t>(0, numBlocks - 1)(rng);
+            std::uniform_int_distribution<uint64_t> bit(0, blkBits - 1);
+            while (bits.size() < count) {
+                bits.insert(block * blkBits + bit(rng));
+            }
+        } else {
+            fatal_if(count > numBlocks, "%s has less than %d blocks\n",
+                     name(), count);
+
+            const uint64_t column =
+                std::uniform_int_distribution<uint64_t>(0, blkBits - 1)(rng);
+            std::uniform_int_distribution<uint64_t> block(0, numBlocks - 1);
+            while (bits.size() < count) {
+                bits.insert(block(rng) * blkBits + column);
+            }
+        }
+
+        const std::string source = csprintf("Random fault map of seed %d",
+                                            seed);
+        for (uint64_t bit : bits) {
+            CacheFault fault;
+            fault.type = 0;
+            fault.set = bit / blkBits / assoc;
+            fault.way = bit / blkBits % assoc;
+            fault.byteOffset = bit % blkBits / 8;
+            fault.bitOffset = bit % 8;
+            fault.polarity = 0;
+
+            addFault(fault, source);
+        }
+    }
+
+    started = enabled;
+    escaped = false;
+
+    if (enabled) {
+        applyToResidentBlocks();
+    }
+}
+
+void
+FaultInjector::rearmTransients()
+{
+    DPRINTF(FaultTrace, "Transient faults are re-armed\n");
+
+    pendingTransients = 0;
+    for (auto &entry : table) {
+        for (auto &fault : entry.second.faults) {
+            if (fault.type == 1) {
+                fault.is_injected = 0;
+                pendingTransients++;
+            }
+        }
+    }
+}
+
+FaultyBlock &
+FaultInjector::getFaultyBlock(int set, int way)
+{
+    FaultyBlock &faultyBlock = table[(uint64_t)set * assoc + way];
+    if (faultyBlock.andMask.empty()) {
+        faultyBlock.set = set;
+        faultyBlock.way = way;
+        faultyBlock.andMask.assign(blkSize, 0xff);
+        faultyBlock.orMask.assign(blkSize, 0);
+        faultyBlock.corrupted.assign(blkSize, 0);
+    }
+
+    return faultyBlock;
+}
+
+void
+FaultInjector::addFault(const CacheFault &fault, const std::string &source)
+{
+    const unsigned numSets = cacheSize / (blkSize * assoc);
+
+    fatal_if(fault.set < 0 || (unsigned)fault.set >= numSets ||
+             fault.way < 0 || (unsigned)fault.way >= assoc ||
+             fault.byteOffset < 0 || (unsigned)fault.byteOffset >= blkSize ||
+             fault.bitOffset < 0 || fault.bitOffset > 7,
+             "%s has a fault at set %d, way %d, byte %d, bit %d, outside "
+             "the %d sets, %d ways and %d byte blocks of %s\n", source,
+             fault.set, fault.way, fault.byteOffset, fault.bitOffset, numSets,
+             assoc, blkSize, name());
+
+    FaultyBlock &faultyBlock = getFaultyBlock(fault.set, fault.way);
+    faultyBlock.faults.push_back(fault);
+
+    if (fault.type == 0) { // Permanent
+        if (fault.polarity == 0) {
+            faultyBlock.andMask[fault.byteOffset] &= ~(1UL << fault.bitOffset);
+            faultyBlock.orMask[fault.byteOffset] &= ~(1UL << fault.bitOffset);
+        } else {
+            faultyBlock.andMask[fault.byteOffset] |= (1UL << fault.bitOffset);
+            faultyBlock.orMask[fault.byteOffset] |= (1UL << fault.bitOffset);
+        }
+        faultyBlock.hasPermanent = true;
+    } else {
+        pendingTransients++;
+    }
+
+    numFaults++;
+
+    DPRINTF(FaultTrace, "Type: %d, Set: %d, Way: %d, Byte Offset: %d, Bit Offset: %d, Polarity: %d\n", fault.type, fault.set, fault.way, fault.byteOffset, fault.bitOffset, fault.polarity);
+}
+
+void
+FaultInjector::loadTextMap(std::istream &is, const std::string &path)
+{
+    int type,index,byteOffset,bitOffset,polarity;
+    std::string cacheToBeInserted;
+    std::string line;
+
+    if(is.good()) {
+        while(std::getline(is, line)){
+            std::istringstream record(line);
+            if(!(record >> type >> index >> byteOffset >> bitOffset >> cacheToBeInserted)) {
+                continue;
+            }
+            if(!(record >> polarity)) {
+                polarity = 0;
+            }
+            if((cacheToBeInserted.compare(cacheType)) == 0) {
                 CacheFault fault;
                 fault.type = type;
 
@@ -42,54 +356,584 @@ FaultInjector::init(std::string owner)
                 fault.way = way;
                 fault.byteOffset = byteOffset;
                 fault.bitOffset = bitOffset;
-                fault.cacheToBeInserted = cacheToBeInserted;
-
-                faults.push_back(fault);
-
-                DPRINTF(FaultTrace, "Type: %d, Set: %d, Way: %d, Byte Offset: %d, Bit Offset: %d\n", fault.type, fault.set, fault.way, fault.byteOffset, fault.bitOffset);
+                fault.polarity = polarity;
 
-                numberOfFaults++;
+                addFault(fault, "Fault map " + path);
             }
 	    }
+    }
+}
+
+void
+FaultInjector::loadFaultPack(const char *pack, size_t size,
+                             unsigned mapIndex, const std::string &path)
+{
+    static const char* cacheNames[] = { "l1i", "l1d", "l2", "l3" };
 
-        ifs.close();   
+    fatal_if(size < sizeof(FaultPackHeader),
+             "Fault map pack %s is truncated\n", path);
+
+    const FaultPackHeader *header = (const FaultPackHeader *)pack;
+
+    fatal_if(header->version != FAULT_PACK_VERSION,
+             "Fault map pack %s has version %d, expected %d\n", path,
+             header->version, FAULT_PACK_VERSION);
+
+    // Offsets are checked in 64 bits, before any pointer past the header is
+    // formed, so a truncated or corrupt pack cannot be read out of bounds
+    const uint64_t recordsOffset = sizeof(FaultPackHeader) +
+        (uint64_t)header->numMaps * sizeof(FaultPackEntry);
+    fatal_if(recordsOffset > size,
+             "Fault map pack %s is truncated, its %d map entries end past "
+             "its %d bytes\n", path, header->numMaps, size);
+
+    const FaultPackEntry *entries = (const FaultPackEntry *)(header + 1);
+    const FaultPackRecord *records =
+        (const FaultPackRecord *)(pack + recordsOffset);
+
+    // Only the geometry of this cache matters, the records of the other
+    // caches are skipped
+    uint8_t cache = 0;
+    while (cache < 4 && cacheType != cacheNames[cache]) {
+        cache++;
     }
+    fatal_if(cache == 4, "Fault map pack %s has no geometry for %s caches\n",
+             path, cacheType);
+
+    const FaultPackGeometry &geometry = header->geometry[cache];
+    fatal_if(geometry.assoc != assoc,
+             "Fault map pack %s was made for a %s associativity of %d, "
+             "not %d\n", path, cacheType, geometry.assoc, assoc);
+    fatal_if(geometry.blkSize != blkSize,
+             "Fault map pack %s was made for %d byte %s blocks, not %d\n",
+             path, geometry.blkSize, cacheType, blkSize);
+    fatal_if(mapIndex >= header->numMaps,
+             "Fault map pack %s has no map %d\n", path, mapIndex);
+
+    const FaultPackEntry &entry = entries[mapIndex];
+    fatal_if(recordsOffset + ((uint64_t)entry.firstRecord + entry.numRecords) *
+             sizeof(FaultPackRecord) > size,
+             "Fault map pack %s is truncated, the records %d to %d of map %d "
+             "end past its %d bytes\n", path, entry.firstRecord,
+             (uint64_t)entry.firstRecord + entry.numRecords, mapIndex, size);
+
+    const std::string source = csprintf("Map %d of fault map pack %s",
+                                        mapIndex, path);
+
+    DPRINTF(FaultTrace, "Map %.24s of %s\n", entry.name, path);
+
+    for (uint32_t i = entry.firstRecord;
+         i < entry.firstRecord + entry.numRecords; i++) {
+        const FaultPackRecord &record = records[i];
+        if (record.cache != cache) {
+            continue;
+        }
 
-    DPRINTF(FaultTrace, "Number of faults in total: %d\n", numberOfFaults);
+        CacheFault fault;
+        fault.type = record.type;
+        fault.set = record.set;
+        fault.way = record.way;
+        fault.byteOffset = record.byteOffset;
+        fault.bitOffset = record.bitOffset;
+        fault.polarity = record.polarity;
+
+        addFault(fault, source);
+    }
 }
 
-void 
-FaultInjector::flipBit(CacheFault fault, CacheBlk* blk, unsigned blkSize)
+void
+FaultInjector::flipBit(CacheFault fault, CacheBlk* blk)
 {
     uint8_t* data = blk->data;
-    
+
     uint8_t oldValue = data[fault.byteOffset];
-    data[fault.byteOffset] &= ~(1UL << fault.bitOffset);
+    if (fault.polarity == 0) {
+        data[fault.byteOffset] &= ~(1UL << fault.bitOffset);
+    } else {
+        data[fault.byteOffset] |= (1UL << fault.bitOffset);
+    }
     DPRINTF(FaultTrace, "Set: %#x, Way: %#x, Byte Offset: %d, Bit Offset: %d\n corrupted", fault.set, fault.way, fault.byteOffset, fault.bitOffset);
     DPRINTF(FaultTrace, "Old value of byte %d : %d, New value of byte %d: %d\n", fault.byteOffset, oldValue, fault.byteOffset, data[fault.byteOffset]);
 }
 
-void 
-FaultInjector::injectFaults(BaseTags* tags, unsigned blkSize, bool isRead, std::string cacheType) 
+FaultyBlock *
+FaultInjector::findFaultyBlock(CacheBlk *blk)
+{
+    if (table.empty() || !blk->isValid()) {
+        return nullptr;
+    }
+
+    FaultTable::iterator entry =
+        table.find((uint64_t)blk->getSet() * assoc + blk->getWay());
+
+    return entry == table.end() ? nullptr : &entry->second;
+}
+
+void
+FaultInjector::corruptBlock(FaultyBlock &faultyBlock, CacheBlk *blk)
+{
+    uint8_t* data = blk->data;
+    unsigned changedBits = 0;
+    for (unsigned i = 0; i < blkSize; i++) {
+        const uint8_t oldValue = data[i];
+        data[i] = (data[i] & faultyBlock.andMask[i]) | faultyBlock.orMask[i];
+        faultyBlock.corrupted[i] |= oldValue ^ data[i];
+        changedBits += popCount(oldValue ^ data[i]);
+    }
+
+    if (changedBits) {
+        bitsCorrupted[0] += changedBits; // Permanent
+        markCorrupted(faultyBlock);
+    }
+
+    DPRINTF(FaultTrace, "Stuck at faults applied to Set: %#x, Way: %#x\n", faultyBlock.set, faultyBlock.way);
+}
+
+void
+FaultInjector::markCorrupted(FaultyBlock &faultyBlock)
 {
-    if (!enabled) {
+    if (!faultyBlock.isCorrupted) {
+        faultyBlock.isCorrupted = true;
+        faultyBlock.consumed = false;
+        corruptedBlocks++;
+    }
+}
+
+void
+FaultInjector::corruptionTypes(const FaultyBlock &faultyBlock,
+                               unsigned offset, unsigned size,
+                               unsigned &types) const
+{
+    types = 0;
+    for (unsigned i = offset; i < offset + size; i++) {
+        const uint8_t permanentBits =
+            ~faultyBlock.andMask[i] | faultyBlock.orMask[i];
+        if (faultyBlock.corrupted[i] & permanentBits) {
+            types |= 1 << 0; // Permanent
+        }
+        if (faultyBlock.corrupted[i] & ~permanentBits) {
+            types |= 1 << 1; // Transient
+        }
+    }
+}
+
+void
+FaultInjector::countTypes(Stats::Vector &stat, unsigned types)
+{
+    for (int type = 0; type < 2; type++) {
+        if (types & (1 << type)) {
+            stat[type]++;
+        }
+    }
+}
+
+void
+FaultInjector::clearCorruption(FaultyBlock &faultyBlock, unsigned offset,
+                               unsigned size, bool evicted)
+{
+    if (!faultyBlock.isCorrupted) {
         return;
     }
-    
-    DPRINTF(FaultTrace, "injectFaults method is working\n");
-    for (std::vector<CacheFault>::iterator it = faults.begin();
-                                        it != faults.end(); ++it) {
-
-        CacheBlk* blk = static_cast<CacheBlk*>
-                        (tags->findBlockBySetAndWay(it->set, it->way));
-        if (blk && blk->isValid() && it->cacheToBeInserted == cacheType) {
-            if(it->type == 0) { // Permanent
-                flipBit(*it, blk, blkSize);
-            }else if(it->type == 1 && isRead && it->is_injected == 0) { // Transient
-                flipBit(*it, blk, blkSize);
-                it->is_injected = 1;
+
+    unsigned types;
+    corruptionTypes(faultyBlock, 0, blkSize, types);
+
+    std::fill(faultyBlock.corrupted.begin() + offset,
+              faultyBlock.corrupted.begin() + offset + size, 0);
+
+    if (std::all_of(faultyBlock.corrupted.begin(),
+                    faultyBlock.corrupted.end(),
+                    [](uint8_t bits) { return bits == 0; })) {
+        DPRINTF(FaultTrace, "Corruption of Set: %#x, Way: %#x is masked\n", faultyBlock.set, faultyBlock.way);
+        if (!faultyBlock.consumed) {
+            countTypes(evicted ? maskedEvictions : maskedOverwrites, types);
+        }
+        faultyBlock.isCorrupted = false;
+        corruptedBlocks--;
+        checkMasked();
+    }
+}
+
+void
+FaultInjector::checkMasked()
+{
+    if (!exitOnMasked) {
+        return;
+    }
+
+    // A fault of any cache can still reach the program
+    bool anyStarted = false;
+    for (const FaultInjector *injector : injectors) {
+        if (injector->enabled || injector->escaped ||
+            injector->corruptedBlocks > 0) {
+            return;
+        }
+        anyStarted |= injector->started;
+    }
+
+    if (!anyStarted) {
+        return;
+    }
+
+    DPRINTF(FaultTrace, "Every injected fault is masked\n");
+
+    // Exit only once per fault injection window
+    for (FaultInjector *injector : injectors) {
+        injector->started = false;
+    }
+    exitSimLoop("fault masked");
+}
+
+void
+FaultInjector::applyStuckAt(CacheBlk* blk)
+{
+    applyStuckAt(blk, 0, blkSize);
+}
+
+void
+FaultInjector::applyStuckAt(CacheBlk* blk, unsigned offset, unsigned size)
+{
+    FaultyBlock *faultyBlock = findFaultyBlock(blk);
+    if (!faultyBlock) {
+        return;
+    }
+
+    // The written bytes hold new data, so their old corruption is masked
+    clearCorruption(*faultyBlock, offset, size, false);
+
+    if (enabled && faultyBlock->hasPermanent) {
+        corruptBlock(*faultyBlock, blk);
+    }
+}
+
+void
+FaultInjector::injectTransients(CacheBlk* blk)
+{
+    if (!enabled || pendingTransients == 0 || !blk->isValid()) {
+        return;
+    }
+
+    FaultyBlock *faultyBlock = findFaultyBlock(blk);
+    if (!faultyBlock) {
+        return;
+    }
+
+    DPRINTF(FaultTrace, "injectTransients method is working\n");
+    for (std::vector<CacheFault>::iterator it = faultyBlock->faults.begin();
+                                        it != faultyBlock->faults.end(); ++it) {
+        if(it->type == 1 && it->is_injected == 0) { // Transient
+            const uint8_t oldValue = blk->data[it->byteOffset];
+            flipBit(*it, blk);
+            it->is_injected = 1;
+            pendingTransients--;
+
+            faultyBlock->corrupted[it->byteOffset] |=
+                oldValue ^ blk->data[it->byteOffset];
+            if (oldValue != blk->data[it->byteOffset]) {
+                bitsCorrupted[1]++; // Transient
+                markCorrupted(*faultyBlock);
+            }
+        }
+    }
+}
+
+void
+FaultInjector::scheduleTransient()
+{
+    std::exponential_distribution<double> interval(transientRate);
+    const Tick delay = std::max<Tick>(1,
+        interval(transientRng) * SimClock::Frequency);
+
+    reschedule(transientEvent, curTick() + delay, true);
+}
+
+void
+FaultInjector::seedTransients(unsigned seed)
+{
+    transientRng.seed(seed);
+
+    if (transientEvent.scheduled()) {
+        scheduleTransient();
+    }
+}
+
+void
+FaultInjector::transientArrival()
+{
+    const unsigned numSets = cacheSize / (blkSize * assoc);
+
+    CacheFault fault;
+    fault.type = 1;
+    fault.set = std::uniform_int_distribution<int>(0, numSets - 1)(transientRng);
+    fault.way = std::uniform_int_distribution<int>(0, assoc - 1)(transientRng);
+    fault.byteOffset =
+        std::uniform_int_distribution<int>(0, blkSize - 1)(transientRng);
+    fault.bitOffset = std::uniform_int_distribution<int>(0, 7)(transientRng);
+
+    transientArrivals++;
+
+    CacheBlk* blk = static_cast<CacheBlk*>(
+        tags->findBlockBySetAndWay(fault.set, fault.way));
+    if (blk && blk->isValid()) {
+        // A soft error inverts the bit it hits
+        FaultyBlock &faultyBlock = getFaultyBlock(fault.set, fault.way);
+        fault.polarity = !(blk->data[fault.byteOffset] >> fault.bitOffset & 1);
+
+        flipBit(fault, blk);
+        faultyBlock.corrupted[fault.byteOffset] |= 1 << fault.bitOffset;
+        bitsCorrupted[1]++; // Transient
+        markCorrupted(faultyBlock);
+    } else {
+        DPRINTF(FaultTrace, "Transient fault hit invalid Set: %#x, Way: %#x\n", fault.set, fault.way);
+    }
+
+    scheduleTransient();
+}
+
+void
+FaultInjector::profileRead(CacheBlk *blk, unsigned offset, unsigned size)
+{
+    const uint64_t blkIndex =
+        ((uint64_t)blk->getSet() * assoc + blk->getWay()) * blkSize;
+
+    for (unsigned i = offset; i < offset + size; i++) {
+        ByteAccess &access = profile[blkIndex + i];
+        if (access.reads == 0) {
+            access.firstTick = curTick();
+        }
+        access.reads++;
+        access.lastTick = curTick();
+    }
+}
+
+uint64_t
+FaultInjector::injectedBits() const
+{
+    return bitsCorrupted.total();
+}
+
+void
+FaultInjector::writeProfile()
+{
+    static const char* cacheNames[] = { "l1i", "l1d", "l2", "l3" };
+
+    if (profilePath.empty()) {
+        return;
+    }
+
+    // Caches of the same type, e.g. the L1D caches of all CPUs, share rows
+    std::map<std::tuple<uint8_t, uint32_t, uint16_t, uint16_t>,
+             ProfileRecord> rows;
+    for (const FaultInjector *injector : injectors) {
+        if (injector->profilePath != profilePath) {
+            continue;
+        }
+
+        uint8_t cache = 0;
+        while (cache < 4 && injector->cacheType != cacheNames[cache]) {
+            cache++;
+        }
+
+        const uint64_t size = injector->blkSize;
+        for (const auto &entry : injector->profile) {
+            ProfileRecord record;
+            record.cache = cache;
+            record.set = entry.first / size / injector->assoc;
+            record.way = entry.first / size % injector->assoc;
+            record.byte = entry.first % size;
+            record.reads = entry.second.reads;
+            record.firstTick = entry.second.firstTick;
+            record.lastTick = entry.second.lastTick;
+
+            const auto key = std::make_tuple(cache,
+                                             (uint32_t)record.set,
+                                             (uint16_t)record.way,
+                                             (uint16_t)record.byte);
+            auto row = rows.emplace(key, record);
+            if (!row.second) {
+                ProfileRecord &merged = row.first->second;
+                merged.reads += record.reads;
+                merged.firstTick = std::min(merged.firstTick,
+                                            record.firstTick);
+                merged.lastTick = std::max(merged.lastTick, record.lastTick);
             }
-        }    
+        }
+    }
+
+    std::vector<ProfileRecord> records;
+    for (const auto &row : rows) {
+        records.push_back(row.second);
+    }
+
+    // .npy version 1.0: magic, version, header length, header, data. The
+    // header is padded so that the data starts at a multiple of 64 bytes.
+    std::ostringstream header;
+    header << "{'descr': [('cache', '|u1'), ('set', '<u4'), ('way', '<u2'), "
+           << "('byte', '<u2'), ('reads', '<u8'), ('first_tick', '<u8'), "
+           << "('last_tick', '<u8')], 'fortran_order': False, 'shape': ("
+           << records.size() << ",), }";
+    std::string headerString = header.str();
+    headerString.append(63 - (10 + headerString.size()) % 64, ' ');
+    headerString.push_back('\n');
+
+    const uint16_t headerLength = headerString.size();
+
+    std::ofstream ofs(profilePath, std::ios::binary);
+    fatal_if(!ofs, "Could not open access profile %s\n", profilePath);
+
+    ofs.write("\x93NUMPY\x01\x00", 8);
+    ofs.write((const char *)&headerLength, sizeof(headerLength));
+    ofs.write(headerString.data(), headerString.size());
+    ofs.write((const char *)records.data(),
+              records.size() * sizeof(ProfileRecord));
+
+    DPRINTF(FaultTrace, "Access profile of %d bytes written to %s\n", records.size(), profilePath);
+}
+
+void
+FaultInjector::recordRead(CacheBlk* blk, unsigned offset, unsigned size)
+{
+    if (started && !profilePath.empty()) {
+        profileRead(blk, offset, size);
+    }
+
+    FaultyBlock *faultyBlock = findFaultyBlock(blk);
+    if (!faultyBlock || !faultyBlock->isCorrupted) {
+        return;
+    }
+
+    unsigned types;
+    corruptionTypes(*faultyBlock, offset, size, types);
+    if (types) {
+        DPRINTF(FaultTrace, "Corrupted bytes of Set: %#x, Way: %#x are read\n", faultyBlock->set, faultyBlock->way);
+        countTypes(corruptedReads, types);
+        faultyBlock->consumed = true;
+        escaped = true;
+    }
+}
+
+void
+FaultInjector::recordWriteback(CacheBlk* blk)
+{
+    if (started && !profilePath.empty()) {
+        profileRead(blk, 0, blkSize);
+    }
+
+    FaultyBlock *faultyBlock = findFaultyBlock(blk);
+    if (faultyBlock && faultyBlock->isCorrupted) {
+        DPRINTF(FaultTrace, "Corrupted Set: %#x, Way: %#x is written back\n", faultyBlock->set, faultyBlock->way);
+        if (blk->isDirty()) {
+            unsigned types;
+            corruptionTypes(*faultyBlock, 0, blkSize, types);
+            countTypes(corruptedWritebacks, types);
+        }
+        faultyBlock->consumed = true;
+        escaped = true;
+    }
+}
+
+void
+FaultInjector::recordInvalidate(CacheBlk* blk)
+{
+    FaultyBlock *faultyBlock = findFaultyBlock(blk);
+    if (faultyBlock) {
+        clearCorruption(*faultyBlock, 0, blkSize, true);
+    }
+}
+
+void
+FaultInjector::regStats()
+{
+    SimObject::regStats();
+
+    using namespace Stats;
+
+    bitsCorrupted
+        .init(2)
+        .name(name() + ".bitsCorrupted")
+        .desc("number of bits changed by faults")
+        .flags(total | nozero)
+        ;
+
+    corruptedReads
+        .init(2)
+        .name(name() + ".corruptedReads")
+        .desc("number of reads that returned corrupted bits")
+        .flags(total | nozero)
+        ;
+
+    maskedOverwrites
+        .init(2)
+        .name(name() + ".maskedOverwrites")
+        .desc("number of corrupted blocks overwritten before use")
+        .flags(total | nozero)
+        ;
+
+    maskedEvictions
+        .init(2)
+        .name(name() + ".maskedEvictions")
+        .desc("number of corrupted blocks evicted or invalidated before use")
+        .flags(total | nozero)
+        ;
+
+    corruptedWritebacks
+        .init(2)
+        .name(name() + ".corruptedWritebacks")
+        .desc("number of corrupted dirty blocks written back")
+        .flags(total | nozero)
+        ;
+
+    transientArrivals
+        .name(name() + ".transientArrivals")
+        .desc("number of transient faults of the arrival process")
+        .flags(nozero)
+        ;
+
+    for (Stats::Vector *stat : { &bitsCorrupted, &corruptedReads,
+                                 &maskedOverwrites, &maskedEvictions,
+                                 &corruptedWritebacks }) {
+        stat->subname(0, "permanent");
+        stat->subname(1, "transient");
+    }
+}
+
+void
+FaultInjector::serialize(CheckpointOut &cp) const
+{
+    SERIALIZE_SCALAR(enabled);
+
+    std::vector<int> startedCpus(activeCpus.begin(), activeCpus.end());
+    SERIALIZE_CONTAINER(startedCpus);
+}
+
+void
+FaultInjector::unserialize(CheckpointIn &cp)
+{
+    bool wasEnabled = false;
+    optParamIn(cp, "enabled", wasEnabled);
+
+    // Checkpoints of older builds have no CPUs, the next STOP disables
+    std::vector<int> startedCpus;
+    if (cp.entryExists(Serializable::currentSection(), "startedCpus")) {
+        UNSERIALIZE_CONTAINER(startedCpus);
+    }
+    activeCpus.insert(startedCpus.begin(), startedCpus.end());
+
+    // No events are scheduled while the checkpoint is read, see startup()
+    enabled = wasEnabled;
+    started = wasEnabled;
+}
+
+void
+FaultInjector::startup()
+{
+    SimObject::startup();
+
+    if (enabled) {
+        // Where fi_activate(START) of a run that is not restored would
+        // draw its first arrival, from the same seed
+        transientRng.seed(transientSeed);
+        enableFI();
     }
 }
 
@@ -98,16 +942,67 @@ FaultInjector* FaultInjectorParams::create()
     return new FaultInjector(this);
 }
 
+void
+FaultInjector::start(int cpu)
+{
+    const bool active = !activeCpus.empty();
+    activeCpus.insert(cpu);
+
+    if (!active) {
+        enableFI();
+    }
+}
+
+void
+FaultInjector::stop(int cpu)
+{
+    activeCpus.erase(cpu);
+
+    // Another CPU that shares the cache is still in its region of interest
+    if (!activeCpus.empty()) {
+        DPRINTF(FaultTrace, "STOP of CPU %d, %d CPUs still started\n", cpu, activeCpus.size());
+        return;
+    }
+
+    disableFI();
+}
+
 void
 FaultInjector::enableFI(){
     DPRINTF(FaultTrace, "Fault injection is enabled\n");
     enabled = true;
+    started = true;
+
+    // Blocks that were filled while injection was disabled still hold
+    // clean data, so apply the stuck at masks to them once here.
+    applyToResidentBlocks();
+
+    if (transientRate > 0) {
+        scheduleTransient();
+    }
+}
+
+void
+FaultInjector::applyToResidentBlocks(){
+    for (auto &entry : table) {
+        CacheBlk* blk = static_cast<CacheBlk*>(
+            tags->findBlockBySetAndWay(entry.second.set, entry.second.way));
+        if (blk && blk->isValid() && entry.second.hasPermanent) {
+            corruptBlock(entry.second, blk);
+        }
+    }
 }
 
 void
 FaultInjector:: disableFI(){
     DPRINTF(FaultTrace, "Fault injection is disabled\n");
     enabled=false;
-}
 
+    if (transientEvent.scheduled()) {
+        deschedule(transientEvent);
+    }
 
+    // Permanent faults no longer corrupt new data, the run is over for the
+    // fault injector if the corruption so far is masked
+    checkMasked();
+}
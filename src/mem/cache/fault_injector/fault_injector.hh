@@ -1,25 +1,68 @@
 /** @file
  * Declaration of a structure to insert faults to different levels of caches. 
  * It allows to insert stuck at 0 and stuck at 1 faults for permanent and 
- * transient faults that were declared in an input file.
+ * transient faults that were declared in an input file. Every cache has its
+ * own fault injector, which only keeps the faults of that cache.
+ *
+ * Each line of the input file describes one faulty bit:
+ *
+ *   <type> <index> <byte offset> <bit offset> <cache> [<polarity>]
+ *
+ * where type is 0 for permanent and 1 for transient faults, index is
+ * set * assoc + way, cache is one of l1i, l1d, l2 and l3, and polarity is
+ * 0 for stuck at 0 and 1 for stuck at 1. Lines without a polarity are
+ * stuck at 0 faults.
+ *
+ * The input can also be a binary fault map pack made by faultmap.py, which
+ * holds many maps. <pack>@<n> selects the n-th map of the pack.
+ *
+ * With random_faults set, the cache named by random_cache gets that many
+ * random stuck at 0 faults instead of the faults of the input. They are
+ * drawn from the real cache geometry with random_seed, spread according to
+ * random_distribution: "uniform" over all bits, "block" in the bits of one
+ * block, or "column" in the same bit of different blocks.
+ *
+ * Transient faults can also arrive over time instead of being listed in the
+ * input: with transient_rate set, faults arrive as a seeded Poisson process
+ * while injection is enabled, and each arrival flips a random bit of the
+ * block that is resident in a random set and way.
+ *
+ * The fault injector also tracks which bits of the resident blocks are
+ * corrupted. Corrupted bits that are read or written back reach the program,
+ * corrupted bits that are overwritten or dropped with a clean block are
+ * masked. With exit_on_masked the simulation exits with "fault masked" once
+ * fi_activate(STOP) was called and every corruption is masked. The counts
+ * are reported per fault type in the statistics of the fault injector.
+ *
+ * With profile_path set, every byte that is read or written back after
+ * fi_activate(START) is counted. writeProfile() stores the counts as a NumPy
+ * .npy array of ProfileRecord, which lets the campaign scripts skip fault
+ * maps whose cells are never used.
  */
 
 #ifndef __MEM_CACHE_FAULT_INJECTOR_HH__
 #define __MEM_CACHE_FAULT_INJECTOR_HH__
 
 #include <vector>
+#include <random>
+#include <set>
+#include <unordered_map>
 #include <fstream>
+#include <sstream>
 #include <iostream>
 #include <cassert>
 
 #include "params/FaultInjector.hh"
+#include "sim/eventq.hh"
 #include "sim/sim_object.hh"
 #include "mem/packet.hh"
 #include "mem/cache/cache_blk.hh"
 #include "mem/cache/base.hh"
 #include "mem/cache/tags/base_set_assoc.hh"
 #include "mem/cache/tags/base.hh"
+#include "base/compiler.hh"
 #include "base/logging.hh"
+#include "base/statistics.hh"
 
 class BaseTags;
 class CacheBlk;
@@ -30,20 +73,197 @@ struct CacheFault {
     int way; // Way of the fault
     int byteOffset; // Byte offset of the address from the beginning of block address.
     int bitOffset; // Determines which bit of the byte will be corrupted.
-    std::string cacheToBeInserted; // Indicates which cache to be corrupted.
+    int polarity; // Value the bit is stuck at : 0 or 1.
     int is_injected = 0; // Do not inject transient fault if already injected.
 };
 
-extern FaultInjector *gFIptr;
+/** Binary fault map pack layout, see faultmap.py. */
+struct FaultPackGeometry {
+    uint32_t assoc; // Associativity the sets and ways of the cache refer to
+    uint32_t blkSize; // Block size the byte offsets of the cache refer to
+} M5_ATTR_PACKED;
+
+struct FaultPackHeader {
+    char magic[8]; // "FIMAPPK\0"
+    uint32_t version; // Layout version
+    uint32_t numMaps; // Number of maps in the pack
+    FaultPackGeometry geometry[4]; // l1i(0), l1d(1), l2(2), l3(3)
+} M5_ATTR_PACKED;
+
+struct FaultPackEntry {
+    char name[24]; // Name of the map, e.g. BRAM_1000
+    uint32_t firstRecord; // Index of the first record of the map
+    uint32_t numRecords; // Number of records of the map
+} M5_ATTR_PACKED;
+
+struct FaultPackRecord {
+    uint32_t set;
+    uint16_t way;
+    uint16_t byteOffset;
+    uint8_t bitOffset;
+    uint8_t type;
+    uint8_t polarity;
+    uint8_t cache; // l1i(0), l1d(1), l2(2), l3(3)
+} M5_ATTR_PACKED;
+
+/** One row of the access profile, see writeProfile. */
+struct ProfileRecord {
+    uint8_t cache; // l1i(0), l1d(1), l2(2), l3(3)
+    uint32_t set;
+    uint16_t way;
+    uint16_t byte;
+    uint64_t reads; // Number of reads and writebacks of the byte
+    uint64_t firstTick; // Tick of the first read
+    uint64_t lastTick; // Tick of the last read
+} M5_ATTR_PACKED;
+
+struct FaultyBlock {
+    int set; // Set of the block
+    int way; // Way of the block
+    bool hasPermanent = false; // Whether any permanent fault hits this block.
+    std::vector<uint8_t> andMask; // Clears the stuck at 0 bits of the block.
+    std::vector<uint8_t> orMask; // Sets the stuck at 1 bits of the block.
+    std::vector<CacheFault> faults; // All faults of the block.
+    std::vector<uint8_t> corrupted; // Bits of the resident data that are corrupted.
+    bool isCorrupted = false; // Whether any bit of the resident data is corrupted.
+    bool consumed = false; // Whether the current corruption was read or written back.
+};
 
 class FaultInjector : public SimObject
 {
     private:
+        /** Every fault injector, used to find the injectors of a CPU. */
+        static std::vector<FaultInjector *> injectors;
+
         /** Absolute path of input file that contains faults. */
         std::string inputPath;
 
-        /** Vector that contains faults.  */
-        std::vector<CacheFault> faults;
+        /** Faulty blocks of the cache, indexed by set * assoc + way. */
+        typedef std::unordered_map<uint64_t, FaultyBlock> FaultTable;
+
+        /** Reads of one byte of the cache. */
+        struct ByteAccess {
+            uint64_t reads = 0;
+            Tick firstTick = 0;
+            Tick lastTick = 0;
+        };
+
+        /** Used bytes of the cache, indexed by
+         * (set * assoc + way) * blkSize + byte. */
+        typedef std::unordered_map<uint64_t, ByteAccess> AccessProfile;
+
+        /** Which cache owns this fault injector, empty until init. */
+        std::string cacheType;
+
+        /** Tags of the cache, used to reach resident blocks. */
+        BaseTags* tags;
+
+        /** Size of one block in the cache. */
+        unsigned blkSize;
+
+        /** Faulty blocks of the cache. */
+        FaultTable table;
+
+        /** Transient faults not yet injected. */
+        unsigned pendingTransients;
+
+        /** Number of faults of the cache. */
+        unsigned numFaults;
+
+        /** Resident blocks with corrupted bits. */
+        unsigned corruptedBlocks;
+
+        /** Bytes used since fi_activate(START). */
+        AccessProfile profile;
+
+        /** Adds one fault to the fault table and folds it into the stuck at
+         * masks of its block.
+         *
+         * @param fault The fault, which must lie inside the cache.
+         * @param source Where the fault comes from, for error messages.
+         */
+        void addFault(const CacheFault &fault, const std::string &source);
+
+        /** Reads the faults of the cache from the current input path, which
+         * is either a text fault map or <pack>@<n>. */
+        void loadFaultMap();
+
+        /** Applies the stuck at masks to the faulty blocks that are
+         * currently resident in the cache. */
+        void applyToResidentBlocks();
+
+        /** Reads the faults of the cache from a text fault map.
+         *
+         * @param is Contents of the map.
+         * @param path Where the map comes from, for error messages.
+         */
+        void loadTextMap(std::istream &is, const std::string &path);
+
+        /** Reads the faults of the cache from the n-th map of a fault map
+         * pack that is held in memory.
+         *
+         * @param pack Start of the pack.
+         * @param size Size of the pack in bytes.
+         * @param mapIndex Which map of the pack to read.
+         * @param path Where the pack comes from, for error messages.
+         */
+        void loadFaultPack(const char *pack, size_t size, unsigned mapIndex,
+                           const std::string &path);
+
+        /** Removes all faults of the cache. */
+        void clearTable();
+
+        /** Returns the faulty block that a cache block occupies, or nullptr
+         * if no fault hits it. */
+        FaultyBlock *findFaultyBlock(CacheBlk *blk);
+
+        /** Applies the stuck at masks of a block and records the bits they
+         * changed as corrupted. */
+        void corruptBlock(FaultyBlock &faultyBlock, CacheBlk *blk);
+
+        /** Forgets the corrupted bits of a byte range of a block, because
+         * the data they held is gone.
+         *
+         * @param evicted Whether the block is evicted rather than
+         * overwritten.
+         */
+        void clearCorruption(FaultyBlock &faultyBlock, unsigned offset,
+                             unsigned size, bool evicted);
+
+        /** Marks a block as holding corrupted bits after some of its bits
+         * changed. */
+        void markCorrupted(FaultyBlock &faultyBlock);
+
+        /** Finds which fault types corrupted a byte range of a block. A bit
+         * that a permanent fault hits counts as permanent.
+         *
+         * @param types Set to a bit mask, bit 0 for permanent and bit 1
+         * for transient corruption.
+         */
+        void corruptionTypes(const FaultyBlock &faultyBlock, unsigned offset,
+                             unsigned size, unsigned &types) const;
+
+        /** Adds one to the entries of a statistic whose fault types are
+         * set in a mask returned by corruptionTypes. */
+        void countTypes(Stats::Vector &stat, unsigned types);
+
+        /** Exits the simulation loop if no fault of any fault injector can
+         * reach the program any more. */
+        void checkMasked();
+
+        /** Counts a read of a byte range of a block in the access profile. */
+        void profileRead(CacheBlk *blk, unsigned offset, unsigned size);
+
+        /** Returns the faulty block of a set and way, creating an empty one
+         * if no fault hit it yet. */
+        FaultyBlock &getFaultyBlock(int set, int way);
+
+        /** Flips a random bit of a random block, then schedules the next
+         * transient fault. */
+        void transientArrival();
+
+        /** Schedules the next transient fault of the arrival process. */
+        void scheduleTransient();
 
         /** Whether the fault injector is enabled. */ 
         bool enabled;
@@ -51,37 +271,220 @@ class FaultInjector : public SimObject
         /** Set associativity of the cache */ 
         const unsigned assoc;
 
+        /** CPU whose fi_activate calls control this fault injector, -1 for
+         * a cache that is shared by every CPU. */
+        const int cpuId;
+
+        /** Whether fi_activate(START) exits the simulation loop. */
+        const bool exitOnStart;
+
+        /** Whether fi_activate(START) asks for a checkpoint. */
+        const bool checkpointOnStart;
+
+        /** Whether to exit the simulation once every fault is masked. */
+        const bool exitOnMasked;
+
+        /** Whether injection was enabled since the faults were loaded. */
+        bool started;
+
+        /** CPUs between their fi_activate(START) and STOP. A shared cache
+         * is enabled by the first of them and disabled by the last. */
+        std::set<int> activeCpus;
+
+        /** Whether a corrupted bit was read or written back. */
+        bool escaped;
+
+        /** Where writeProfile stores the access profile, empty if the
+         * accesses are not profiled. */
+        const std::string profilePath;
+
+        /** Size of the cache in bytes. */
+        const uint64_t cacheSize;
+
+        /** Number of random faults to generate instead of reading the
+         * input, 0 to read the input. */
+        const unsigned randomFaults;
+
+        /** Seed of the random faults. */
+        const unsigned randomSeed;
+
+        /** How the random faults are spread over the cache. */
+        const std::string randomDistribution;
+
+        /** Which cache gets the random faults. */
+        const std::string randomCache;
+
+        /** Mean number of transient faults per simulated second, 0 if
+         * transient faults only come from the input. */
+        const double transientRate;
+
+        /** Seed of the transient fault arrival process. */
+        const unsigned transientSeed;
+
+        /** Random numbers of the transient fault arrival process. */
+        std::mt19937_64 transientRng;
+
+        /** Arrival of the next transient fault. */
+        EventFunctionWrapper transientEvent;
+
+        /** Number of transient faults that arrived, including the ones that
+         * hit an invalid block. */
+        Stats::Scalar transientArrivals;
+
+        /** Statistics, indexed by fault type: permanent(0), transient(1). */
+        Stats::Vector bitsCorrupted;
+        Stats::Vector corruptedReads;
+        Stats::Vector maskedOverwrites;
+        Stats::Vector maskedEvictions;
+        Stats::Vector corruptedWritebacks;
+
     public:
         FaultInjector(FaultInjectorParams *p);
 
         /** 
-         * Reads all faults from the input file and populates faults vector. 
+         * Reads the faults of the cache from the input file and populates
+         * the fault table. Every cache has its own fault injector, so only
+         * the faults of this cache are kept.
          * 
          * @param cacheType Which cache owns this fault injector object.
+         * @param tags Tags of the cache.
+         * @param blkSize Size of one block in the cache.
+         */
+        void init(std::string cacheType, BaseTags* tags, unsigned blkSize);
+
+        /** Returns the fault injectors that fi_activate calls of a CPU
+         * control: the ones of its private caches and of the shared caches.
+         *
+         * @param cpuId Id of the CPU that calls fi_activate.
          */
-        void init(std::string cacheType);
+        static std::vector<FaultInjector *> injectorsOf(int cpuId);
         
         /** Flips a bit of the data according to stuck at policy. If it is stuck at 1 fault, it flips
          * specified bit to 1. If it is stuck at 0 fault, it flips specified bit to 0.
          * 
          * @param fault The fault that defines the stuck at policy, byte offset and bit offset.
          * @param blk Cache block that will be corrupted
-         * @param blkSize Size of one block in the cache.
          */
-        void flipBit(CacheFault fault, CacheBlk* blk, unsigned blkSize);
+        void flipBit(CacheFault fault, CacheBlk* blk);
+
+        /** Applies the precomputed stuck at masks of a block. Permanent faults
+         * only change the data when the data of the block changes, so the
+         * cache calls this after a fill, a write hit and a writeback merge.
+         * 
+         * @param blk Cache block whose data has just been written.
+        */
+        void applyStuckAt(CacheBlk* blk);
+
+        /** Applies the stuck at masks of a block after a partial write.
+         * 
+         * @param blk Cache block that has just been written.
+         * @param offset First byte of the block that was written.
+         * @param size Number of bytes that were written.
+        */
+        void applyStuckAt(CacheBlk* blk, unsigned offset, unsigned size);
+
+        /** Injects the transient faults of a block on its first read hit.
+         * 
+         * @param blk Cache block that is read.
+        */
+        void injectTransients(CacheBlk* blk);
 
-        /** Injects all active faults at specified tick. 
+        /** Records that bytes of a block are read, which lets the corrupted
+         * bits among them reach the program.
          * 
-         * @param tags Cache tags.
-         * @param blkSize Size of one block in cache.
-         * @param isRead Indicates whether we inject faults on a read. This is useful because, for example, there is no point of inserting
-         * a transient fault on a write.  
-         * @param cacheType Parameter to understand which cache performs the request.
+         * @param blk Cache block that is read.
+         * @param offset First byte of the block that is read.
+         * @param size Number of bytes that are read.
         */
-        void injectFaults(BaseTags* tags, unsigned blkSize, bool isRead, std::string cacheType);
+        void recordRead(CacheBlk* blk, unsigned offset, unsigned size);
+
+        /** Records that a block is written back to the next level. Called
+         * before the block is marked clean. */
+        void recordWriteback(CacheBlk* blk);
+
+        /** Records that a block is invalidated, which masks the corrupted
+         * bits that were not read or written back. */
+        void recordInvalidate(CacheBlk* blk);
+
+        /** Replaces the faults of the cache with the faults of another
+         * fault map. Used by forked campaigns after the fault free prefix
+         * of the program.
+         *
+         * @param path Text fault map or <pack>@<n>.
+         */
+        void loadFaults(const std::string &path);
+
+        /** Replaces the faults of the cache with the faults of a fault map
+         * held in memory, either text or a fault map pack.
+         *
+         * @param data Contents of the fault map.
+         * @param mapIndex Which map to use if data is a fault map pack.
+         */
+        void loadFaultsFromBuffer(const std::string &data, unsigned mapIndex);
+
+        /** Replaces the faults of the cache with random faults drawn from
+         * random_distribution. Caches other than random_cache get no
+         * faults.
+         *
+         * @param count Number of faulty bits.
+         * @param seed Seed of the random faults.
+         */
+        void generateFaults(unsigned count, unsigned seed);
+
+        /** Removes the faults of the cache. */
+        void clearFaults();
+
+        /** Marks every transient fault as not injected yet, so it fires
+         * again on the next read of its block. */
+        void rearmTransients();
+
+        /** Restarts the transient fault arrival process with another seed,
+         * so forked children see different arrivals. */
+        void seedTransients(unsigned seed);
+
+        /** Stores the access profile of every fault injector with the same
+         * profile_path as a .npy array. The counts of caches of the same
+         * type, e.g. the L1D caches of all CPUs, are added up. */
+        void writeProfile();
+
+        /** Number of bits corrupted so far, permanent and transient, for
+         * the run summary of configs that do not dump stats. */
+        uint64_t injectedBits() const;
+
+        /** fi_activate(START) of a CPU, enables injection unless another
+         * CPU that shares the cache already did.
+         *
+         * @param cpuId Id of the CPU that calls fi_activate.
+         */
+        void start(int cpuId);
+
+        /** fi_activate(STOP) of a CPU, disables injection once no CPU that
+         * shares the cache is between START and STOP any more.
+         *
+         * @param cpuId Id of the CPU that calls fi_activate.
+         */
+        void stop(int cpuId);
 
         void enableFI();
         void disableFI();
+
+        void regStats() override;
+
+        /** Whether fi_activate(START) exits the simulation loop. */
+        bool exitsOnStart() const { return exitOnStart; }
+
+        /** Whether fi_activate(START) asks for a checkpoint. */
+        bool checkpointsOnStart() const { return checkpointOnStart; }
+
+        /** Runs restored from a checkpoint taken at fi_activate(START) must
+         * start with injection enabled. unserialize only restores the
+         * state, startup() enables injection like fi_activate(START) would
+         * at the tick of the checkpoint, with the arrival process seeded
+         * from transient_seed. A restored run therefore sees the same
+         * arrivals as a run of the same seed that is not restored. */
+        void serialize(CheckpointOut &cp) const override;
+        void unserialize(CheckpointIn &cp) override;
+        void startup() override;
 };
 
 #endif // __MEM_CACHE_FAULT_INJECTOR_HH__
@@ -104,16 +104,20 @@ def parse_options():
     # Statistics options
     group("Statistics Options")
     option("--stats-file", metavar="FILE", default="stats.txt",
-        help="Sets the output file for statistics [Default: %default]")
+        help="Sets the output file for statistics, empty to disable " \
+             "[Default: %default]")
 
     # Configuration Options
     group("Configuration Options")
     option("--dump-config", metavar="FILE", default="config.ini",
-        help="Dump configuration output file [Default: %default]")
+        help="Dump configuration output file, empty to disable " \
+             "[Default: %default]")
     option("--json-config", metavar="FILE", default="config.json",
-        help="Create JSON output of the configuration [Default: %default]")
+        help="Create JSON output of the configuration, empty to disable " \
+             "[Default: %default]")
     option("--dot-config", metavar="FILE", default="config.dot",
-        help="Create DOT & pdf outputs of the configuration [Default: %default]")
+        help="Create DOT & pdf outputs of the configuration, empty to " \
+             "disable [Default: %default]")
     option("--dot-dvfs-config", metavar="FILE", default=None,
         help="Create DOT & pdf outputs of the DVFS configuration" + \
              " [Default: %default]")
@@ -345,7 +349,8 @@ def main(*args):
     sys.path[0:0] = options.path
 
     # set stats options
-    stats.addStatVisitor(options.stats_file)
+    if options.stats_file:
+        stats.addStatVisitor(options.stats_file)
 
     # Disable listeners unless running interactively or explicitly
     # enabled
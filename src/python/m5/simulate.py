@@ -110,8 +110,9 @@ def instantiate(ckpt_dir=None):
         except ImportError:
             pass
 
-    do_dot(root, options.outdir, options.dot_config)
-    do_ruby_dot(root, options.outdir, options.dot_config)
+    if options.dot_config:
+        do_dot(root, options.outdir, options.dot_config)
+        do_ruby_dot(root, options.outdir, options.dot_config)
 
     # Initialize the global statistics
     stats.initSimStats()
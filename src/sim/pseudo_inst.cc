@@ -720,15 +720,34 @@ workend(ThreadContext *tc, uint64_t workid, uint64_t threadid)
 
 void
 fi_activate(ThreadContext *tc, uint64_t threadid, uint64_t req){
-    // Thread Id Is ignored at this point
+    // Thread Id Is ignored at this point, the request controls the fault
+    // injectors of the caches of the CPU that issues it. The injectors of
+    // shared caches stay enabled until every CPU that started stopped
+    const std::vector<FaultInjector *> injectors =
+        FaultInjector::injectorsOf(tc->cpuId());
+
     switch (req ){
-        case START:
-            gFIptr->enableFI();
-            DPRINTF(FaultTrace, "START Request\n");
+        case START: {
+            bool checkpoint = false;
+            bool exitLoop = false;
+            for (FaultInjector *injector : injectors) {
+                injector->start(tc->cpuId());
+                checkpoint |= injector->checkpointsOnStart();
+                exitLoop |= injector->exitsOnStart();
+            }
+            DPRINTF(FaultTrace, "START Request from CPU %d\n", tc->cpuId());
+            if (checkpoint) {
+                exitSimLoop("checkpoint");
+            } else if (exitLoop) {
+                exitSimLoop("fault injection start");
+            }
             break;
+        }
         case STOP:
-            gFIptr->disableFI();
-            DPRINTF(FaultTrace, "STOP Request\n");
+            for (FaultInjector *injector : injectors) {
+                injector->stop(tc->cpuId());
+            }
+            DPRINTF(FaultTrace, "STOP Request from CPU %d\n", tc->cpuId());
             break;
         default:
             DPRINTF(FaultTrace, "This Request does not exist I ignore it\n");
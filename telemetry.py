@@ -0,0 +1,195 @@
+#  Live telemetry of a campaign.
+#
+#  The scheduler of run.py reports every run it starts and every record it
+#  gets back to a Monitor. The monitor keeps the throughput per benchmark
+#  and voltage, the host seconds and instruction rate of the simulated
+#  runs and the runs that take far longer than the golden run. Every
+#  interval it rewrites a JSON status file and prints one line, so a
+#  campaign can be followed with cat or watch, also on a Slurm node.
+#  Fork campaigns report every child as the fork parent reaps it, from
+#  the progress lines of configs/fi_config/campaign.py.
+#
+#  The instruction rate is the one of the time in m5.simulate, which
+#  leaves out Python startup, configuration and checkpoint restore.
+#
+#  The projected completion assumes the rest of the queue runs at the
+#  throughput so far. Sampled cells that finish early make it pessimistic.
+#
+#  example run: python3 telemetry.py campaign_status.json
+
+import os
+import sys
+import json
+import time
+
+SLOWEST_RUNS = 10 # Slow runs kept in the status file
+
+def distribution(values):
+    #  Mean and quantiles of a list of numbers, None for an empty list
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    def quantile(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {"count": len(values), "mean": sum(values) / len(values), "min": values[0], "median": quantile(0.5),
+            "p90": quantile(0.9), "p99": quantile(0.99), "max": values[-1]}
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+
+    hours, seconds = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(seconds, 60)
+
+    return "%dh%02dm" % (hours, minutes) if hours else "%dm%02ds" % (minutes, seconds)
+
+class Monitor:
+    def __init__(self, status_path, number_of_jobs, golden_seconds, interval=30, slow_factor=100):
+        self.status_path = status_path
+        self.number_of_jobs = number_of_jobs
+        self.golden_seconds = golden_seconds # Per benchmark, or benchmark variant
+        self.interval = interval
+        self.slow_factor = slow_factor
+
+        self.start = time.time()
+        self.last_report = 0
+        self.running = {} # Run: (bench, voltage, input name, start)
+        self.done = {}    # (bench, voltage): number of finished maps
+        self.host_seconds = []
+        self.inst_rates = []
+        self.slow_runs = []
+        self.queued = number_of_jobs
+        self.forked_runs = set() # (bench, voltage, input name) of fork children that were reported when reaped
+
+    def started(self, run, bench_name, voltage, input_name):
+        self.running[run] = (bench_name, voltage, input_name, time.time())
+
+    def failed(self, run):
+        #  A run whose worker raised, it has no record
+        self.running.pop(run, None)
+
+    def finished(self, record, run=None, bench_name=None):
+        #  Records of pruned maps are counted without a run, under bench_name if given
+        bench_name, voltage, input_name, start = self.running.pop(run) if run in self.running else (bench_name or record["bench"], record["voltage"], record["input"], None)
+
+        # Fork children were counted when they were reaped, their collection only classifies them
+        if (bench_name, voltage, input_name) in self.forked_runs:
+            self.forked_runs.discard((bench_name, voltage, input_name))
+            return
+
+        cell = (bench_name, voltage)
+        self.done[cell] = self.done.get(cell, 0) + 1
+
+        if start is None:
+            return
+
+        # gem5's own time of the run, the wall clock one for runs that did not write it
+        self.account(bench_name, voltage, input_name, record["result"], record.get("host_seconds") or time.time() - start, record)
+
+    def forked(self, bench_name, voltage, progress):
+        #  A fork child that the fork parent reaped, see configs/fi_config/campaign.py
+        cell = (bench_name, voltage)
+        self.done[cell] = self.done.get(cell, 0) + 1
+        self.forked_runs.add((bench_name, voltage, progress["input"]))
+
+        summary = progress["summary"] or {}
+        self.account(bench_name, voltage, progress["input"], progress["status"], summary.get("host_seconds") or progress["seconds"], summary)
+
+    def account(self, bench_name, voltage, input_name, result, host_seconds, stats):
+        #  Host seconds and instruction rate of a simulated run, stats is its record or summary
+        self.host_seconds.append(host_seconds)
+
+        # Stats of older runs have no instruction rate of their own
+        if stats.get("host_inst_rate"):
+            self.inst_rates.append(stats["host_inst_rate"])
+        elif stats.get("sim_insts") and stats.get("host_seconds"):
+            self.inst_rates.append(stats["sim_insts"] / stats["host_seconds"])
+
+        golden_seconds = self.golden_seconds.get(bench_name)
+        if golden_seconds and host_seconds > self.slow_factor * golden_seconds:
+            self.slow_runs.append({"bench": bench_name, "voltage": voltage, "input": input_name, "result": result,
+                                   "host_seconds": host_seconds, "golden_ratio": host_seconds / golden_seconds})
+            self.slow_runs.sort(key=lambda run: run["golden_ratio"], reverse=True)
+            del self.slow_runs[SLOWEST_RUNS:]
+
+    def status(self):
+        now = time.time()
+        elapsed = now - self.start
+        done = sum(self.done.values())
+
+        maps_per_hour = done * 3600.0 / elapsed if elapsed > 0 else 0.0
+        remaining = self.queued + len(self.running)
+        eta = remaining * 3600.0 / maps_per_hour if maps_per_hour > 0 else None
+
+        # Running maps, longest first, with how many golden runs long they are so far
+        running = []
+        for bench_name, voltage, input_name, start in sorted(self.running.values(), key=lambda run: run[3]):
+            golden_seconds = self.golden_seconds.get(bench_name)
+            running.append({"bench": bench_name, "voltage": voltage, "input": input_name, "seconds": now - start,
+                            "golden_ratio": (now - start) / golden_seconds if golden_seconds else None})
+
+        return {
+            "updated": now,
+            "elapsed": elapsed,
+            "jobs": self.number_of_jobs,
+            "done": done,
+            "running": len(self.running),
+            "queued": self.queued,
+            "maps_per_hour": maps_per_hour,
+            "cells": dict(("%s/%s" % cell, {"done": count, "maps_per_hour": count * 3600.0 / elapsed if elapsed > 0 else 0.0})
+                          for cell, count in sorted(self.done.items())),
+            "host_seconds": distribution(self.host_seconds),
+            "host_inst_rate": distribution(self.inst_rates),
+            "eta_seconds": eta,
+            "projected_completion": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now + eta)) if eta is not None else None,
+            "slow_runs": self.slow_runs,
+            "running_runs": running[:SLOWEST_RUNS]
+        }
+
+    def update(self, queued, force=False):
+        #  Rewrites the status file and prints a line once per interval
+        self.queued = queued
+
+        if not force and time.time() - self.last_report < self.interval:
+            return
+
+        self.last_report = time.time()
+        status = self.status()
+
+        # Renamed into place, readers never see half a file
+        with open(self.status_path + ".tmp", "w") as status_file:
+            json.dump(status, status_file, indent=2)
+        os.replace(self.status_path + ".tmp", self.status_path)
+
+        print(summary(status))
+        sys.stdout.flush()
+
+def summary(status):
+    #  One line of a status
+    host_seconds = status["host_seconds"]
+    inst_rate = status["host_inst_rate"]
+
+    return "[%s] %d/%d maps, %d running, %d queued, %.1f maps/h, %s s/run (median), %s inst/s (median), %d slow, ETA %s" % (
+        time.strftime("%H:%M:%S", time.localtime(status["updated"])), status["done"], status["jobs"], status["running"], status["queued"],
+        status["maps_per_hour"], "%.1f" % host_seconds["median"] if host_seconds else "?", "%.3g" % inst_rate["median"] if inst_rate else "?",
+        len(status["slow_runs"]), format_seconds(status["eta_seconds"]))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit("usage: " + sys.argv[0] + " <status file>...")
+
+    # The status of every shard
+    for status_path in sys.argv[1:]:
+        with open(status_path) as status_file:
+            status = json.load(status_file)
+
+        print(status_path + ": " + summary(status))
+
+        for cell, cell_status in sorted(status["cells"].items()):
+            print("  %s: %d maps, %.1f maps/h" % (cell, cell_status["done"], cell_status["maps_per_hour"]))
+
+        for run in status["slow_runs"]:
+            print("  slow: %s %s %s, %.0f s, %.0fx golden, %s" % (run["bench"], run["voltage"], run["input"], run["host_seconds"], run["golden_ratio"], run["result"]))
@@ -0,0 +1,8 @@
+#  Tests of the campaign scripts at the root of the tree.
+#
+#  example run: python3 -m pytest tests/fi
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
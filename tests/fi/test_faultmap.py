@@ -0,0 +1,53 @@
+import os
+
+import faultmap
+
+ASSOCS = {'l1i': 2, 'l1d': 4, 'l2': 8, 'l3': 16}
+
+def write_map(directory, name, lines):
+    with open(os.path.join(str(directory), name), "w") as map_file:
+        map_file.write("".join(line + "\n" for line in lines))
+
+def make_maps(tmp_path):
+    input_dir = tmp_path / "0.54V"
+    input_dir.mkdir()
+
+    write_map(input_dir, "BRAM_10.txt", ["0 17 3 5 l2 1", "1 17 63 7 l1d"])
+    write_map(input_dir, "BRAM_9.txt", ["0 33 0 0 l3", "not a fault", "0 1 2 3 l1i 0"])
+
+    return str(input_dir)
+
+def test_layout_matches_fault_injector():
+    # sizeof(FaultPackHeader), sizeof(FaultPackEntry) and sizeof(FaultPackRecord)
+    assert faultmap.get_entries_offset() == 48
+    assert faultmap.ENTRY_FORMAT.size == 32
+    assert faultmap.RECORD_FORMAT.size == 12
+
+def test_index_is_split_with_the_assoc_of_its_cache(tmp_path):
+    input_dir = make_maps(tmp_path)
+
+    faults = faultmap.parse_text_map(input_dir + "/BRAM_10.txt", ASSOCS)
+
+    assert faults == [(2, 1, 3, 5, 0, 1, faultmap.CACHE_IDS['l2']), (4, 1, 63, 7, 1, 0, faultmap.CACHE_IDS['l1d'])]
+
+def test_pack_round_trip(tmp_path):
+    input_dir = make_maps(tmp_path)
+
+    pack_path = faultmap.convert_directory(input_dir, "", ASSOCS)
+
+    assert pack_path == input_dir + "_assoc2-4-8-16.fmp"
+    assert faultmap.read_names(pack_path) == ["BRAM_9", "BRAM_10"]
+    assert faultmap.read_geometry(pack_path) == {'l1i': (2, 64), 'l1d': (4, 64), 'l2': (8, 64), 'l3': (16, 64)}
+
+    for index, name in enumerate(["BRAM_9", "BRAM_10"]):
+        text_faults = faultmap.parse_fault_input(input_dir + "/" + name + ".txt", ASSOCS)
+        assert faultmap.parse_fault_input(pack_path + "@" + str(index), ASSOCS) == text_faults
+
+def test_pack_of_another_geometry_is_stale(tmp_path):
+    input_dir = make_maps(tmp_path)
+
+    pack_path = faultmap.convert_directory(input_dir, "", ASSOCS)
+
+    assert faultmap.is_up_to_date(pack_path, input_dir, ASSOCS)
+    assert not faultmap.is_up_to_date(pack_path, input_dir, dict(ASSOCS, l2=4))
+    assert not faultmap.is_up_to_date(pack_path, input_dir, ASSOCS, 32)
@@ -0,0 +1,46 @@
+import argparse
+
+import faultmap
+import helpers
+
+ARGS = argparse.Namespace(l1i_assoc=2, l1d_assoc=2, l2_assoc=8, l3_assoc=16, transient_rates=["0.55V=2000"])
+
+def test_masked_map_is_checked_in_the_sets_and_ways_of_its_cache(tmp_path):
+    input_path = tmp_path / "BRAM_1.txt"
+    input_path.write_text("0 17 3 5 l2\n")
+
+    assocs = helpers.getCacheAssocs(ARGS)
+    l2 = faultmap.CACHE_IDS['l2']
+
+    # Index 17 is set 2, way 1 of the 8 way L2, set 8, way 1 with the L1D associativity
+    assert not helpers.isTriviallyMasked(str(input_path), assocs, set([(l2, 2, 1, 3)]))
+    assert helpers.isTriviallyMasked(str(input_path), assocs, set([(l2, 8, 1, 3)]))
+
+def test_transient_rate_of_a_voltage():
+    assert helpers.getTransientRate(ARGS, "0.55V") == "2000"
+    assert helpers.getTransientRate(ARGS, "0.54V") == ""
+    assert helpers.getTransientOptions(ARGS, "0.54V", "BRAM_1.txt") == ""
+    assert helpers.getTransientOptions(ARGS, "0.55V", "BRAM_1.txt").startswith("--transient-rate=2000 --transient-seed=")
+
+def test_checkpoint_runs_are_not_pruned():
+    assert helpers.canPrune(argparse.Namespace(prune=True, checkpoint=False))
+    assert not helpers.canPrune(argparse.Namespace(prune=True, checkpoint=True))
+    assert not helpers.canPrune(argparse.Namespace(prune=False, checkpoint=False))
+
+def test_cache_keys_change_with_the_simulator(tmp_path, monkeypatch):
+    gem5_binary = tmp_path / "gem5.opt"
+    gem5_binary.write_bytes(b"build 1")
+    monkeypatch.setattr(helpers, "GEM5_BINARY", str(gem5_binary))
+
+    key = helpers.getCacheKey("matrix_mul", "--cache-level=1")
+    assert helpers.getCacheKey("matrix_mul", "--cache-level=1") == key
+    assert helpers.getCacheKey("matrix_mul", "--cache-level=2") != key
+
+    gem5_binary.write_bytes(b"build 22")
+    assert helpers.getCacheKey("matrix_mul", "--cache-level=1") != key
+    assert helpers.getCheckpointDir("matrix_mul", "--cache-level=1").endswith(helpers.getCacheKey("matrix_mul", "--cache-level=1"))
+
+def test_wall_clock_limit_follows_the_golden_run():
+    assert helpers.getWallClockLimit(argparse.Namespace(hang_factor=10.0, golden_seconds=42.5)) == 425 + helpers.WALL_CLOCK_SLACK
+    assert helpers.getWallClockLimit(argparse.Namespace(hang_factor=0.0, golden_seconds=42.5)) is None
+    assert helpers.getWallClockLimit(argparse.Namespace(hang_factor=10.0, golden_seconds=None)) is None
@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+
+import helpers
+import planner
+
+def get_arguments(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["run.py"] + list(argv))
+    return helpers.get_arguments()
+
+def test_configurations_with_the_same_hash_are_simulated_once(monkeypatch):
+    args = get_arguments(monkeypatch, "--voltages", "0.54V", "0.55V")
+    spec = {"benchmarks": {"matrix_mul": [{}, {}]}, "caches": [{"l1d_size": "2kB"}, {"l1d-size": "2kB"}]}
+
+    configs = planner.expand(args, spec)
+
+    assert len(configs) == 1
+    assert configs[0].voltages == ["0.54V", "0.55V"]
+    assert configs[0].variant == ""
+    assert configs[0].cache_options == ["l1d_size"]
+
+def test_benchmark_with_several_configurations_has_variants(monkeypatch):
+    args = get_arguments(monkeypatch)
+    spec = {"benchmarks": {"matrix_mul": {}, "sobel": {}}, "caches": [{"l1d_size": "2kB"}, {"l1d_size": "4kB"}], "cache_levels": [1]}
+
+    configs = planner.expand(args, spec)
+
+    assert [config.bench_name for config in configs] == ["matrix_mul", "matrix_mul", "sobel", "sobel"]
+    assert len(set(config.config_hash for config in configs)) == 4
+    assert all(config.variant == config.config_hash[:8] for config in configs)
+    assert all(config.cache_level == "1" for config in configs)
+
+def test_command_line_without_campaign_file(monkeypatch):
+    args = get_arguments(monkeypatch, "--bench-name", "matrix_mul", "sobel", "--voltages", "0.54V")
+
+    configs = planner.expand(args, None)
+
+    assert [(config.bench_name, config.variant, config.voltages) for config in configs] == [("matrix_mul", "", ["0.54V"]), ("sobel", "", ["0.54V"])]
+    assert configs[0].config_hash == helpers.getConfigHash(configs[0])
+
+def test_checkpoints_of_benchmarks_with_files_open_at_start_are_refused(monkeypatch):
+    args = get_arguments(monkeypatch, "--checkpoint")
+
+    with pytest.raises(SystemExit, match="use --fork instead of --checkpoint"):
+        planner.expand(args, {"benchmarks": {"sobel": {}}})
+
+def test_unknown_names_are_refused(monkeypatch):
+    args = get_arguments(monkeypatch)
+
+    with pytest.raises(SystemExit, match="Unknown benchmark lu"):
+        planner.expand(args, {"benchmarks": {"lu": {}}})
+    with pytest.raises(SystemExit, match="Unknown cache arguments l1d_latency"):
+        planner.expand(args, {"benchmarks": {"sobel": {}}, "caches": [{"l1d_latency": 2}]})
+    with pytest.raises(SystemExit, match="Unknown argument no_such_option"):
+        planner.expand(args, {"benchmarks": {"sobel": {"no_such_option": 1}}})
@@ -0,0 +1,149 @@
+import os
+import shutil
+import subprocess
+
+import numpy
+import pytest
+
+import quality
+
+PROGS_DIR = os.path.join(os.path.dirname(__file__), "..", "test-progs")
+
+#  Sources of the quality tools, as in the Makefiles of the benchmarks
+TOOLS = {
+    'sobel': ["sobel/psnr.c"],
+    'dct': ["dct/quality.c"],
+    'blackscholes': ["blackscholes/error.c"],
+    'jacobi': ["jacobi/error.c"],
+    'monteCarlo': ["monteCarlo/calc_errors.c"],
+    'Kmeans': ["Kmeans/compare.c", "Kmeans/file_io.c", "Kmeans/util.c"]
+}
+
+@pytest.fixture(scope="module")
+def tools(tmp_path_factory):
+    if shutil.which("gcc") is None:
+        pytest.skip("gcc is needed to build the quality tools")
+
+    build_dir = tmp_path_factory.mktemp("tools")
+    paths = {}
+    for bench_name, sources in TOOLS.items():
+        paths[bench_name] = str(build_dir / bench_name)
+        subprocess.check_call(["gcc", "-O2", "-I" + os.path.join(PROGS_DIR, os.path.dirname(sources[0])), "-o", paths[bench_name]] +
+                              [os.path.join(PROGS_DIR, source) for source in sources] + ["-lm"])
+
+    return paths
+
+def run_tool(path, *args):
+    #  Metrics on the last line a quality tool prints, after the label psnr.c prints. Its exit status is not meaningful
+    output = subprocess.run([path] + [str(arg) for arg in args], stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return output.strip().splitlines()[-1].split(":")[-1].replace(" ", "").strip().split(",")
+
+def write(path, *arrays):
+    with open(str(path), "wb") as output_file:
+        for array in arrays:
+            output_file.write(array.tobytes())
+
+    return str(path)
+
+def test_sobel_psnr(tools, tmp_path):
+    rng = numpy.random.default_rng(1)
+    golden = rng.integers(0, 256, (512, 512), dtype=numpy.uint8)
+    output = golden.copy()
+    output[100:110, 200:300] ^= 0x10
+    output[0, :] = 0 # The border is not compared
+
+    golden_path = write(tmp_path / "golden.bin", golden)
+    output_path = write(tmp_path / "output.bin", output)
+
+    assert quality.sobel_metrics(golden_path, output_path) == run_tool(tools['sobel'], output_path, golden_path)
+
+def dct(picture):
+    #  Forward DCT of 8x8 blocks, the transpose of the inverse
+    matrix = quality.idct_matrix()
+    blocks = (picture.astype(numpy.float64) - 128).reshape(64, 8, 64, 8)
+
+    return 0.25 * numpy.einsum("xi,rxcy,yj->ricj", matrix, blocks, matrix).reshape(512, 512)
+
+def test_dct_inverse_and_psnr(tools, tmp_path):
+    rng = numpy.random.default_rng(2)
+    picture = rng.integers(0, 256, (512, 512), dtype=numpy.uint8)
+    golden = dct(picture)
+    output = golden.copy()
+    output[8:16, 40:48] += rng.normal(0, 20, (8, 8))
+
+    input_path = write(tmp_path / "input.bin", picture)
+    golden_path = write(tmp_path / "golden.bin", golden)
+    output_path = write(tmp_path / "output.bin", output)
+
+    assert quality.dct_metrics(input_path, golden_path, output_path) == run_tool(tools['dct'], input_path, golden_path, output_path)
+    assert quality.dct_metrics(input_path, golden_path, golden_path) == run_tool(tools['dct'], input_path, golden_path, golden_path)
+
+def test_blackscholes_relative_errors(tools, tmp_path):
+    golden = numpy.array([1.5, -2.25, 0.0, 40.0, 7.0])
+    output = numpy.array([1.25, 2.25, 0.5, 39.0, -7.5])
+
+    golden_path = write(tmp_path / "golden.bin", numpy.int32(len(golden)), golden)
+    output_path = write(tmp_path / "output.bin", numpy.int32(len(output)), output)
+
+    assert quality.blackscholes_metrics(golden_path, output_path) == run_tool(tools['blackscholes'], golden_path, output_path)
+
+def test_jacobi_relative_errors(tools, tmp_path):
+    golden = numpy.array([1.0, 0.0, -3.0, 4.5, 0.25, 8.0])
+    output = numpy.array([1.5, 0.75, 3.0, 4.0, 0.25, 9.0])
+
+    golden_path = write(tmp_path / "golden.bin", numpy.int64(len(golden) // 2), golden)
+    output_path = write(tmp_path / "output.bin", numpy.int64(len(output) // 2), output)
+
+    assert quality.jacobi_metrics(golden_path, output_path) == run_tool(tools['jacobi'], golden_path, output_path)
+
+def test_monte_carlo_errors(tools, tmp_path):
+    rng = numpy.random.default_rng(3)
+    golden = rng.normal(0, 10, 1000)
+    output = golden + rng.normal(0, 0.1, 1000)
+
+    golden_path = write(tmp_path / "golden.bin", numpy.array([1000, 12345], dtype=numpy.int64), golden)
+    output_path = write(tmp_path / "output.bin", numpy.array([1000, 54321], dtype=numpy.int64), output)
+
+    assert quality.monte_carlo_metrics(golden_path, output_path) == run_tool(tools['monteCarlo'], golden_path, output_path)
+
+def write_clusters(prefix, centres, memberships):
+    #  Like file_write() of Kmeans
+    with open(prefix + ".cluster_centres", "w") as centres_file:
+        centres_file.write("%d %d\n" % centres.shape)
+        for index, centre in enumerate(centres):
+            centres_file.write("%d " % index + "".join("%f " % coordinate for coordinate in centre) + "\n")
+
+    with open(prefix + ".membership", "w") as membership_file:
+        membership_file.write("".join("%d %d\n" % (index, cluster) for index, cluster in enumerate(memberships)))
+
+def test_kmeans_centres_and_memberships(tools, tmp_path):
+    rng = numpy.random.default_rng(4)
+    points = rng.normal(0, 3, (100, 9))
+    golden_centres = rng.normal(0, 3, (5, 9))
+    golden_memberships = rng.integers(0, 5, 100)
+
+    input_path = str(tmp_path / "points.txt")
+    with open(input_path, "w") as input_file:
+        input_file.write("".join("%d " % (index + 1) + " ".join("%f" % coordinate for coordinate in point) + "\n" for index, point in enumerate(points)))
+
+    golden_prefix = str(tmp_path / "golden")
+    write_clusters(golden_prefix, golden_centres, golden_memberships)
+
+    # Centres in another order with a corrupted one, and memberships with wrong and missing points
+    output_centres = golden_centres[::-1].copy()
+    output_centres[1] *= 1.25
+    output_memberships = golden_memberships[:90].copy()
+    output_memberships[::7] = (output_memberships[::7] + 1) % 5
+
+    output_prefix = str(tmp_path / "output")
+    write_clusters(output_prefix, output_centres, output_memberships)
+
+    assert quality.kmeans_metrics(input_path, golden_prefix, output_prefix) == run_tool(tools['Kmeans'], golden_prefix, output_prefix, len(points))
+    assert quality.kmeans_metrics(input_path, golden_prefix, golden_prefix) == run_tool(tools['Kmeans'], golden_prefix, golden_prefix, len(points))
+
+def test_unreadable_output_gets_crash_metrics(tmp_path):
+    golden_path = write(tmp_path / "golden.bin", numpy.int32(2), numpy.array([1.0, 2.0]))
+    output_path = write(tmp_path / "output.bin", numpy.int32(2), numpy.array([1.0]))
+
+    assert quality.blackscholes_metrics(golden_path, output_path) == quality.CRASH_METRICS['blackscholes']
+    assert quality.sobel_metrics(golden_path, str(tmp_path / "missing.bin")) == quality.CRASH_METRICS['sobel']
@@ -0,0 +1,47 @@
+import sqlite3
+
+import resultstore
+
+def make_record(input_name, result, crash=None, metrics=("40.5",)):
+    return {"bench": "sobel", "voltage": "0.54V", "input": input_name, "config": "abc", "result": result, "crash": crash, "masked": False,
+            "metrics": list(metrics), "sim_ticks": 1000, "sim_insts": 500, "host_seconds": 1.5, "injections": 3}
+
+def test_store_of_an_older_campaign_gets_the_new_columns(tmp_path):
+    db_path = str(tmp_path / "results.db")
+
+    # The runs table before crash was added
+    old_columns = resultstore.COLUMNS[:-1]
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE runs (" + ", ".join(name + " " + column_type for name, column_type in old_columns) +
+                       ", PRIMARY KEY (" + ", ".join(resultstore.KEY) + "))")
+    connection.execute("INSERT INTO runs (bench, voltage, map, config, outcome) VALUES ('sobel', '0.54V', 'BRAM_1', 'abc', 'Masked')")
+    connection.commit()
+    connection.close()
+
+    connection = resultstore.connect(db_path)
+    assert [row[1] for row in connection.execute("PRAGMA table_info(runs)")] == [name for name, _ in resultstore.COLUMNS]
+
+    resultstore.insert(connection, [make_record("BRAM_2.txt", "Crash", "SIGSEGV", ["0.0"])])
+    assert resultstore.count_outcomes(connection) == [("sobel", "0.54V", "Crash(SIGSEGV)", 1), ("sobel", "0.54V", "Masked", 1)]
+
+def test_stored_run_replaces_its_previous_row(tmp_path):
+    connection = resultstore.connect(str(tmp_path / "results.db"))
+
+    resultstore.insert(connection, [make_record("BRAM_1.txt", "SDC")])
+    resultstore.insert(connection, [make_record("BRAM_1.txt", "Masked")])
+
+    assert connection.execute("SELECT map, outcome, psnr, relative_error FROM runs").fetchall() == [("BRAM_1", "Masked", 40.5, None)]
+
+def test_merge_of_shards(tmp_path):
+    connection = resultstore.connect(str(tmp_path / "results.db"))
+
+    for shard, records in (("shard0.db", [make_record("BRAM_1.txt", "SDC")]),
+                           ("shard1.db", [make_record("BRAM_2.txt", "Crash", "Timeout", ["0.0"]), make_record("BRAM_3.txt", "SDC")])):
+        shard_connection = resultstore.connect(str(tmp_path / shard))
+        resultstore.insert(shard_connection, records)
+        shard_connection.close()
+
+    resultstore.merge(connection, [str(tmp_path / "shard0.db"), str(tmp_path / "shard1.db"), str(tmp_path / "missing.db")])
+
+    assert resultstore.count_outcomes(connection, "sobel") == [("sobel", "0.54V", "Crash(Timeout)", 1), ("sobel", "0.54V", "SDC", 2)]
+    assert resultstore.count_outcomes(connection, "dct") == []
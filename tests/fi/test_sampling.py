@@ -0,0 +1,40 @@
+import pytest
+
+import sampling
+
+#  Published 95% intervals: (successes, trials, lower, upper)
+WILSON = [(81, 263, 0.2553, 0.3662), (0, 10, 0.0, 0.2775)]
+CLOPPER_PEARSON = [(81, 263, 0.2527, 0.3676), (0, 10, 0.0, 0.3085), (1, 10, 0.0025, 0.4450), (5, 10, 0.1871, 0.8129)]
+
+@pytest.mark.parametrize("successes, trials, lower, upper", WILSON)
+def test_wilson_interval(successes, trials, lower, upper):
+    assert sampling.wilson_interval(successes, trials, 0.95) == pytest.approx((lower, upper), abs=5e-5)
+
+@pytest.mark.parametrize("successes, trials, lower, upper", CLOPPER_PEARSON)
+def test_clopper_pearson_interval(successes, trials, lower, upper):
+    assert sampling.clopper_pearson_interval(successes, trials, 0.95) == pytest.approx((lower, upper), abs=5e-5)
+
+def test_intervals_without_trials():
+    assert sampling.wilson_interval(0, 0, 0.95) == (0.0, 1.0)
+    assert sampling.clopper_pearson_interval(0, 0, 0.95) == (0.0, 1.0)
+
+def test_cell_stops_at_its_margin():
+    cell = sampling.Cell(0.1, "wilson", 0.95)
+
+    while not cell.done:
+        cell.add("Correct" if cell.trials % 4 else "Crash")
+
+    def half_width(successes, trials):
+        lower, upper = sampling.wilson_interval(successes, trials, 0.95)
+        return (upper - lower) / 2
+
+    # The widest interval is the one of Correct, at 53 of 71 maps
+    assert cell.counts == {"Correct": 53, "Incorrect": 0, "Crash": 18, "Hang": 0}
+    assert half_width(53, 71) <= 0.1 < half_width(52, 70)
+
+def test_shuffle_is_the_same_on_every_restart():
+    inputs = ["BRAM_%d.txt" % index for index in range(100)]
+
+    assert sampling.shuffle(inputs, 1, "sobel/0.54V") == sampling.shuffle(inputs, 1, "sobel/0.54V")
+    assert sampling.shuffle(inputs, 1, "sobel/0.54V") != sampling.shuffle(inputs, 1, "sobel/0.55V")
+    assert sorted(sampling.shuffle(inputs, 1, "sobel/0.54V")) == sorted(inputs)
@@ -0,0 +1,58 @@
+import argparse
+import json
+
+import helpers
+import run
+import telemetry
+
+def make_record(input_name, **stats):
+    record = {"bench": "sobel", "voltage": "0.54V", "input": input_name, "result": "Correct"}
+    record.update(stats)
+
+    return record
+
+def test_instruction_rate_of_the_simulated_time(tmp_path):
+    monitor = telemetry.Monitor(str(tmp_path / "status.json"), 2, {"sobel": 10.0})
+
+    # The summary's rate leaves out startup, runs without one fall back to their host seconds
+    monitor.started("run1", "sobel", "0.54V", "BRAM_1.txt")
+    monitor.finished(make_record("BRAM_1.txt", sim_insts=1000000, host_seconds=10.0, host_inst_rate=500000.0), "run1")
+    monitor.started("run2", "sobel", "0.54V", "BRAM_2.txt")
+    monitor.finished(make_record("BRAM_2.txt", sim_insts=1000000, host_seconds=10.0), "run2")
+
+    assert monitor.inst_rates == [500000.0, 100000.0]
+    assert monitor.status()["done"] == 2
+
+def test_fork_children_are_reported_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(helpers, "getResultsDir", lambda bench_name, variant="": str(tmp_path))
+    progress_dir = tmp_path / "faulty" / "0.54V"
+    progress_dir.mkdir(parents=True)
+    progress_path = progress_dir / run.FORK_PROGRESS
+
+    bench = argparse.Namespace(bench_name="sobel", variant="", voltages=["0.54V"])
+    monitor = telemetry.Monitor(str(tmp_path / "status.json"), 2, {"sobel": 10.0})
+    offsets = {}
+
+    # The second line is still being written by the fork parent
+    progress = {"input": "BRAM_1.txt", "status": "exit 0", "seconds": 12.0, "summary": {"host_seconds": 11.0, "host_inst_rate": 400000.0}}
+    progress_path.write_text(json.dumps(progress) + "\n" + '{"input": "BRAM_2')
+    run.report_fork_progress(monitor, [bench], offsets)
+
+    assert monitor.done == {("sobel", "0.54V"): 1}
+    assert monitor.host_seconds == [11.0]
+    assert monitor.inst_rates == [400000.0]
+
+    progress = {"input": "BRAM_2.txt", "status": "timeout", "seconds": 300.0, "summary": None}
+    progress_path.write_text(progress_path.read_text()[:-len('{"input": "BRAM_2')] + json.dumps(progress) + "\n")
+    run.report_fork_progress(monitor, [bench], offsets)
+    run.report_fork_progress(monitor, [bench], offsets)
+
+    assert monitor.done == {("sobel", "0.54V"): 2}
+    assert monitor.host_seconds == [11.0, 300.0]
+
+    # Collecting the children classifies them without counting them again
+    monitor.started("run1", "sobel", "0.54V", "BRAM_1.txt")
+    monitor.finished(make_record("BRAM_1.txt", host_seconds=11.0), "run1")
+
+    assert monitor.done == {("sobel", "0.54V"): 2}
+    assert not monitor.running
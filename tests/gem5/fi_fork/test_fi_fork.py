@@ -0,0 +1,66 @@
+'''
+Smoke test of fork campaigns, see configs/fi_config/campaign.py.
+
+sobel is simulated until fi_activate(START) and forked once per fault map.
+The children run the campaign code in the Python that gem5 embeds, and
+sobel opens its output before START, so every child also redirects the
+output it shares with the parent. A child that dies before it simulates
+writes a status other than "exit 0".
+'''
+import os
+from testlib import *
+from testlib import test
+
+sobel_dir = joinpath(config.base_dir, 'tests', 'test-progs', 'sobel')
+inputs_dir = joinpath(config.base_dir, 'inputs')
+
+fault_maps = (
+    ('golden', joinpath(inputs_dir, 'golden.txt')),
+    ('BRAM_1000', joinpath(inputs_dir, '0.54V', 'BRAM_1000.txt')),
+)
+
+def test_fork(params):
+    tempdir = params.fixtures[constants.tempdir_fixture_name].path
+    gem5 = params.fixtures[constants.gem5_binary_fixture_name].path
+
+    fork_inputs = joinpath(tempdir, 'fork_inputs.txt')
+    with open(fork_inputs, 'w') as fork_inputs_file:
+        for name, input_path in fault_maps:
+            fork_inputs_file.write(input_path + ' ' + name + '\n')
+
+    command = [
+        gem5, '-d', tempdir, '-re',
+        joinpath(config.base_dir, 'configs', 'fi_config', 'run.py'),
+        '-c', joinpath(sobel_dir, 'sobel'),
+        '--sobel-input=' + joinpath(sobel_dir, 'figs', 'input.grey'),
+        '--output=/proc/self/cwd/output.bin',
+        '--input-path=' + joinpath(inputs_dir, 'golden.txt'),
+        '--summary-file=summary.json',
+        '--fork-inputs=' + fork_inputs,
+        '--fork-workers=2',
+    ]
+
+    # The parent writes its output to its working directory
+    log_call(params.log, command, cwd=tempdir)
+
+    for name, _ in fault_maps:
+        outdir = joinpath(tempdir, name)
+
+        with open(joinpath(outdir, 'fork_status.txt')) as status_file:
+            status = status_file.read().strip()
+        if status != 'exit 0':
+            test.fail('The child of %s finished with %s, see %s'
+                      % (name, status, outdir))
+
+        for output in ('summary.json', 'output.bin'):
+            if not os.path.exists(joinpath(outdir, output)):
+                test.fail('The child of %s wrote no %s, see %s'
+                          % (name, output, outdir))
+
+TestSuite(
+    name='fi_fork-X86-opt',
+    fixtures=[Gem5Fixture(constants.x86_tag, constants.opt_tag),
+              TempdirFixture()],
+    tags=[constants.x86_tag, constants.opt_tag, constants.long_tag],
+    tests=[TestFunction(test_fork, name='fi_fork-X86-opt')],
+)